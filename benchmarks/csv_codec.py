@@ -0,0 +1,81 @@
+import argparse
+import csv
+import gc
+import io
+import time
+from controller.controller import TICKET_CODEC, _ticket_fields
+from controller.csv_codec import split_records
+from benchmarks.startup import generate
+
+# Custo do codec RFC 4180 (controller/csv_codec.py) contra o parser antigo
+# baseado em split, decodificando e codificando as linhas de tickets:
+#
+#   python -m benchmarks.csv_codec --rows 1000000
+
+
+def split_decode(text: str) -> list:
+    return [line.strip().split(',') for line in text.split('\n')[1:] if line.strip()]
+
+
+def codec_decode(text: str) -> list:
+    return TICKET_CODEC.decode_many(split_records(text)[1:])
+
+
+def csv_reader_decode(text: str) -> list:
+    reader = csv.reader(io.StringIO(text))
+    next(reader)
+    return [fields for fields in reader if fields]
+
+
+def split_encode(values: list) -> list:
+    return [','.join(str(field) for field in fields) + '\n' for fields in values]
+
+
+def codec_encode(values: list) -> list:
+    encode = TICKET_CODEC.encode
+    return [encode(fields) for fields in values]
+
+
+def measure(fn, argument, runs: int) -> float:
+    # coletor pausado, como no load do CsvFile
+    best = None
+    gc.disable()
+    try:
+        for _ in range(runs):
+            started = time.perf_counter()
+            fn(argument)
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+    finally:
+        gc.enable()
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Benchmark do codec CSV')
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--quoted', type=float, default=0.0,
+                        help='fração de linhas com vírgula no nome do cliente (exigem aspas)')
+    args = parser.parse_args()
+
+    rows = generate(args.rows)
+    step = int(1 / args.quoted) if args.quoted else 0
+    for index in range(0, len(rows), step or len(rows) + 1):
+        rows[index].client_name = f'Silva, {rows[index].client_name}'
+    values = [_ticket_fields(row) for row in rows]
+    text = TICKET_CODEC.header + ''.join(codec_encode(values))
+    print(f'{args.rows} linhas ({len(text) / 1e6:.1f} MB), {args.quoted:.0%} com aspas')
+
+    decoders = [('codec', codec_decode), ('csv.reader', csv_reader_decode)]
+    if not args.quoted:
+        # com aspas o split antigo quebra as linhas: só entra na comparação sem elas
+        decoders.insert(0, ('split', split_decode))
+    for name, fn in decoders:
+        print(f'decode {name:>10}: {measure(fn, text, args.runs):.3f}s')
+    for name, fn in [('join', split_encode), ('codec', codec_encode)]:
+        print(f'encode {name:>10}: {measure(fn, values, args.runs):.3f}s')
+
+
+if __name__ == '__main__':
+    main()
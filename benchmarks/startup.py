@@ -0,0 +1,88 @@
+import argparse
+import gc
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+from controller.controller import TICKET_CODEC, _parse_ticket, _ticket_fields, _ticket_from_fields
+from controller.csv_file import PARALLEL_WORKERS, SNAPSHOT_ENABLED, CsvFile
+from controller.offset_index import OffsetIndex
+from models.rows import TicketRow
+
+# Tempo de carga (cold start) da tabela de tickets em cada modo:
+#   verify   - parse + validação Pydantic de todas as linhas
+#   trusted  - parse sem revalidar (CSV confere com o checksum .sum)
+#   parallel - como trusted, com o parse dividido em processos (storage.parallel)
+#   snapshot - linhas remontadas a partir do <csv>.snap, sem ler o CSV
+#
+#   python -m benchmarks.startup --rows 1000000
+
+TICKET_TYPES = ['inteira', 'meia', 'vip']
+
+
+def generate(count: int) -> list:
+    start = datetime(2025, 1, 1)
+    return [
+        TicketRow(id, random.randint(1, 500), f'Cliente {id}', f'{chr(65 + id % 10)}{id % 20 + 1}',
+                  start + timedelta(minutes=id), random.choice(TICKET_TYPES), round(random.uniform(10, 60), 2))
+        for id in range(1, count + 1)
+    ]
+
+
+def tickets_file(path: str, trusted: bool, snapshot: bool, parallel: bool = False) -> CsvFile:
+    csv_file = CsvFile(path, TICKET_CODEC, _parse_ticket, _ticket_fields, OffsetIndex(path, path + '.idx'),
+                       _ticket_from_fields if trusted else None, TicketRow if snapshot else None)
+    csv_file.parallel = parallel
+    return csv_file
+
+
+def measure(csv_file: CsvFile, runs: int) -> tuple:
+    best, rows = None, None
+    for _ in range(runs):
+        rows = None  # a liberação da carga anterior não entra na medida
+        gc.collect()
+        started = time.perf_counter()
+        rows = csv_file.load()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, len(rows)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Benchmark de carga da tabela de tickets')
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--runs', type=int, default=3)
+    args = parser.parse_args()
+    if not SNAPSHOT_ENABLED:
+        print('aviso: storage.snapshot.enabled está false no config.yaml; o modo snapshot vai parsear o CSV')
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'ticket.csv')
+        started = time.perf_counter()
+        tickets_file(path, trusted=True, snapshot=False).rewrite(generate(args.rows))
+        print(f'{args.rows} tickets gerados em {time.perf_counter() - started:.2f}s '
+              f'({os.path.getsize(path) / 1e6:.1f} MB)')
+
+        modes = [
+            ('verify', tickets_file(path, trusted=False, snapshot=False)),
+            ('trusted', tickets_file(path, trusted=True, snapshot=False)),
+        ]
+        if PARALLEL_WORKERS > 1:
+            modes.append(('parallel', tickets_file(path, trusted=True, snapshot=False, parallel=True)))
+        snapshot_file = tickets_file(path, trusted=True, snapshot=True)
+        snapshot_file.load()  # primeira carga: parseia o CSV e grava o snapshot
+        modes.append(('snapshot', snapshot_file))
+
+        results = {}
+        for name, csv_file in modes:
+            results[name], total = measure(csv_file, args.runs)
+            print(f'{name:>8}: {results[name]:.3f}s ({total} linhas)')
+        if snapshot_file.snapshot:
+            print(f'snapshot: {os.path.getsize(snapshot_file.snapshot.path) / 1e6:.1f} MB em disco')
+        print(f'snapshot vs verify: {results["verify"] / results["snapshot"]:.1f}x, '
+              f'snapshot vs trusted: {results["trusted"] / results["snapshot"]:.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+from typing import Callable, Dict, Hashable, List, Optional, Tuple
+
+# Cada agrupamento (e o valor somado) tem a função que o extrai da linha (backend csv)
+# e a expressão SQL equivalente, com `{row}` no lugar de NEW/OLD nos triggers (backend sqlite)
+Extractor = Tuple[Callable, str]
+
+
+def cents(value: float) -> int:
+    # somas em centavos inteiros não acumulam erro de arredondamento a cada insert/delete
+    return round(value * 100)
+
+
+class Aggregates:
+    """Quantidade de linhas e soma de um valor por grupo, mantidas a cada escrita.
+
+    No backend csv é um observer do EntityCache: cada insert/update/delete só
+    ajusta os grupos da linha afetada, e os relatórios custam O(grupos) em vez
+    de percorrer a tabela. No sqlite as mesmas somas ficam numa tabela mantida
+    por triggers (ver SqliteRepository._ensure_aggregates). Como o NgramIndex,
+    depois de um reload as somas só são refeitas no primeiro relatório.
+    """
+
+    def __init__(self, name: str, groups: Dict[str, Extractor], value: Extractor):
+        self.name = name
+        self.groups = dict(groups)
+        self.value = value
+        self._totals: Dict[str, Dict[Hashable, List[int]]] = {}
+        # linhas do cache (a mesma lista, alterada no lugar) enquanto as somas não são refeitas
+        self._pending: Optional[List] = None
+        self.reset([])
+
+    # Manutenção (chamada pelo EntityCache)
+
+    def reset(self, rows: List) -> None:
+        self._totals = {}
+        self._pending = rows
+
+    def _build(self) -> None:
+        rows, self._pending = self._pending, None
+        self._totals = {group: {} for group in self.groups}
+        for row in rows:
+            self._add(row, 1)
+
+    def _add(self, row, sign: int) -> None:
+        # sem somas montadas não há o que ajustar: a lista pendente já está em dia
+        if self._pending is not None:
+            return
+        amount = cents(self.value[0](row)) * sign
+        for group, (key, _) in self.groups.items():
+            totals = self._totals[group]
+            value = key(row)
+            entry = totals.get(value)
+            if entry is None:
+                entry = totals[value] = [0, 0]
+            entry[0] += sign
+            entry[1] += amount
+            if not entry[0]:
+                del totals[value]
+
+    def insert(self, row) -> None:
+        self._add(row, 1)
+
+    def update(self, old, new, position: int) -> None:
+        self._add(old, -1)
+        self._add(new, 1)
+
+    def delete(self, row, position: int) -> None:
+        self._add(row, -1)
+
+    # Consulta
+
+    def totals(self, group: str) -> Dict[Hashable, Tuple[int, int]]:
+        # grupo -> (linhas, soma em centavos); chamado com o lock do cache adquirido (EntityCache.derived)
+        if self._pending is not None:
+            self._build()
+        return {key: (rows, amount) for key, (rows, amount) in self._totals[group].items()}
+
+    def stats(self) -> dict:
+        return {
+            "name": self.name,
+            "built": self._pending is None,
+            "groups": {group: len(totals) for group, totals in self._totals.items()},
+        }
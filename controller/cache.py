@@ -0,0 +1,284 @@
+import os
+import threading
+from bisect import bisect_left, bisect_right, insort
+from typing import Callable, Dict, Hashable, Iterable, Iterator, List, Optional, Tuple
+
+# Assinatura do arquivo: (mtime_ns, size, inode). None quando o arquivo não existe.
+FileSignature = Optional[Tuple[int, int, int]]
+
+
+def file_signature(path: str) -> FileSignature:
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+
+class EntityCache:
+    """Mantém em memória as linhas já parseadas de um CSV.
+
+    O arquivo só é relido quando a assinatura (mtime_ns, size, inode) muda,
+    seja por uma escrita da própria API ou por uma edição externa. Quem
+    persiste a tabela em mais de um arquivo (ex.: CSV + journal) pode passar
+    a própria função de assinatura.
+    """
+
+    def __init__(self, name: str, path: str, loader: Callable[[], List],
+                 signature: Optional[Callable[[], Hashable]] = None):
+        self.name = name
+        self.path = path
+        self._loader = loader
+        self._signature_fn = signature or (lambda: file_signature(path))
+        self._lock = threading.RLock()
+        self._signature: Hashable = None
+        self._rows: List = []
+        # índice de chave primária: id -> linha e id -> número de sequência. A sequência
+        # cresce a cada append e não é renumerada num delete: `_order` (a sequência de
+        # cada posição de `_rows`, sempre crescente) dá a posição por bisect
+        self._by_id: Dict[int, object] = {}
+        self._seq: Dict[int, int] = {}
+        self._order: List[int] = []
+        self._next_seq = 0
+        # ids em ordem crescente, para paginação por keyset
+        self._sorted_ids: List[int] = []
+        self._loaded = False
+        # estruturas derivadas (colunas, índices secundários) atualizadas junto com as linhas
+        self._observers: List = []
+        # incrementada a cada mudança no conteúdo (carga, escrita ou invalidação)
+        self.version = 0
+        self.hits = 0
+        self.misses = 0
+
+    def _refresh(self) -> None:
+        signature = self._signature_fn()
+        if self._loaded and signature == self._signature:
+            self.hits += 1
+            return
+        self.misses += 1
+        # a assinatura é lida antes do parse: se o arquivo mudar durante
+        # a leitura, a próxima chamada detecta a diferença e recarrega
+        self._rows = self._loader()
+        self._reindex()
+        self._signature = signature
+        self._loaded = True
+
+    def _reindex(self) -> None:
+        self.version += 1
+        self._by_id = {row.id: row for row in self._rows}
+        self._seq = {row.id: index for index, row in enumerate(self._rows)}
+        self._order = list(range(len(self._rows)))
+        self._next_seq = len(self._rows)
+        self._sorted_ids = sorted(self._by_id)
+        for observer in self._observers:
+            observer.reset(self._rows)
+
+    def add_observer(self, observer) -> None:
+        # `observer` implementa reset(rows), insert(row), update(old, new, position) e
+        # delete(row, position); as chamadas acontecem com o lock do cache adquirido
+        with self._lock:
+            self._observers.append(observer)
+            if self._loaded:
+                observer.reset(self._rows)
+
+    @property
+    def lock(self) -> threading.RLock:
+        return self._lock
+
+    def select(self, positions: Callable[[], Iterable[int]]) -> List:
+        # linhas nas posições calculadas por uma estrutura derivada, com o mesmo snapshot
+        with self._lock:
+            self._refresh()
+            return [self._rows[index] for index in positions()]
+
+    def select_ids(self, ids: Callable[[], Iterable[int]], ordered: bool = False) -> List:
+        # linhas dos ids calculados por um índice secundário, na ordem do arquivo
+        # (ou na ordem dos próprios ids, com `ordered`)
+        with self._lock:
+            self._refresh()
+            if ordered:
+                return [self._by_id[id] for id in ids() if id in self._by_id]
+            seq = self._seq
+            return [self._by_id[id] for _, id in sorted((seq[id], id) for id in ids() if id in seq)]
+
+    def derived(self, compute: Callable[[], object]):
+        # valor calculado por uma estrutura derivada (observer) sobre a tabela em dia
+        with self._lock:
+            self._refresh()
+            return compute()
+
+    def count(self) -> int:
+        with self._lock:
+            self._refresh()
+            return len(self._rows)
+
+    def current_version(self) -> int:
+        # versão do conteúdo, conferindo antes se o arquivo mudou por fora
+        with self._lock:
+            self._refresh()
+            return self.version
+
+    def resign(self) -> None:
+        # registra a assinatura atual dos arquivos após uma gravação adiada (group commit)
+        with self._lock:
+            if self._loaded:
+                self._signature = self._signature_fn()
+
+    def is_fresh(self) -> bool:
+        # consulta sem recarregar nem contar hit/miss
+        with self._lock:
+            return self._loaded and self._signature_fn() == self._signature
+
+    def warm(self) -> None:
+        with self._lock:
+            self._refresh()
+
+    def is_loaded(self) -> bool:
+        with self._lock:
+            return self._loaded
+
+    def _position(self, id: int) -> int:
+        return bisect_left(self._order, self._seq[id])
+
+    def iter(self) -> Iterator:
+        # itera sobre um snapshot da lista (só ponteiros), sem copiar os objetos;
+        # mutações feitas durante a iteração não afetam quem está lendo
+        with self._lock:
+            self._refresh()
+            snapshot = tuple(self._rows)
+        return iter(snapshot)
+
+    def iter_by_id(self, after: Optional[int] = None, chunk: int = 256) -> Iterator:
+        # percorre as linhas em ordem de id a partir de `after` (exclusivo). Cada
+        # bloco é localizado por bisect, então a página N não passa pelas anteriores
+        with self._lock:
+            self._refresh()
+        last = after
+        while True:
+            with self._lock:
+                start = 0 if last is None else bisect_right(self._sorted_ids, last)
+                ids = self._sorted_ids[start:start + chunk]
+                rows = [self._by_id[id] for id in ids]
+            if not rows:
+                return
+            yield from rows
+            last = ids[-1]
+
+    def contains(self, id: int) -> bool:
+        with self._lock:
+            self._refresh()
+            return id in self._by_id
+
+    def get_by_id(self, id: int):
+        with self._lock:
+            self._refresh()
+            return self._by_id.get(id)
+
+    def append(self, row, write: Callable[[List], None]) -> None:
+        # `write` recebe as linhas atuais e persiste a nova linha no fim do
+        # arquivo; o cache é atualizado no lugar, sem reler o CSV
+        with self._lock:
+            self._refresh()
+            if row.id in self._by_id:
+                raise ValueError(f"{self.name}: id {row.id} already exists")
+            # o arquivo é gravado antes: se `write` falhar, o cache continua igual ao disco
+            write(self._rows)
+            self._seq[row.id] = self._next_seq
+            self._order.append(self._next_seq)
+            self._next_seq += 1
+            self._by_id[row.id] = row
+            self._rows.append(row)
+            if not self._sorted_ids or row.id > self._sorted_ids[-1]:
+                self._sorted_ids.append(row.id)
+            else:
+                insort(self._sorted_ids, row.id)
+            self.version += 1
+            for observer in self._observers:
+                observer.insert(row)
+            self._signature = self._signature_fn()
+
+    def update(self, row, write: Callable[[List], None]) -> None:
+        # substitui a linha na mesma posição; `write` persiste a mudança a partir das linhas atuais
+        with self._lock:
+            self._refresh()
+            if row.id not in self._by_id:
+                raise KeyError(row.id)
+            position = self._position(row.id)
+            old = self._by_id[row.id]
+            self._rows[position] = row
+            self._by_id[row.id] = row
+            try:
+                write(self._rows)
+            except BaseException:
+                # `write` recebe as linhas já alteradas (reescrita completa); se falhar,
+                # desfaz a mudança para a memória não ficar à frente do disco
+                self._rows[position] = old
+                self._by_id[row.id] = old
+                raise
+            self.version += 1
+            for observer in self._observers:
+                observer.update(old, row, position)
+            self._signature = self._signature_fn()
+
+    def delete(self, id: int, write: Callable[[List], None]):
+        with self._lock:
+            self._refresh()
+            if id not in self._by_id:
+                raise KeyError(id)
+            position = self._position(id)
+            seq = self._seq.pop(id)
+            row = self._by_id.pop(id)
+            # só memmove das listas: as posições das linhas seguintes saem do bisect em `_order`
+            del self._rows[position]
+            del self._order[position]
+            sorted_position = bisect_left(self._sorted_ids, id)
+            del self._sorted_ids[sorted_position]
+            try:
+                write(self._rows)
+            except BaseException:
+                self._rows.insert(position, row)
+                self._order.insert(position, seq)
+                self._sorted_ids.insert(sorted_position, id)
+                self._seq[id] = seq
+                self._by_id[id] = row
+                raise
+            self.version += 1
+            for observer in self._observers:
+                observer.delete(row, position)
+            self._signature = self._signature_fn()
+            return row
+
+    def flush(self, write: Callable[[List], object]):
+        # persiste as linhas atuais (ex.: checkpoint do journal) sem alterar o conteúdo
+        with self._lock:
+            self._refresh()
+            result = write(self._rows)
+            self._signature = self._signature_fn()
+            return result
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._loaded = False
+            self._signature = None
+            self._rows = []
+            self._by_id = {}
+            self._seq = {}
+            self._order = []
+            self._sorted_ids = []
+            self.version += 1
+            for observer in self._observers:
+                observer.reset([])
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entity": self.name,
+                "file": self.path,
+                "rows": len(self._rows),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+                "version": self.version,
+                "signature": self._signature,
+            }
@@ -0,0 +1,48 @@
+import json
+import os
+import zlib
+from typing import Optional, Tuple
+
+# (tamanho em bytes, crc32) do conteúdo do CSV
+Sum = Tuple[int, int]
+
+
+def crc32(data, value: int = 0) -> int:
+    return zlib.crc32(data, value)
+
+
+class Checksum:
+    """CRC32 do conteúdo do CSV gravado (ou já validado) pela própria API.
+
+    Enquanto o arquivo bater com o checksum registrado, as linhas podem ser
+    carregadas sem passar de novo pela validação do Pydantic. Qualquer edição
+    externa muda o CRC e o próximo load volta a validar tudo.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def read(self) -> Optional[Sum]:
+        try:
+            with open(self.path, mode='r', encoding='utf-8') as file:
+                data = json.load(file)
+            return (data['size'], data['crc32'])
+        except (FileNotFoundError, ValueError, KeyError, TypeError):
+            return None
+
+    def write(self, size: int, crc: int) -> None:
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, mode='w', encoding='utf-8') as file:
+            json.dump({'size': size, 'crc32': crc}, file)
+        os.replace(tmp_path, self.path)
+
+    def extend(self, previous_size: int, data: bytes) -> None:
+        # append no fim do CSV: o crc32 é incremental, basta continuar do valor anterior.
+        # Se o registro não cobria o arquivo até aqui, continua sem cobrir
+        recorded = self.read()
+        if recorded is None or recorded[0] != previous_size:
+            return
+        self.write(previous_size + len(data), crc32(data, recorded[1]))
+
+    def matches(self, size: int, crc: int) -> bool:
+        return self.read() == (size, crc)
@@ -1,77 +1,440 @@
-import os
-import datetime
+from datetime import datetime, timezone
+from sys import intern
 from utils.configs import ler_config_yaml
 from models.models import Movie, Ticket, Session
-from typing import List
+from models.rows import MovieRow, SessionRow, TicketRow, validated
+from controller.aggregates import Aggregates
+from controller.cache import EntityCache
+from controller.columnar import ColumnStore, epoch_us
+from controller.csv_codec import CsvCodec
+from controller.csv_file import CsvFile
+from controller.hash_index import HashIndex
+from controller.sorted_index import SortedIndex
+from controller.token_index import TokenIndex
+from controller.ngram_index import NgramIndex
+from controller.query_cache import QueryCache
+from controller.offset_index import OffsetIndex
+from controller.parsing import intern_items, parse_datetime
+from controller.repository import Condition, CsvRepository, Repository
+from controller.sqlite_repository import SqliteRepository
+from controller.writer import MutationQueue
+from utils.logger_config import logger
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
 
 movies_data = ler_config_yaml().get('data', {})
 MOVIE_CSV_FILE = movies_data.get('csv', {}).get('movies', 'data/movies.csv')
 MOVIE_ZIP_FILE = movies_data.get('compressed', {}).get('movies', 'compressed/movies.zip')
-
-def read_movies_csv() -> List[Movie]:
-    movies: List[Movie] = []
-    if os.path.exists(MOVIE_CSV_FILE):
-        with open(MOVIE_CSV_FILE, mode='r', encoding='utf-8') as file:
-            next(file, None) #ignora o header
-            for line in file:
-                id, title, genre, director, duration_minutes, release_year, rating = line.strip().split(',')
-                movies.append(
-                    Movie(
-                        id=int(id),
-                        title=title, 
-                        genre=genre,
-                        director=director,
-                        duration_minutes=int(duration_minutes), 
-                        release_year=int(release_year), 
-                        rating=rating
-                        )
-                    )
-    return movies
-
+MOVIE_INDEX_FILE = movies_data.get('index', {}).get('movies', MOVIE_CSV_FILE + '.idx')
 
 TICKET_CSV_FILE = movies_data.get('csv', {}).get('ticket', 'data/ticket.csv')
 TICKET_ZIP_FILE = movies_data.get('compressed', {}).get('ticket', 'compressed/ticket.zip')
+TICKET_INDEX_FILE = movies_data.get('index', {}).get('ticket', TICKET_CSV_FILE + '.idx')
+
+SESSION_CSV_FILE = movies_data.get('csv', {}).get('session', 'data/session.csv')
+SESSION_ZIP_FILE = movies_data.get('compressed', {}).get('session', 'compressed/session.zip')
+SESSION_INDEX_FILE = movies_data.get('index', {}).get('session', SESSION_CSV_FILE + '.idx')
+
+storage_data = ler_config_yaml().get('storage', {})
+STORAGE_BACKEND = storage_data.get('backend', 'csv')
+STORAGE_BACKENDS = storage_data.get('tables', None) or {}
+SQLITE_FILE = storage_data.get('sqlite', {}).get('path', 'data/cinema.db')
+COLUMNAR = storage_data.get('columnar', None) or {}
+SNAPSHOT_WARM = storage_data.get('snapshot', {}).get('warm_on_startup', True)
+QUERY_CACHE = storage_data.get('query_cache', None) or {}
+
+# Colunas de cada entidade, na ordem do header dos CSVs (e da tabela no backend sqlite)
+MOVIE_COLUMNS = [('id', 'INTEGER'), ('title', 'TEXT'), ('genre', 'TEXT'), ('director', 'TEXT'),
+                 ('duration_minutes', 'INTEGER'), ('release_year', 'INTEGER'), ('rating', 'TEXT')]
+SESSION_COLUMNS = [('id', 'INTEGER'), ('movie_id', 'TEXT'), ('start_time', 'TEXT'), ('room', 'TEXT'),
+                   ('available_seats', 'TEXT')]
+TICKET_COLUMNS = [('id', 'INTEGER'), ('session_id', 'INTEGER'), ('client_name', 'TEXT'), ('seat', 'TEXT'),
+                  ('purchase_date', 'TEXT'), ('ticket_type', 'TEXT'), ('price', 'REAL')]
+
+MOVIE_CODEC = CsvCodec(name for name, _ in MOVIE_COLUMNS)
+SESSION_CODEC = CsvCodec(name for name, _ in SESSION_COLUMNS)
+TICKET_CODEC = CsvCodec(name for name, _ in TICKET_COLUMNS)
+
+# Campos de cada entidade, na ordem das colunas acima.
+# As linhas ficam em memória no formato compacto de models/rows.py; `build` é a
+# própria classe da linha (dados confiáveis) ou validated(...) (passa pelo Pydantic).
+# Datas e campos de baixa cardinalidade passam por controller/parsing.py
+
+def _movie_from_fields(fields, build: Callable = MovieRow) -> MovieRow:
+    id, title, genre, director, duration_minutes, release_year, rating = fields
+    return build(
+        id=int(id),
+        title=title,
+        genre=intern(genre),
+        director=intern(director),
+        duration_minutes=int(duration_minutes),
+        release_year=int(release_year),
+        rating=intern(rating)
+    )
+
+
+def _session_from_fields(fields, build: Callable = SessionRow) -> SessionRow:
+    id, movie_id, start_time, room, available_seats = fields
+    return build(
+        id=int(id),
+        movie_id=intern(movie_id),
+        start_time=parse_datetime(start_time),
+        room=intern(room),
+        available_seats=intern_items(available_seats)
+    )
+
+
+def _ticket_from_fields(fields, build: Callable = TicketRow) -> TicketRow:
+    id, session_id, client_name, seat, purchase_date, ticket_type, price = fields
+    return build(
+        id=int(id),
+        session_id=int(session_id),
+        client_name=client_name,
+        seat=intern(seat),
+        purchase_date=parse_datetime(purchase_date),
+        ticket_type=intern(ticket_type),
+        price=float(price)
+    )
+
+
+def _movie_fields(movie: MovieRow) -> tuple:
+    return (movie.id, movie.title, movie.genre, movie.director, movie.duration_minutes, movie.release_year, movie.rating)
+
+
+def _session_fields(session: SessionRow) -> tuple:
+    # AvailableSeats é uma sequência de strings, então usamos join para convertê-la em uma string separada por ponto e vírgula
+    return (session.id, session.movie_id, session.start_time.isoformat(), session.room, ';'.join(session.available_seats))
+
+
+def _ticket_fields(ticket: TicketRow) -> tuple:
+    return (ticket.id, ticket.session_id, ticket.client_name, ticket.seat, ticket.purchase_date.isoformat(), ticket.ticket_type, ticket.price)
+
+# Parsers validados (as versões confiáveis são os próprios _*_from_fields).
+# Funções de módulo: o load paralelo as envia aos processos por pickle
+
+_validated_movie = validated(MovieRow)
+_validated_session = validated(SessionRow)
+_validated_ticket = validated(TicketRow)
+
+
+def _parse_movie(fields) -> MovieRow:
+    return _movie_from_fields(fields, _validated_movie)
+
+
+def _parse_session(fields) -> SessionRow:
+    return _session_from_fields(fields, _validated_session)
+
+
+def _parse_ticket(fields) -> TicketRow:
+    return _ticket_from_fields(fields, _validated_ticket)
+
+# Arquivos (CSV + sidecar .idx + journal + snapshot) de cada entidade
+
+movies_offsets = OffsetIndex(MOVIE_CSV_FILE, MOVIE_INDEX_FILE)
+sessions_offsets = OffsetIndex(SESSION_CSV_FILE, SESSION_INDEX_FILE)
+tickets_offsets = OffsetIndex(TICKET_CSV_FILE, TICKET_INDEX_FILE)
+
+movies_file = CsvFile(MOVIE_CSV_FILE, MOVIE_CODEC, _parse_movie, _movie_fields, movies_offsets, _movie_from_fields, MovieRow)
+sessions_file = CsvFile(SESSION_CSV_FILE, SESSION_CODEC, _parse_session, _session_fields, sessions_offsets, _session_from_fields, SessionRow)
+tickets_file = CsvFile(TICKET_CSV_FILE, TICKET_CODEC, _parse_ticket, _ticket_fields, tickets_offsets, _ticket_from_fields, TicketRow)
+
+# Backend de armazenamento de cada tabela (storage.backend no config.yaml)
+
+# Colunas do ColumnStore opcional (storage.columnar no config.yaml, só no backend csv)
+TICKET_COLUMNAR = [('id', 'int'), ('session_id', 'int'), ('price', 'float'), ('purchase_date', 'datetime'),
+                   ('client_name', 'str'), ('seat', 'str'), ('ticket_type', 'str')]
+
+
+# Índices secundários mantidos pelo backend csv: igualdade (valor -> ids), faixa (ordenado),
+# itens de campos separados por ';' (item -> ids) e substring (trigramas)
+MOVIE_TOKENIZED = ['genre']
+MOVIE_SUBSTRING = ['title', 'director']
+TICKET_SUBSTRING = ['client_name', 'seat']
+SESSION_HASHED = ['movie_id', 'room']
+TICKET_HASHED = ['session_id', 'ticket_type']
+
+
+def _secondary_indexes(name: str, hashed: List[str], ranges: List[Tuple[str, Callable]] = (), tokenized: List[str] = (),
+                       substring: List[str] = ()) -> list:
+    indexes = [HashIndex(name, hashed)] if hashed else []
+    indexes += [SortedIndex(name, field, key) for field, key in ranges]
+    indexes += [TokenIndex(name, field) for field in tokenized]
+    return indexes + ([NgramIndex(name, substring)] if substring else [])
+
+
+# Ingressos vendidos e receita por sessão, tipo de ingresso e dia da compra, mantidos a cada
+# escrita em tickets (por filme, somando as sessões de cada filme)
+def _ticket_aggregates() -> Aggregates:
+    return Aggregates('ticket_totals', {
+        'session': (lambda ticket: ticket.session_id, '{row}.session_id'),
+        'ticket_type': (lambda ticket: ticket.ticket_type, '{row}.ticket_type'),
+        # data no fuso gravado na compra (o texto ISO começa por ela)
+        'day': (lambda ticket: ticket.purchase_date.date().isoformat(), 'substr({row}.purchase_date, 1, 10)'),
+    }, (lambda ticket: ticket.price, '{row}.price'))
+
+
+def _repository(name: str, csv_file: CsvFile, columns, to_fields, from_fields, indexes, columnar=None, secondary=(),
+                aggregates=None, ranges=()) -> Repository:
+    backend = STORAGE_BACKENDS.get(name, STORAGE_BACKEND)
+    if backend == 'sqlite':
+        # o banco já guarda as linhas prontas: o snapshot do CSV não seria usado
+        csv_file.snapshot = None
+        return SqliteRepository(name, SQLITE_FILE, columns, to_fields, from_fields, csv_file, indexes, aggregates, ranges)
+    if backend != 'csv':
+        logger.warning(f"[controller] - Unknown storage backend '{backend}' for {name}, using 'csv'")
+    cache = EntityCache(name, csv_file.path, csv_file.load, csv_file.signature)
+    store = ColumnStore(name, columnar) if columnar and COLUMNAR.get(name, False) else None
+    return CsvRepository(cache, csv_file, store, secondary, aggregates)
+
+
+movies_repository = _repository('movies', movies_file, MOVIE_COLUMNS, _movie_fields, _movie_from_fields, [],
+                                secondary=_secondary_indexes('movies', [], tokenized=MOVIE_TOKENIZED, substring=MOVIE_SUBSTRING))
+sessions_repository = _repository('sessions', sessions_file, SESSION_COLUMNS, _session_fields, _session_from_fields, ['movie_id'],
+                                  secondary=_secondary_indexes('sessions', SESSION_HASHED, [('start_time', epoch_us)]),
+                                  ranges=['start_time'])
+tickets_repository = _repository('tickets', tickets_file, TICKET_COLUMNS, _ticket_fields, _ticket_from_fields, ['session_id'],
+                                 TICKET_COLUMNAR, _secondary_indexes('tickets', TICKET_HASHED, substring=TICKET_SUBSTRING),
+                                 _ticket_aggregates())
+
+# Escritor único: todas as mutações passam por ele (ver controller/writer.py)
+
+repositories = [movies_repository, sessions_repository, tickets_repository]
+writer = MutationQueue(repositories)
+
+# Resultados dos endpoints -filter, reaproveitados enquanto a tabela não muda (ver controller/query_cache.py)
+
+query_cache = QueryCache(QUERY_CACHE.get('max_entries', 256), QUERY_CACHE.get('max_rows', 1_000_000),
+                         QUERY_CACHE.get('max_result_rows', 10_000))
 
 # Utility functions
 
-def read_tickets_csv() -> List[Ticket]:
-    tickets: List[Ticket] = []
-    if os.path.exists(TICKET_CSV_FILE):
-        with open(TICKET_CSV_FILE, mode='r', encoding='utf-8') as file:
-            next(file, None)  # ignora o header
-            for line in file:
-                id, session_id, client_name, seat, purchase_date, ticket_type, price = line.strip().split(',')
-                tickets.append(
-                    Ticket(
-                        id=int(id),
-                        session_id=int(session_id),
-                        client_name=client_name,
-                        seat=seat,
-                        purchase_date=datetime.fromisoformat(purchase_date),
-                        ticket_type=ticket_type,
-                        price=price
-                    )
-                )
-    return tickets
+def read_movies_csv() -> List[MovieRow]:
+    return list(movies_repository.scan())
 
 
-SESSION_CSV_FILE = movies_data.get('csv', {}).get('session', 'data/session.csv')
-SESSION_ZIP_FILE = movies_data.get('compressed', {}).get('session', 'compressed/session.zip')
+def read_session_csv() -> List[SessionRow]:
+    return list(sessions_repository.scan())
+
+
+def read_tickets_csv() -> List[TicketRow]:
+    return list(tickets_repository.scan())
+
+
+# Leitura em streaming: geradores para as rotas de listagem e filtro
+
+def iter_movies() -> Iterator[MovieRow]:
+    return movies_repository.scan()
+
+
+def iter_sessions() -> Iterator[SessionRow]:
+    return sessions_repository.scan()
+
+
+def iter_tickets() -> Iterator[TicketRow]:
+    return tickets_repository.scan()
+
+
+def iter_movies_by_id(after: Optional[int] = None) -> Iterator[MovieRow]:
+    return movies_repository.scan(by_id=True, after=after)
+
+
+def iter_sessions_by_id(after: Optional[int] = None) -> Iterator[SessionRow]:
+    return sessions_repository.scan(by_id=True, after=after)
+
+
+def iter_tickets_by_id(after: Optional[int] = None) -> Iterator[TicketRow]:
+    return tickets_repository.scan(by_id=True, after=after)
+
+# Filtros: cada backend decide como avaliar as condições (ver controller/repository.py)
+
+def iter_sessions_where(conditions: List[Condition], by_id: bool = False, after: Optional[int] = None) -> Iterator[SessionRow]:
+    return sessions_repository.filter(conditions, by_id, after)
+
+
+def iter_tickets_where(conditions: List[Condition], by_id: bool = False, after: Optional[int] = None) -> Iterator[TicketRow]:
+    return tickets_repository.filter(conditions, by_id, after)
+
+
+def _query(entity: str, repository: Repository, conditions: List[Condition], by_id: bool, after: Optional[int]) -> Iterator:
+    # a versão é lida antes da consulta: se uma escrita acontecer no meio, o
+    # resultado fica guardado na versão anterior e não é servido de novo
+    version = repository.version()
+    return query_cache.rows(entity, version, conditions, by_id, after,
+                            lambda after: repository.filter(conditions, by_id, after))
+
+
+def query_movies(conditions: List[Condition], by_id: bool = False, after: Optional[int] = None) -> Iterator[MovieRow]:
+    return _query('movies', movies_repository, conditions, by_id, after)
+
+
+def query_sessions(conditions: List[Condition], by_id: bool = False, after: Optional[int] = None) -> Iterator[SessionRow]:
+    return _query('sessions', sessions_repository, conditions, by_id, after)
+
+
+def query_tickets(conditions: List[Condition], by_id: bool = False, after: Optional[int] = None) -> Iterator[TicketRow]:
+    return _query('tickets', tickets_repository, conditions, by_id, after)
+
+
+def explain_movies(conditions: List[Condition]) -> dict:
+    return movies_repository.explain(conditions)
+
+
+def explain_sessions(conditions: List[Condition]) -> dict:
+    return sessions_repository.explain(conditions)
+
+
+def explain_tickets(conditions: List[Condition]) -> dict:
+    return tickets_repository.explain(conditions)
+
+
+def upcoming_sessions(limit: int) -> List[SessionRow]:
+    # próximas sessões a partir de agora, em ordem de início (índice ordenado de start_time)
+    return sessions_repository.ordered('start_time', datetime.now(timezone.utc), limit, epoch_us)
+
+
+def count_movies_by_genre() -> Dict[str, int]:
+    # filmes por gênero (índice invertido de genre no backend csv)
+    return movies_repository.item_counts('genre')
+
+
+def count_movies(conditions: Optional[List[Condition]] = None) -> int:
+    return movies_repository.count_where(conditions) if conditions else movies_repository.count()
+
+
+def count_sessions(conditions: Optional[List[Condition]] = None) -> int:
+    return sessions_repository.count_where(conditions) if conditions else sessions_repository.count()
+
+
+def count_tickets(conditions: Optional[List[Condition]] = None) -> int:
+    return tickets_repository.count_where(conditions) if conditions else tickets_repository.count()
+
+
+def _movie_key(movie_id: str):
+    # movie_id das sessões é texto: sai como int, igual à chave dos outros agrupamentos; um
+    # valor não numérico (sessão gravada por fora da API) continua como texto
+    try:
+        return int(movie_id)
+    except ValueError:
+        return movie_id
+
+
+def ticket_totals(group_by: str) -> List[dict]:
+    # ingressos vendidos e receita por grupo, lidos dos agregados: O(grupos), sem varrer os ingressos
+    if group_by == 'movie':
+        movie_of = {session.id: _movie_key(session.movie_id) for session in sessions_repository.scan()}
+        totals: Dict[object, Tuple[int, int]] = {}
+        for session_id, (tickets, amount) in tickets_repository.totals('session').items():
+            movie_id = movie_of.get(session_id)
+            if movie_id is None:
+                # sessão removida por fora da API: não há filme a que atribuir
+                continue
+            count, total = totals.get(movie_id, (0, 0))
+            totals[movie_id] = (count + tickets, total + amount)
+    else:
+        totals = tickets_repository.totals(group_by)
+    # chaves numéricas primeiro e depois as de texto (por filme elas podem se misturar)
+    return [{"key": key, "tickets": tickets, "revenue": amount / 100}
+            for key, (tickets, amount) in sorted(totals.items(), key=lambda item: (isinstance(item[0], str), item[0]))]
+
+
+# Escrita pontual: os models recebidos pelas rotas viram linhas compactas. No backend csv a
+# inserção é um append no fim do arquivo e updates/deletes vão para o journal (ou reescrevem
+# o CSV, se o journal estiver cheio/desligado)
+
+def append_movie_csv(movie: Movie) -> None:
+    movies_repository.insert(MovieRow.from_model(movie))
+
+
+def append_session_csv(session: Session) -> None:
+    sessions_repository.insert(SessionRow.from_model(session))
+
+
+def append_ticket_csv(ticket: Ticket) -> None:
+    tickets_repository.insert(TicketRow.from_model(ticket))
+
+
+def update_movie_csv(movie: Movie) -> None:
+    movies_repository.update(MovieRow.from_model(movie))
+
+
+def update_session_csv(session: Session) -> None:
+    sessions_repository.update(SessionRow.from_model(session))
+
+
+def update_ticket_csv(ticket: Ticket) -> None:
+    tickets_repository.update(TicketRow.from_model(ticket))
+
+
+def delete_movie_csv(movie_id: int) -> MovieRow:
+    return movies_repository.delete(movie_id)
+
+
+def delete_session_csv(session_id: int) -> SessionRow:
+    return sessions_repository.delete(session_id)
+
+
+def delete_ticket_csv(ticket_id: int) -> TicketRow:
+    return tickets_repository.delete(ticket_id)
+
+# Checkpoint: aplica o journal pendente (CSV) ou o WAL (sqlite) ao arquivo principal
+
+def checkpoint_movies_csv() -> bool:
+    return writer.submit(movies_repository.checkpoint)
+
+
+def checkpoint_session_csv() -> bool:
+    return writer.submit(sessions_repository.checkpoint)
+
+
+def checkpoint_tickets_csv() -> bool:
+    return writer.submit(tickets_repository.checkpoint)
+
+# Snapshot: carrega as tabelas na subida e grava os snapshots ao encerrar
+
+def warm_caches() -> None:
+    if not SNAPSHOT_WARM:
+        return
+    for repository in repositories:
+        repository.warm()
+
+
+def save_snapshots() -> None:
+    for repository in repositories:
+        writer.submit(repository.save_snapshot)
+
+# Export: deixa o CSV em dia antes de expor o arquivo em zip/hash
+
+def export_movies_csv() -> str:
+    return writer.submit(movies_repository.export_csv)
+
+
+def export_session_csv() -> str:
+    return writer.submit(sessions_repository.export_csv)
+
+
+def export_tickets_csv() -> str:
+    return writer.submit(tickets_repository.export_csv)
+
+# Consultas pela chave primária
+
+def find_movie_by_id(movie_id: int) -> Optional[MovieRow]:
+    return movies_repository.get(movie_id)
+
+
+def find_session_by_id(session_id: int) -> Optional[SessionRow]:
+    return sessions_repository.get(session_id)
+
+
+def find_ticket_by_id(ticket_id: int) -> Optional[TicketRow]:
+    return tickets_repository.get(ticket_id)
+
+
+def movie_exists(movie_id: int) -> bool:
+    return movies_repository.exists(movie_id)
+
+
+def session_exists(session_id: int) -> bool:
+    return sessions_repository.exists(session_id)
+
 
-def read_session_csv() -> List[Session]:
-    sessions: List[Session] = []
-    if os.path.exists(SESSION_CSV_FILE):
-        with open(SESSION_CSV_FILE, mode='r', encoding='utf-8') as file:
-            next(file, None) #ignora o header
-            for line in file:
-                id, movie_id, start_time, room, available_seats = line.strip().split(',')
-                sessions.append(
-                    Session(
-                        id=int(id),
-                        movie_id=movie_id, 
-                        start_time=datetime.fromisoformat(start_time), 
-                        room=room, 
-                        available_seats=available_seats.split(';')
-                    )
-                )
-    return sessions
+def ticket_exists(ticket_id: int) -> bool:
+    return tickets_repository.exists(ticket_id)
@@ -0,0 +1,128 @@
+import csv
+import io
+from itertools import islice, repeat
+from operator import contains, itemgetter
+from typing import Callable, Iterable, List, Optional, Sequence
+
+CHUNK_SIZE = 4096
+
+
+class CsvCodec:
+    """Leitura e escrita das linhas de uma entidade no formato RFC 4180.
+
+    Campos com vírgula, aspas ou quebra de linha são gravados entre aspas
+    (aspas internas duplicadas) pelo módulo csv. As linhas sem aspas, que são
+    quase todas, seguem pelo caminho rápido de split/join; só as que precisam
+    passam pelo csv.reader/csv.writer (ambos em C).
+    """
+
+    def __init__(self, columns: Iterable[str]):
+        self.columns = tuple(columns)
+        self.header = ','.join(self.columns) + '\n'
+
+    def decode(self, line: str) -> List[str]:
+        # campos na ordem das colunas da entidade
+        line = line.strip()
+        if '"' not in line:
+            return line.split(',')
+        return next(csv.reader((line,)))
+
+    def decode_many(self, lines: Iterable[str]) -> List[List[str]]:
+        # como decode, sem o custo de uma chamada por linha; ignora linhas em branco
+        lines = [line for line in map(str.strip, lines) if line]
+        if not any(map(contains, lines, repeat('"'))):
+            return [line.split(',') for line in lines]
+        reader = csv.reader
+        return [line.split(',') if '"' not in line else next(reader((line,))) for line in lines]
+
+    def encode(self, values: Sequence) -> str:
+        texts = [str(value) for value in values]
+        line = ','.join(texts)
+        if (line.count(',') == len(texts) - 1 and '"' not in line
+                and '\n' not in line and '\r' not in line):
+            return line + '\n'
+        buffer = io.StringIO()
+        # com '\r\n' como terminador o writer também coloca entre aspas os campos com '\r'
+        csv.writer(buffer, lineterminator='\r\n').writerow(texts)
+        return buffer.getvalue()[:-2] + '\n'
+
+    def reader(self, header: Optional[str]) -> 'FieldReader':
+        # mapeia as colunas do header do arquivo para a ordem da entidade
+        if not header or not header.strip():
+            return FieldReader(self, None)
+        names = [name.strip() for name in self.decode(header)]
+        if tuple(names) == self.columns:
+            return FieldReader(self, None)
+        missing = [column for column in self.columns if column not in names]
+        if missing:
+            raise ValueError(f"CSV header is missing columns: {', '.join(missing)}")
+        return FieldReader(self, itemgetter(*(names.index(column) for column in self.columns)))
+
+
+class FieldReader:
+    """Decodificador das linhas de um arquivo específico (picklable, usado no load paralelo)."""
+
+    def __init__(self, codec: CsvCodec, order: Optional[itemgetter]):
+        self.codec = codec
+        self.order = order
+        self.canonical = order is None
+
+    def __call__(self, line: str) -> Sequence[str]:
+        fields = self.codec.decode(line)
+        return fields if self.order is None else self.order(fields)
+
+    def many(self, lines: Iterable[str]) -> List[Sequence[str]]:
+        decoded = self.codec.decode_many(lines)
+        return decoded if self.order is None else list(map(self.order, decoded))
+
+    def parser(self, parse: Callable[[Sequence[str]], object]) -> 'LineParser':
+        return LineParser(self, parse)
+
+
+class LineParser:
+    # linha do arquivo -> linha da entidade; picklable desde que `parse` seja função de módulo
+
+    def __init__(self, reader: FieldReader, parse: Callable[[Sequence[str]], object]):
+        self.reader = reader
+        self.parse = parse
+
+    def __call__(self, line: str):
+        return self.parse(self.reader(line))
+
+    def many(self, lines: Iterable[str]) -> list:
+        # carga em massa, em blocos: evita uma chamada por linha sem manter todos os
+        # campos decodificados em memória ao mesmo tempo. Linhas em branco são ignoradas
+        lines = iter(lines)
+        rows = []
+        while True:
+            chunk = list(islice(lines, CHUNK_SIZE))
+            if not chunk:
+                return rows
+            rows.extend(map(self.parse, self.reader.many(chunk)))
+
+
+def split_records(text: str) -> List[str]:
+    # um registro por linha, exceto quando um campo entre aspas contém quebra de linha:
+    # enquanto o número de aspas acumulado for ímpar o registro continua na linha seguinte
+    lines = text.split('\n')
+    if '"' not in text:
+        return lines
+    records = []
+    pending, quotes = None, 0
+    for line in lines:
+        if pending is None:
+            quotes = line.count('"')
+            if quotes % 2:
+                pending = line
+            else:
+                records.append(line)
+            continue
+        pending += '\n' + line
+        quotes += line.count('"')
+        if not quotes % 2:
+            records.append(pending)
+            pending = None
+    if pending is not None:
+        # aspas sem fechamento: o decoder aponta o erro
+        records.append(pending)
+    return records
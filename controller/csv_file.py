@@ -0,0 +1,444 @@
+import gc
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+from typing import Callable, List, Optional, Sequence, Tuple
+from controller.cache import file_signature
+from controller.checksum import Checksum, crc32
+from controller.csv_codec import CsvCodec, FieldReader, LineParser, split_records
+from controller.journal import Journal
+from controller.mmap_reader import MappedCsv, line_offsets
+from controller.offset_index import OffsetIndex, count_csv_records, scan_csv_offsets
+from controller.parallel_loader import parse_parallel
+from controller.snapshot import Snapshot
+from utils.configs import ler_config_yaml
+from utils.logger_config import logger
+
+DURABILITY_LEVELS = ('always', 'batched', 'none')
+READERS = ('text', 'mmap')
+LOAD_MODES = ('trusted', 'verify')
+
+storage_config = ler_config_yaml().get('storage', {})
+DURABILITY = storage_config.get('durability', 'always')
+if DURABILITY not in DURABILITY_LEVELS:
+    logger.warning(f"[csv_file] - Unknown durability level '{DURABILITY}', using 'always'")
+    DURABILITY = 'always'
+JOURNAL_ENABLED = storage_config.get('journal', {}).get('enabled', True)
+JOURNAL_MAX_ENTRIES = storage_config.get('journal', {}).get('max_entries', 100)
+READER = storage_config.get('reader', 'text')
+if READER not in READERS:
+    logger.warning(f"[csv_file] - Unknown reader '{READER}', using 'text'")
+    READER = 'text'
+PARALLEL_ENABLED = storage_config.get('parallel', {}).get('enabled', True)
+PARALLEL_MIN_SIZE = storage_config.get('parallel', {}).get('min_size_mb', 32) * 1024 * 1024
+PARALLEL_WORKERS = storage_config.get('parallel', {}).get('workers', 0) or os.cpu_count() or 1
+SNAPSHOT_ENABLED = storage_config.get('snapshot', {}).get('enabled', True)
+LOAD_MODE = storage_config.get('load', 'trusted')
+if LOAD_MODE not in LOAD_MODES:
+    logger.warning(f"[csv_file] - Unknown load mode '{LOAD_MODE}', using 'verify'")
+    LOAD_MODE = 'verify'
+
+# Lock entre processos (ex.: vários workers do uvicorn). No Windows fica só o lock de thread do cache.
+try:
+    import fcntl
+
+    def _lock_file(file) -> None:
+        fcntl.flock(file.fileno(), fcntl.LOCK_EX)
+
+    def _unlock_file(file) -> None:
+        fcntl.flock(file.fileno(), fcntl.LOCK_UN)
+except ImportError:
+    def _lock_file(file) -> None:
+        pass
+
+    def _unlock_file(file) -> None:
+        pass
+
+
+def _fsync_dir(path: str) -> None:
+    # garante que o rename em si sobreviva a uma queda (não suportado no Windows)
+    try:
+        fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+@contextmanager
+def _bulk_allocation():
+    # carga de centenas de milhares de linhas: nenhuma delas é lixo, então as
+    # passadas do coletor cíclico durante a carga são puro custo (~75% do tempo
+    # de montar as linhas a partir do snapshot)
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+class CsvFile:
+    """Persistência de uma entidade em CSV.
+
+    Reescritas completas vão para um arquivo temporário que é sincronizado e
+    renomeado atomicamente sobre o original. Updates e deletes pontuais vão
+    para o journal e só são aplicados ao CSV no próximo checkpoint.
+
+    As linhas são lidas e gravadas pelo `codec` (RFC 4180); `parse` e
+    `trusted_parse` recebem os campos já na ordem das colunas da entidade,
+    mesmo que o header do arquivo tenha outra ordem ou colunas extras, e
+    `to_fields` faz o caminho inverso.
+    `trusted_parse` monta a linha sem validação; só é usado quando o
+    conteúdo bate com o checksum das gravações feitas pela API.
+    Com `row_class`, as linhas carregadas também vão para um snapshot binário
+    (<csv>.snap) que evita o parse enquanto CSV e journal não mudarem.
+    """
+
+    def __init__(self, path: str, codec: CsvCodec, parse: Callable[[Sequence[str]], object],
+                 to_fields: Callable[[object], Sequence], offsets: OffsetIndex,
+                 trusted_parse: Optional[Callable[[Sequence[str]], object]] = None,
+                 row_class: Optional[type] = None):
+        self.path = path
+        self.codec = codec
+        self.header = codec.header
+        self.parse = parse
+        self.trusted_parse = trusted_parse
+        self.to_fields = to_fields
+        self.offsets = offsets
+        self._reader: Optional[FieldReader] = None
+        self._reader_signature = None
+        self.checksum = Checksum(path + '.sum')
+        self.trusted = False
+        self._loaded_sum = None
+        self.snapshot = Snapshot(path + '.snap', row_class) if SNAPSHOT_ENABLED and row_class else None
+        self.from_snapshot = False
+        self.parallel = PARALLEL_ENABLED
+        self.journal = Journal(path + '.journal') if JOURNAL_ENABLED else None
+        self.mapped = MappedCsv(path) if READER == 'mmap' else None
+        # buffers do group commit (preenchidos apenas entre begin_batch e commit)
+        self._batching = False
+        self._pending_lines: List[Tuple[int, bytes]] = []
+        self._pending_journal: List[dict] = []
+        self._held = threading.local()
+
+    @contextmanager
+    def exclusive(self):
+        # lock entre processos num arquivo fixo (<csv>.lock): o CSV em si é trocado
+        # pelo rename da reescrita, e um lock no inode antigo não protegeria nada.
+        # Reentrante na mesma thread (ex.: export do sqlite em volta do rewrite)
+        if getattr(self._held, 'depth', 0):
+            self._held.depth += 1
+            try:
+                yield
+            finally:
+                self._held.depth -= 1
+            return
+        with open(self.path + '.lock', mode='a+b') as file:
+            _lock_file(file)
+            self._held.depth = 1
+            try:
+                yield
+            finally:
+                self._held.depth = 0
+                _unlock_file(file)
+
+    def signature(self) -> Tuple:
+        return (file_signature(self.path), self.journal.signature() if self.journal else None)
+
+    def pending(self) -> int:
+        return (len(self.journal) if self.journal else 0) + len(self._pending_journal)
+
+    def to_line(self, row) -> str:
+        return self.codec.encode(self.to_fields(row))
+
+    # Leitura
+
+    def _file_reader(self) -> FieldReader:
+        # decodificador conforme o header atual do arquivo (relido só quando o arquivo muda)
+        signature = file_signature(self.path)
+        if self._reader is None or signature != self._reader_signature:
+            header = None
+            if signature is not None:
+                with open(self.path, mode='rb') as file:
+                    header = file.readline().decode('utf-8')
+            self._reader = self.codec.reader(header)
+            self._reader_signature = signature
+        return self._reader
+
+    def _parse_line(self, line: str):
+        return self.parse(self._file_reader()(line))
+
+    def _parse_journal_line(self, line: str):
+        # o journal é sempre gravado na ordem das colunas da entidade
+        return self.parse(self.codec.decode(line))
+
+    def _parse_for(self, size: int, crc: int) -> LineParser:
+        self.trusted = (LOAD_MODE == 'trusted' and self.trusted_parse is not None
+                        and self.checksum.matches(size, crc))
+        reader = self._file_reader()
+        if self.trusted:
+            return reader.parser(self.trusted_parse)
+        self._loaded_sum = (size, crc)
+        return reader.parser(self.parse)
+
+    def load(self) -> List:
+        with _bulk_allocation():
+            return self._load()
+
+    def _load(self) -> List:
+        # assinatura lida antes dos dados: se algo mudar no meio da leitura, o snapshot já nasce velho
+        key = self.signature()
+        self.from_snapshot = False
+        if self.snapshot:
+            rows = self.snapshot.load(key)
+            if rows is not None:
+                self.trusted = self.from_snapshot = True
+                return rows
+        rows = []
+        self.trusted = False
+        self._loaded_sum = None
+        # (offset, tamanho) de cada registro, quando a leitura já os conhece
+        spans: Optional[List[Tuple[int, int]]] = None
+        parallel = self._load_parallel() if self._use_parallel() else None
+        if parallel is not None:
+            rows = parallel
+        elif self.mapped:
+            spans = []
+            rows = self.mapped.rows(self._parse_for, spans)
+        elif os.path.exists(self.path):
+            with open(self.path, mode='rb') as file:
+                data = file.read()
+            parse = self._parse_for(len(data), crc32(data))
+            records = split_records(data.decode('utf-8'))
+            rows = parse.many(records[1:]) #ignora o header
+            if not self.offsets.is_fresh():
+                spans = list(line_offsets(data))
+        if os.path.exists(self.path) and not self.offsets.is_fresh():
+            self._index_offsets(key[0], rows, spans)
+        if self._loaded_sum is not None:
+            # conteúdo validado linha a linha: o próximo load pode confiar nele
+            self.checksum.write(*self._loaded_sum)
+        if self.journal:
+            entries = self.journal.entries()
+            if entries:
+                rows = self._replay(rows, entries)
+        if self.snapshot:
+            self.snapshot.write(key, rows)
+        return rows
+
+    def _index_offsets(self, signature, rows: List, spans: Optional[List[Tuple[int, int]]]) -> None:
+        # sidecar .idx a partir da carga completa (linhas do CSV, antes do replay do journal):
+        # toda tabela carregada passa a ter o índice em dia, e os appends o mantêm. A
+        # assinatura é a lida antes dos dados: se o CSV mudou no meio, o índice nasce velho
+        if spans is not None and len(spans) == len(rows):
+            entries = [(row.id, offset, length) for row, (offset, length) in zip(rows, spans)]
+        else:
+            # carga paralela (ou linhas em branco no arquivo): varre os bytes do CSV
+            entries = list(scan_csv_offsets(self.path))
+        self.offsets.write(entries, signature)
+
+    def count_rows(self) -> Optional[int]:
+        # quantidade de linhas sem carregar a tabela: snapshot em dia, sidecar .idx em dia
+        # (descontando os deletes do journal) ou quebras de linha do CSV. None quando só o load sabe
+        if self._batching:
+            return None
+        if self.snapshot:
+            count = self.snapshot.count(self.signature())
+            if count is not None:
+                return count
+        entries = self.journal.entries() if self.journal else []
+        deleted = {entry['id'] for entry in entries if entry['op'] == 'delete'}
+        if not deleted:
+            count = self.offsets.count()
+            return count if count is not None else count_csv_records(self.path)
+        # os deletes só contam para ids que estão no CSV (o .idx supõe o id na primeira coluna)
+        ids = self.offsets.ids() if self._file_reader().canonical else None
+        if ids is None:
+            return None
+        return len(ids) - sum(1 for id in deleted if id in ids)
+
+    def _use_parallel(self) -> bool:
+        if not self.parallel or PARALLEL_WORKERS < 2:
+            return False
+        try:
+            return os.path.getsize(self.path) >= PARALLEL_MIN_SIZE
+        except OSError:
+            return False
+
+    def _load_parallel(self) -> Optional[List]:
+        try:
+            return parse_parallel(self.path, self._parse_for, PARALLEL_WORKERS)
+        except Exception as exc:
+            # ex.: processos indisponíveis ou linha inválida; a leitura sequencial refaz (e reporta o erro real)
+            logger.warning(f"[csv_file] - Parallel load of {self.path} failed ({exc!r}), parsing sequentially")
+            return None
+
+    def save_snapshot(self, rows: List) -> bool:
+        # grava o snapshot das linhas atuais (ex.: ao encerrar, depois do checkpoint)
+        key = self.signature()
+        if self.snapshot is None or self.snapshot.is_fresh(key):
+            return False
+        self.snapshot.write(key, rows)
+        return True
+
+    def _replay(self, rows: List, entries: List[dict]) -> List:
+        position = {row.id: index for index, row in enumerate(rows)}
+        for entry in entries:
+            index = position.get(entry['id'])
+            if index is None:
+                continue
+            if entry['op'] == 'update':
+                rows[index] = self._parse_journal_line(entry['line'])
+            elif entry['op'] == 'delete':
+                rows[index] = None
+                del position[entry['id']]
+        return [row for row in rows if row is not None]
+
+    def lookup(self, id: int) -> Tuple[bool, Optional[object]]:
+        # leitura de uma linha sem carregar a tabela: journal primeiro, depois o sidecar .idx
+        if self.journal:
+            entry = self.journal.pending_ids().get(id)
+            if entry is not None:
+                return True, self._parse_journal_line(entry['line']) if entry['op'] == 'update' else None
+        if not self._file_reader().canonical:
+            # .idx e busca no mmap supõem o id na primeira coluna
+            return False, None
+        used, row = self.offsets.lookup(id, self._parse_line)
+        if not used and self.mapped:
+            # sidecar ausente/desatualizado: procura a linha direto nos bytes mapeados
+            return True, self.mapped.find(id, self._parse_line)
+        return used, row
+
+    # Escrita
+
+    def rewrite(self, rows: List) -> None:
+        directory = os.path.dirname(os.path.abspath(self.path))
+        with self.exclusive():
+            # nome único: reescritas de workers diferentes não disputam o mesmo temporário
+            fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=os.path.basename(self.path) + '.', suffix='.tmp')
+            try:
+                entries = []
+                with os.fdopen(fd, mode='wb') as file:
+                    header = self.header.encode('utf-8')
+                    offset = file.write(header)
+                    crc = crc32(header)
+                    for row in rows:
+                        data = self.to_line(row).encode('utf-8')
+                        entries.append((row.id, offset, len(data)))
+                        offset += file.write(data)
+                        crc = crc32(data, crc)
+                    file.flush()
+                    if DURABILITY != 'none':
+                        os.fsync(file.fileno())
+                os.replace(tmp_path, self.path)
+            except BaseException:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+            if DURABILITY != 'none':
+                _fsync_dir(self.path)
+            self.offsets.write(entries)
+            self.checksum.write(offset, crc)
+            # as linhas recebidas já refletem tudo o que estava em buffer
+            self._pending_lines = []
+            self._pending_journal = []
+            # o journal só é descartado depois que o CSV novo já está no lugar;
+            # se cair entre os dois passos, o replay é idempotente
+            if self.journal:
+                self.journal.clear()
+
+    def _write_lines(self, lines: List[Tuple[int, bytes]]) -> None:
+        # acrescenta as linhas no fim do CSV com uma única escrita (e um único fsync);
+        # chamado com o _exclusive() adquirido
+        with open(self.path, mode='a+b') as file:
+            previous = file_signature(self.path)
+            end = file.seek(0, os.SEEK_END)
+            prefix = b''
+            if end == 0:
+                prefix = self.header.encode('utf-8')
+            else:
+                file.seek(end - 1)
+                if file.read(1) != b'\n':
+                    prefix = b'\n'
+            entries = []
+            offset = end + len(prefix)
+            for id, data in lines:
+                entries.append((id, offset, len(data)))
+                offset += len(data)
+            data = prefix + b''.join(data for _, data in lines)
+            file.write(data)
+            file.flush()
+            if DURABILITY == 'always':
+                os.fsync(file.fileno())
+            self.offsets.append(entries, previous)
+            self.checksum.extend(end, data)
+
+    def _has_journal_entry(self, id: int) -> bool:
+        if self.journal is None:
+            return False
+        return id in self.journal.pending_ids() or any(entry['id'] == id for entry in self._pending_journal)
+
+    def append(self, row, rows: List) -> None:
+        if self._has_journal_entry(row.id) or not self._file_reader().canonical:
+            # id com delete pendente no journal, ou header do arquivo em outra ordem:
+            # reescreve o CSV (no formato da entidade) junto com a nova linha
+            self.rewrite(rows + [row])
+            return
+        data = self.to_line(row).encode('utf-8')
+        if self._batching:
+            self._pending_lines.append((row.id, data))
+            return
+        with self.exclusive():
+            self._write_lines([(row.id, data)])
+
+    def _journal_or_rewrite(self, entry: dict, rows: List) -> None:
+        if self.journal is None or self.pending() >= JOURNAL_MAX_ENTRIES:
+            self.rewrite(rows)
+            return
+        if self._batching:
+            self._pending_journal.append(entry)
+            return
+        with self.exclusive():
+            self.journal.extend([entry], sync=DURABILITY == 'always')
+
+    def update(self, row, rows: List) -> None:
+        self._journal_or_rewrite({'op': 'update', 'id': row.id, 'line': self.to_line(row)}, rows)
+
+    def delete(self, id: int, rows: List) -> None:
+        self._journal_or_rewrite({'op': 'delete', 'id': id}, rows)
+
+    # Group commit
+
+    def begin_batch(self) -> None:
+        self._batching = True
+
+    def commit(self) -> None:
+        # linhas antes do journal: um update pode se referir a uma linha criada no mesmo lote
+        self._batching = False
+        lines, self._pending_lines = self._pending_lines, []
+        entries, self._pending_journal = self._pending_journal, []
+        if not lines and not entries:
+            return
+        with self.exclusive():
+            if lines:
+                self._write_lines(lines)
+            if entries:
+                self.journal.extend(entries, sync=DURABILITY == 'always')
+
+    def discard(self) -> None:
+        self._batching = False
+        self._pending_lines = []
+        self._pending_journal = []
+
+    def checkpoint(self, rows: List) -> bool:
+        if not self.pending():
+            return False
+        self.rewrite(rows)
+        return True
@@ -0,0 +1,78 @@
+from typing import Dict, Hashable, List, Optional, Sequence, Set
+from controller.repository import Condition
+from controller.secondary_index import SecondaryIndex
+
+# Operadores respondidos pelo índice. Textos entram normalizados com lower(), então
+# o índice devolve um superconjunto para `eq`: o repositório confere as condições
+# nas linhas candidatas
+HASH_OPS = ('eq', 'ieq')
+
+
+def _key(value) -> Hashable:
+    return value.lower() if isinstance(value, str) else value
+
+
+class HashIndex(SecondaryIndex):
+    """Índices secundários de igualdade (valor -> ids) sobre as linhas de um EntityCache.
+
+    Registrado como observer do cache, é atualizado a cada insert/update/delete
+    e recriado quando a tabela é recarregada. Filtros por igualdade nesses
+    campos passam só pelas linhas candidatas em vez de varrer a tabela.
+    """
+
+    def __init__(self, name: str, fields: Sequence[str]):
+        self.name = name
+        self.fields = tuple(fields)
+        self._index: Dict[str, Dict[Hashable, Set[int]]] = {}
+        self.reset([])
+
+    # Manutenção (chamada pelo EntityCache)
+
+    def reset(self, rows: List) -> None:
+        self._index = {field: {} for field in self.fields}
+        for row in rows:
+            self.insert(row)
+
+    def insert(self, row) -> None:
+        for field, index in self._index.items():
+            index.setdefault(_key(getattr(row, field)), set()).add(row.id)
+
+    def _remove(self, row) -> None:
+        for field, index in self._index.items():
+            key = _key(getattr(row, field))
+            ids = index.get(key)
+            if ids is None:
+                continue
+            ids.discard(row.id)
+            if not ids:
+                del index[key]
+
+    # Consulta
+
+    def supports(self, condition: Condition) -> bool:
+        field, op, value = condition
+        return field in self._index and op in HASH_OPS and (op == 'eq' or isinstance(value, str))
+
+    def exact(self, condition: Condition) -> bool:
+        # `eq` em texto é resolvido pela chave em minúsculas: precisa ser conferido na linha
+        return condition[1] == 'ieq' or not isinstance(condition[2], str)
+
+    def ids(self, conditions: List[Condition]) -> Set[int]:
+        # interseção dos conjuntos, começando pelo menor
+        sets = sorted((self._index[field].get(_key(value), set()) for field, _, value in conditions), key=len)
+        result: Optional[Set[int]] = None
+        for ids in sets:
+            result = set(ids) if result is None else result & ids
+            if not result:
+                return set()
+        return result if result is not None else set()
+
+    def estimate(self, conditions: List[Condition]) -> int:
+        # linhas candidatas: tamanho exato do menor conjunto
+        return min(len(self._index[field].get(_key(value), ())) for field, _, value in conditions)
+
+    def stats(self) -> dict:
+        return {
+            "fields": list(self.fields),
+            "distinct_values": {field: len(index) for field, index in self._index.items()},
+        }
@@ -0,0 +1,65 @@
+import json
+import os
+import threading
+from typing import Dict, List
+from controller.cache import FileSignature, file_signature
+
+
+class Journal:
+    """Write-ahead journal de mutações pontuais (update/delete) de um CSV.
+
+    Cada registro é uma linha JSON. Enquanto o journal não é aplicado
+    (checkpoint), o estado real da tabela é CSV + journal.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._entries: List[dict] = []
+        self._loaded_signature: FileSignature = None
+
+    def signature(self) -> FileSignature:
+        return file_signature(self.path)
+
+    def entries(self) -> List[dict]:
+        with self._lock:
+            signature = self.signature()
+            if signature != self._loaded_signature:
+                self._entries = []
+                if signature is not None:
+                    with open(self.path, mode='r', encoding='utf-8') as file:
+                        for line in file:
+                            line = line.strip()
+                            if not line:
+                                continue
+                            try:
+                                self._entries.append(json.loads(line))
+                            except json.JSONDecodeError:
+                                # registro truncado por uma queda no meio da escrita
+                                break
+                self._loaded_signature = signature
+            return list(self._entries)
+
+    def __len__(self) -> int:
+        return len(self.entries())
+
+    def pending_ids(self) -> Dict[int, dict]:
+        # último registro de cada id presente no journal
+        return {entry['id']: entry for entry in self.entries()}
+
+    def extend(self, entries: List[dict], sync: bool) -> None:
+        with self._lock:
+            with open(self.path, mode='a', encoding='utf-8') as file:
+                file.write(''.join(json.dumps(entry, ensure_ascii=False) + '\n' for entry in entries))
+                file.flush()
+                if sync:
+                    os.fsync(file.fileno())
+
+    def clear(self) -> None:
+        with self._lock:
+            try:
+                os.remove(self.path)
+            except FileNotFoundError:
+                pass
+            self._entries = []
+            self._loaded_signature = None
@@ -0,0 +1,113 @@
+import mmap
+import os
+from contextlib import contextmanager
+from typing import Callable, Iterator, Optional, Tuple
+from controller.checksum import crc32
+
+COUNT_BLOCK = 8 * 1024 * 1024
+
+
+@contextmanager
+def mapped(path: str) -> Iterator[Optional[mmap.mmap]]:
+    # mapeamento somente leitura; None se o arquivo não existe ou está vazio (mmap não aceita tamanho 0).
+    # As páginas vêm do page cache do SO, então vários workers do uvicorn lendo o mesmo CSV compartilham a memória
+    try:
+        file = open(path, 'rb')
+    except FileNotFoundError:
+        yield None
+        return
+    with file:
+        if os.fstat(file.fileno()).st_size == 0:
+            yield None
+            return
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            yield data
+
+
+def _count_quotes(data: mmap.mmap, start: int, end: int) -> int:
+    # aspas em data[start:end], em blocos (fatiar o mmap copia os bytes)
+    count = 0
+    for offset in range(start, end, COUNT_BLOCK):
+        count += data[offset:min(offset + COUNT_BLOCK, end)].count(b'"')
+    return count
+
+
+def _record_end(data: mmap.mmap, start: int, quoted: bool) -> int:
+    # fim (exclusivo) do registro que começa em `start`: um registro com número ímpar
+    # de aspas continua na linha seguinte (campo com quebra de linha, RFC 4180)
+    size = len(data)
+    end = data.find(b'\n', start)
+    end = size if end == -1 else end + 1
+    if quoted:
+        while end < size and data[start:end].count(b'"') % 2:
+            end = data.find(b'\n', end)
+            end = size if end == -1 else end + 1
+    return end
+
+
+def line_offsets(data: mmap.mmap) -> Iterator[Tuple[int, int]]:
+    # (offset, length) de cada registro, procurando '\n' direto nos bytes (sem decodificar).
+    # Sem aspas no arquivo, registro = linha
+    size = len(data)
+    start = data.find(b'\n') + 1  # pula o header
+    if start == 0:
+        return
+    quoted = data.find(b'"', start) != -1
+    while start < size:
+        end = _record_end(data, start, quoted)
+        if end - start > 1:
+            yield start, end - start
+        start = end
+
+
+def _collect(offsets: Iterator[Tuple[int, int]], spans: list) -> Iterator[Tuple[int, int]]:
+    for span in offsets:
+        spans.append(span)
+        yield span
+
+
+class MappedCsv:
+    """Leitura de um CSV via mmap.
+
+    Os limites das linhas são encontrados nos bytes crus e só as linhas
+    que realmente serão usadas passam pelo decoder UTF-8 e pelo parser.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def rows(self, parse_for: Callable[[int, int], Callable[[str], object]], spans: Optional[list] = None) -> list:
+        # `parse_for` recebe (tamanho, crc32) do conteúdo mapeado e devolve o parser (LineParser) a usar;
+        # com `spans`, recebe também o (offset, tamanho) de cada registro lido (para o sidecar .idx)
+        rows = []
+        with mapped(self.path) as data:
+            if data is None:
+                return rows
+            parse = parse_for(len(data), crc32(data))
+            offsets = line_offsets(data)
+            if spans is not None:
+                offsets = _collect(offsets, spans)
+            rows = parse.many(data[offset:offset + length].decode('utf-8') for offset, length in offsets)
+        return rows
+
+    def find(self, id: int, parse: Callable[[str], object]) -> Optional[object]:
+        # a linha do id começa logo após um '\n' com "<id>,": uma busca nos bytes, e só essa
+        # linha é decodificada. Com aspas no arquivo, o '\n' encontrado pode estar dentro de
+        # um campo com quebra de linha: a ocorrência só vale com número par de aspas antes dela
+        needle = b'\n' + str(id).encode('ascii') + b','
+        with mapped(self.path) as data:
+            if data is None:
+                return None
+            quoted = data.find(b'"') != -1
+            quotes, counted = 0, 0
+            position = data.find(needle)
+            while position != -1:
+                if quoted:
+                    quotes += _count_quotes(data, counted, position)
+                    counted = position
+                    if quotes % 2:
+                        position = data.find(needle, position + 1)
+                        continue
+                start = position + 1
+                return parse(data[start:_record_end(data, start, quoted)].decode('utf-8'))
+            return None
@@ -0,0 +1,183 @@
+from array import array
+from typing import Dict, List, Optional, Set
+from controller.repository import Condition
+from controller.secondary_index import SecondaryIndex
+
+N = 3
+# valores removidos ficam marcados nas listas de trigramas até a próxima compactação
+COMPACT_MIN = 1024
+
+
+def _grams(text: str) -> Set[str]:
+    return {text[index:index + N] for index in range(len(text) - N + 1)}
+
+
+class _Field:
+    # valores distintos (em minúsculas) de um campo, numerados, e trigrama -> números dos valores
+
+    def __init__(self):
+        self.numbers: Dict[str, int] = {}
+        self.texts: List[Optional[str]] = []
+        # id da linha (ou conjunto de ids, quando o valor se repete) de cada valor
+        self.ids: List[object] = []
+        self.postings: Dict[str, array] = {}
+        self.removed = 0
+
+    def add(self, value: str, id: int) -> None:
+        number = self.numbers.get(value)
+        if number is None:
+            number = self.numbers[value] = len(self.texts)
+            self.texts.append(value)
+            self.ids.append(id)
+            postings = self.postings
+            for gram in _grams(value):
+                posting = postings.get(gram)
+                if posting is None:
+                    posting = postings[gram] = array('I')
+                posting.append(number)
+            return
+        current = self.ids[number]
+        if isinstance(current, set):
+            current.add(id)
+        elif current != id:
+            self.ids[number] = {current, id}
+
+    def discard(self, value: str, id: int) -> None:
+        number = self.numbers.get(value)
+        if number is None:
+            return
+        current = self.ids[number]
+        if isinstance(current, set):
+            current.discard(id)
+            if len(current) > 1:
+                return
+            if current:
+                self.ids[number] = next(iter(current))
+                return
+        elif current != id:
+            return
+        del self.numbers[value]
+        self.texts[number] = None
+        self.ids[number] = None
+        self.removed += 1
+        if self.removed > COMPACT_MIN and self.removed * 2 > len(self.texts):
+            self.compact()
+
+    def compact(self) -> None:
+        live = [(text, ids) for text, ids in zip(self.texts, self.ids) if text is not None]
+        self.__init__()
+        for text, ids in live:
+            for id in (ids if isinstance(ids, set) else (ids,)):
+                self.add(text, id)
+
+    def candidates(self, text: str):
+        # números dos valores a conferir: a lista do trigrama mais raro do texto
+        # (vazia se algum trigrama não existe) ou todos, para textos curtos
+        grams = _grams(text)
+        if not grams:
+            return range(len(self.texts))
+        postings = [self.postings.get(gram) for gram in grams]
+        if not all(postings):
+            return ()
+        return min(postings, key=len)
+
+    def search(self, text: str) -> Set[int]:
+        texts, ids = self.texts, self.ids
+        result: Set[int] = set()
+        for number in self.candidates(text):
+            candidate = texts[number]
+            if candidate is not None and text in candidate:
+                current = ids[number]
+                if isinstance(current, set):
+                    result |= current
+                else:
+                    result.add(current)
+        return result
+
+
+class NgramIndex(SecondaryIndex):
+    """Índice de trigramas para buscas por substring (`icontains`) em campos de texto.
+
+    Cada valor distinto (em minúsculas) de um campo recebe um número, e cada
+    trigrama guarda os números dos valores que o contêm (array compacto). Uma
+    busca parte da lista do trigrama mais raro do texto e confere a substring
+    só nesses valores, uma vez por valor distinto e não por linha. Textos com
+    menos de três letras conferem todos os valores distintos. Mantido como
+    observer do EntityCache; depois de um reload o índice só é montado na
+    primeira busca, para não pesar na carga da tabela.
+    """
+
+    def __init__(self, name: str, fields: List[str]):
+        self.name = name
+        self.fields = tuple(fields)
+        self._fields: Dict[str, _Field] = {}
+        # linhas do cache (a mesma lista, alterada no lugar) enquanto o índice não é montado
+        self._pending: Optional[List] = None
+        self._rows = 0
+        self.reset([])
+
+    # Manutenção (chamada pelo EntityCache)
+
+    def reset(self, rows: List) -> None:
+        self._fields = {}
+        self._pending = rows
+
+    def _build(self) -> None:
+        rows, self._pending = self._pending, None
+        self._fields = {field: _Field() for field in self.fields}
+        self._rows = 0
+        for row in rows:
+            self.insert(row)
+
+    def insert(self, row) -> None:
+        if self._pending is not None:
+            return
+        self._rows += 1
+        for field, values in self._fields.items():
+            values.add(getattr(row, field).lower(), row.id)
+
+    def _remove(self, row) -> None:
+        # sem índice montado não há o que remover: a lista pendente já está em dia
+        if self._pending is not None:
+            return
+        self._rows -= 1
+        for field, values in self._fields.items():
+            values.discard(getattr(row, field).lower(), row.id)
+
+    # Consulta
+
+    def supports(self, condition: Condition) -> bool:
+        field, op, value = condition
+        return field in self.fields and op == 'icontains' and isinstance(value, str)
+
+    def ids(self, conditions: List[Condition]) -> Set[int]:
+        # chamado com o lock do cache adquirido (EntityCache.select_ids)
+        if self._pending is not None:
+            self._build()
+        sets = sorted((self._fields[field].search(value.lower()) for field, _, value in conditions), key=len)
+        result = sets[0]
+        for ids in sets[1:]:
+            if not result:
+                break
+            result &= ids
+        return result
+
+    def estimate(self, conditions: List[Condition]) -> int:
+        # valores candidatos vezes a média de linhas por valor distinto do campo
+        if self._pending is not None:
+            self._build()
+        def rows(condition: Condition) -> int:
+            field, _, value = condition
+            values = self._fields[field]
+            if not values.numbers:
+                return 0
+            return -(-len(values.candidates(value.lower())) * self._rows // len(values.numbers))
+        return min(rows(condition) for condition in conditions)
+
+    def stats(self) -> dict:
+        return {
+            "fields": list(self.fields),
+            "built": self._pending is None,
+            "distinct_values": {field: len(values.numbers) for field, values in self._fields.items()},
+            "trigrams": {field: len(values.postings) for field, values in self._fields.items()},
+        }
@@ -0,0 +1,173 @@
+import os
+import struct
+import threading
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+from controller.cache import FileSignature, file_signature
+
+# Formato do arquivo .idx:
+#   cabeçalho = MAGIC + assinatura do CSV coberto (mtime_ns, size, inode)
+#   registros = (id, offset, length) de cada linha, na ordem do CSV
+MAGIC = b'CSVIDX1\0'
+HEADER = struct.Struct('<8sqqq')
+RECORD = struct.Struct('<qQI')
+
+Entry = Tuple[int, int, int]
+
+COUNT_CHUNK = 16 * 1024 * 1024
+
+
+class OffsetIndex:
+    """Índice id -> (offset, length) gravado ao lado do CSV.
+
+    Permite ler uma única linha com um seek + read, sem parsear o arquivo
+    inteiro. O índice só é usado enquanto a assinatura gravada no cabeçalho
+    for igual à do CSV; caso contrário é considerado desatualizado.
+    """
+
+    def __init__(self, csv_path: str, index_path: str):
+        self.csv_path = csv_path
+        self.index_path = index_path
+        self._lock = threading.Lock()
+        self._entries: Dict[int, Tuple[int, int]] = {}
+        self._loaded_signature: FileSignature = None
+
+    def _read_header(self) -> FileSignature:
+        try:
+            with open(self.index_path, 'rb') as file:
+                raw = file.read(HEADER.size)
+        except FileNotFoundError:
+            return None
+        if len(raw) != HEADER.size:
+            return None
+        magic, mtime_ns, size, inode = HEADER.unpack(raw)
+        if magic != MAGIC:
+            return None
+        return (mtime_ns, size, inode)
+
+    def is_fresh(self) -> bool:
+        covered = self._read_header()
+        return covered is not None and covered == file_signature(self.csv_path)
+
+    def _load(self) -> Dict[int, Tuple[int, int]]:
+        signature = file_signature(self.index_path)
+        if signature != self._loaded_signature:
+            with open(self.index_path, 'rb') as file:
+                file.seek(HEADER.size)
+                data = file.read()
+            usable = len(data) - len(data) % RECORD.size
+            self._entries = {id: (offset, length) for id, offset, length in RECORD.iter_unpack(data[:usable])}
+            self._loaded_signature = signature
+        return self._entries
+
+    def count(self) -> Optional[int]:
+        # quantidade de registros pelo tamanho do arquivo, se o índice estiver em dia
+        with self._lock:
+            if not self.is_fresh():
+                return None
+            return (os.path.getsize(self.index_path) - HEADER.size) // RECORD.size
+
+    def ids(self) -> Optional[Dict[int, Tuple[int, int]]]:
+        # ids cobertos pelo índice (chaves do dicionário), se ele estiver em dia
+        with self._lock:
+            if not self.is_fresh():
+                return None
+            return self._load()
+
+    def lookup(self, id: int, parse: Callable[[str], object]) -> Tuple[bool, Optional[object]]:
+        # retorna (usado, linha). `usado` é False quando o índice não pode responder
+        with self._lock:
+            if not self.is_fresh():
+                return False, None
+            entry = self._load().get(id)
+        if entry is None:
+            return True, None
+        offset, length = entry
+        with open(self.csv_path, 'rb') as file:
+            file.seek(offset)
+            line = file.read(length).decode('utf-8')
+        return True, parse(line)
+
+    def _write_header(self, file, signature: FileSignature = None) -> None:
+        signature = signature or file_signature(self.csv_path) or (0, 0, 0)
+        file.seek(0)
+        file.write(HEADER.pack(MAGIC, *signature))
+
+    def write(self, entries: Iterable[Entry], signature: FileSignature = None) -> None:
+        # regrava o índice inteiro (após uma reescrita completa do CSV)
+        with self._lock:
+            tmp_path = self.index_path + '.tmp'
+            with open(tmp_path, 'wb') as file:
+                self._write_header(file, signature)
+                file.seek(HEADER.size)
+                for entry in entries:
+                    file.write(RECORD.pack(*entry))
+            os.replace(tmp_path, self.index_path)
+
+    def append(self, entries: List[Entry], previous: FileSignature) -> None:
+        # chamado com o lock do CSV ainda adquirido, logo após o append das linhas.
+        # `previous` é a assinatura do CSV antes do append: se o índice já não a
+        # cobria, ele continua desatualizado e precisa de rebuild
+        with self._lock:
+            if previous is None or self._read_header() != previous:
+                return
+            with open(self.index_path, 'r+b') as file:
+                file.seek(0, os.SEEK_END)
+                file.write(b''.join(RECORD.pack(*entry) for entry in entries))
+                self._write_header(file)
+
+    def stats(self) -> dict:
+        return {
+            "file": self.index_path,
+            "exists": os.path.exists(self.index_path),
+            "fresh": self.is_fresh(),
+        }
+
+
+def scan_csv_offsets(csv_path: str) -> Iterable[Entry]:
+    # percorre o CSV em bytes, devolvendo (id, offset, length) de cada linha de dados
+    if not os.path.exists(csv_path):
+        return
+    with open(csv_path, 'rb') as file:
+        offset = len(file.readline())  # header
+        record = b''
+        for line in file:
+            # campo entre aspas com quebra de linha: o registro continua na próxima linha
+            record += line
+            if record.count(b'"') % 2:
+                continue
+            length = len(record)
+            id_field = record.split(b',', 1)[0].strip()
+            if id_field:
+                yield int(id_field), offset, length
+            offset += length
+            record = b''
+
+
+def count_csv_records(csv_path: str) -> int:
+    # linhas de dados do CSV sem parsear: conta as quebras de linha em blocos. Com aspas
+    # (quebras de linha dentro de campos) ou linhas em branco, usa a varredura completa
+    if not os.path.exists(csv_path):
+        return 0
+    newlines = 0
+    tail = b'\n'
+    with open(csv_path, 'rb') as file:
+        file.readline()  # header
+        while True:
+            chunk = file.read(COUNT_CHUNK)
+            if not chunk:
+                break
+            window = tail + chunk
+            if b'"' in chunk or b'\n\n' in window or b'\n\r\n' in window:
+                return sum(1 for _ in scan_csv_offsets(csv_path))
+            newlines += chunk.count(b'\n')
+            tail = window[-2:]
+    # última linha sem quebra de linha no fim
+    return newlines + (0 if tail.endswith(b'\n') else 1)
+
+
+def rebuild_index(index: OffsetIndex) -> int:
+    # a assinatura é lida antes da varredura: se o CSV mudar no meio, o índice já nasce desatualizado
+    signature = file_signature(index.csv_path)
+    entries = list(scan_csv_offsets(index.csv_path))
+    index.write(entries, signature)
+    return len(entries)
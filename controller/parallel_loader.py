@@ -0,0 +1,84 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, List, Tuple
+from controller.checksum import crc32
+from controller.csv_codec import LineParser, split_records
+
+READ_BLOCK = 8 * 1024 * 1024
+
+
+def newline_ranges(path: str, parts: int) -> List[Tuple[int, int]]:
+    # divide os dados (sem o header) em até `parts` faixas de bytes que terminam em '\n'
+    # fora de aspas: a paridade das aspas é acumulada desde o início do arquivo, e a
+    # faixa só termina numa quebra de linha com paridade par (fim de registro)
+    size = os.path.getsize(path)
+    with open(path, 'rb') as file:
+        header = file.readline()
+        boundaries = [len(header)]
+        quotes = header.count(b'"')
+        step = max((size - boundaries[0]) // parts, 1)
+        for part in range(1, parts):
+            target = boundaries[0] + part * step
+            # conta as aspas até o alvo, em blocos, sem carregar o arquivo
+            while file.tell() < target:
+                block = file.read(min(READ_BLOCK, target - file.tell()))
+                if not block:
+                    break
+                quotes += block.count(b'"')
+            while True:
+                line = file.readline()  # avança até o fim do registro
+                quotes += line.count(b'"')
+                if not line or (line.endswith(b'\n') and not quotes % 2):
+                    break
+            position = file.tell()
+            if position >= size:
+                break
+            if position > boundaries[-1]:
+                boundaries.append(position)
+    boundaries.append(size)
+    return [(start, end) for start, end in zip(boundaries, boundaries[1:]) if end > start]
+
+
+def file_sum(path: str) -> Tuple[int, int]:
+    # (tamanho, crc32) lendo em blocos, sem carregar o arquivo inteiro
+    size, value = 0, 0
+    with open(path, 'rb') as file:
+        while True:
+            block = file.read(READ_BLOCK)
+            if not block:
+                return size, value
+            size += len(block)
+            value = crc32(block, value)
+
+
+def _parse_range(path: str, start: int, end: int, parse: LineParser) -> list:
+    # executado no processo filho: lê só a sua faixa do arquivo
+    with open(path, 'rb') as file:
+        file.seek(start)
+        data = file.read(end - start)
+    if data.count(b'"') % 2:
+        # a faixa termina dentro de um campo entre aspas com quebra de linha
+        raise ValueError(f'Range {start}-{end} splits a quoted field')
+    return parse.many(split_records(data.decode('utf-8')))
+
+
+def parse_parallel(path: str, parse_for: Callable[[int, int], LineParser], workers: int) -> list:
+    """Parseia o CSV em faixas de bytes distribuídas em um ProcessPoolExecutor.
+
+    `parse_for` recebe (tamanho, crc32) do arquivo e devolve o parser, como no
+    load sequencial; o parser precisa ser uma função de módulo (é enviado aos
+    processos por pickle). As faixas são concatenadas na ordem do arquivo,
+    então o resultado é o mesmo da leitura sequencial. Os processos são criados
+    com spawn: um fork do servidor (com as threads do uvicorn e do escritor)
+    poderia herdar locks adquiridos por outras threads.
+    """
+    parse = parse_for(*file_sum(path))
+    # mais faixas que processos: uma faixa mais lenta não segura as outras
+    ranges = newline_ranges(path, workers * 4)
+    rows = []
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as executor:
+        futures = [executor.submit(_parse_range, path, start, end, parse) for start, end in ranges]
+        for future in futures:
+            rows.extend(future.result())
+    return rows
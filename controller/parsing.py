@@ -0,0 +1,23 @@
+import sys
+from datetime import datetime, timezone
+from functools import lru_cache
+from typing import Tuple
+
+# Conversões usadas pelos parsers das linhas (CSV e sqlite).
+# Horários se repetem muito (todas as sessões das 17h, várias compras no mesmo
+# minuto): o mesmo texto devolve o mesmo objeto datetime, que é imutável.
+# Campos de baixa cardinalidade (tipo de ingresso, sala, gênero, assento...)
+# passam por sys.intern, e as linhas compartilham uma única cópia de cada valor.
+
+DATETIME_CACHE_SIZE = 65536
+
+parse_datetime = lru_cache(maxsize=DATETIME_CACHE_SIZE)(datetime.fromisoformat)
+
+
+def as_utc(value: datetime) -> datetime:
+    # datas sem fuso são tratadas como UTC (filtros, índice ordenado e ColumnStore)
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value
+
+
+def intern_items(value: str, separator: str = ';') -> Tuple[str, ...]:
+    return tuple(map(sys.intern, value.split(separator)))
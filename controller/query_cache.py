@@ -0,0 +1,117 @@
+import threading
+from bisect import bisect_right
+from collections import OrderedDict
+from typing import Callable, Hashable, Iterator, List, Optional, Sequence, Tuple
+from controller.repository import Condition
+
+# Operadores que não diferenciam maiúsculas/minúsculas: o valor entra na chave em minúsculas
+CASE_INSENSITIVE = ('ieq', 'icontains', 'ihas')
+
+
+def normalize(conditions: Sequence[Condition]) -> Tuple:
+    # mesma chave para os mesmos filtros, em qualquer ordem e grafia
+    normalized = set()
+    for field, op, value in conditions:
+        if op in CASE_INSENSITIVE and isinstance(value, str):
+            value = value.lower()
+        elif op == 'ihas_any':
+            value = tuple(sorted({item.lower() for item in value}))
+        normalized.add((field, op, value))
+    return tuple(sorted(normalized, key=repr))
+
+
+class QueryCache:
+    """Resultados dos filtros (endpoints -filter) em um LRU limitado.
+
+    A chave é (entidade, condições normalizadas, ordem, versão da tabela). Como
+    a versão muda a cada escrita, um resultado nunca é servido depois de uma
+    mudança: a consulta seguinte cai em outra chave e as entradas da versão
+    anterior são descartadas. Num miss as linhas continuam saindo do filtro
+    sob demanda (a paginação para no fim da página, o streaming não junta o
+    resultado); o resultado só é guardado quando é lido até o fim sem passar
+    de `max_result_rows`. Guarda só referências às linhas (imutáveis) e, nos
+    resultados em ordem de id, a lista dos ids para continuar a paginação por
+    bisect.
+    """
+
+    def __init__(self, max_entries: int = 256, max_rows: int = 1_000_000, max_result_rows: int = 10_000):
+        self.max_entries = max_entries
+        self.max_rows = max_rows
+        self.max_result_rows = max_result_rows
+        self._entries: 'OrderedDict[Hashable, Tuple[Optional[List[int]], List]]' = OrderedDict()
+        self._rows = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def rows(self, entity: str, version: Optional[int], conditions: Sequence[Condition], by_id: bool,
+             after: Optional[int], compute: Callable[[Optional[int]], Iterator]) -> Iterator:
+        # compute(after) devolve o filtro do repositório, sem materializar as linhas
+        if version is None or self.max_entries <= 0:
+            return compute(after)
+        key = (entity, normalize(conditions), by_id, version)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+            else:
+                self.misses += 1
+        if entry is None:
+            # páginas seguintes de um resultado não guardado: só o trecho depois do cursor
+            return compute(after) if after is not None else self._recording(key, compute(None))
+        ids, rows = entry
+        if after is None:
+            return iter(rows)
+        if ids is not None:
+            return iter(rows[bisect_right(ids, after):])
+        return (row for row in rows if row.id > after)
+
+    def _recording(self, key: Hashable, rows: Iterator) -> Iterator:
+        # repassa as linhas e guarda o resultado se ele for consumido inteiro dentro do limite;
+        # uma leitura interrompida (fim da página, cliente que desconectou) não é guardada
+        kept: Optional[List] = []
+        for row in rows:
+            if kept is not None:
+                kept.append(row)
+                if len(kept) > self.max_result_rows:
+                    kept = None
+            yield row
+        if kept is not None:
+            self._store(key, ([row.id for row in kept] if key[2] else None, kept))
+
+    def _store(self, key: Hashable, entry: Tuple[Optional[List[int]], List]) -> None:
+        size = len(entry[1])
+        if size > self.max_rows:
+            return
+        with self._lock:
+            if key in self._entries:
+                return
+            # resultados de versões anteriores da mesma entidade não serão mais consultados
+            entity, version = key[0], key[-1]
+            for stale in [old for old in self._entries if old[0] == entity and old[-1] < version]:
+                self._rows -= len(self._entries.pop(stale)[1])
+            self._entries[key] = entry
+            self._rows += size
+            while len(self._entries) > self.max_entries or self._rows > self.max_rows:
+                _, (_, rows) = self._entries.popitem(last=False)
+                self._rows -= len(rows)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._rows = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "rows": self._rows,
+                "max_rows": self.max_rows,
+                "max_result_rows": self.max_result_rows,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+            }
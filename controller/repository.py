@@ -0,0 +1,428 @@
+import heapq
+import time
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Set, Tuple
+from controller.cache import EntityCache
+from controller.csv_file import CsvFile
+
+# Condição de filtro: (campo, operador, valor). Operadores:
+#   eq        - igualdade exata
+#   ieq       - igualdade sem diferenciar maiúsculas/minúsculas
+#   icontains - substring sem diferenciar maiúsculas/minúsculas
+#   ge / le   - maior ou igual / menor ou igual
+#   has       - o valor é um dos itens do campo (lista ou texto separado por ';')
+#   ihas      - como has, sem diferenciar maiúsculas/minúsculas
+#   ihas_any  - algum dos valores (lista) é um dos itens do campo, sem diferenciar maiúsculas/minúsculas
+Condition = Tuple[str, str, object]
+
+OPERATORS = ('eq', 'ieq', 'icontains', 'ge', 'le', 'has', 'ihas', 'ihas_any')
+
+
+def _items(value) -> List[str]:
+    return value if isinstance(value, (list, tuple)) else value.split(';')
+
+
+def matches(row, conditions: Iterable[Condition]) -> bool:
+    for field, op, value in conditions:
+        current = getattr(row, field)
+        if op == 'eq':
+            ok = current == value
+        elif op == 'ieq':
+            ok = current.lower() == value.lower()
+        elif op == 'icontains':
+            ok = value.lower() in current.lower()
+        elif op == 'ge':
+            ok = current >= value
+        elif op == 'le':
+            ok = current <= value
+        elif op == 'has':
+            ok = value in _items(current)
+        elif op == 'ihas':
+            ok = value.lower() in [item.lower() for item in _items(current)]
+        elif op == 'ihas_any':
+            items = {item.lower() for item in _items(current)}
+            ok = any(wanted.lower() in items for wanted in value)
+        else:
+            raise ValueError(f"Unknown filter operator '{op}'")
+        if not ok:
+            return False
+    return True
+
+
+# Custo relativo de conferir cada operador em uma linha: as condições residuais
+# são avaliadas das mais baratas para as mais caras
+OPERATOR_COST = {'eq': 1, 'ge': 1, 'le': 1, 'ieq': 2, 'has': 3, 'ihas': 4, 'ihas_any': 4, 'icontains': 5}
+
+# Um passo cuja estimativa passa desse múltiplo dos candidatos atuais não é
+# intersectado: sai mais barato conferir as condições dele nas linhas candidatas
+RESIDUAL_FACTOR = 4
+
+
+def _by_cost(conditions: Iterable[Condition]) -> List[Condition]:
+    return sorted(conditions, key=lambda condition: OPERATOR_COST.get(condition[1], max(OPERATOR_COST.values())))
+
+
+def _describe(conditions: Iterable[Condition]) -> List[list]:
+    return [list(condition) for condition in conditions]
+
+
+class PlanStep:
+    # condições de um campo respondidas por um índice, com a estimativa de linhas candidatas
+
+    def __init__(self, index, conditions: List[Condition]):
+        self.index = index
+        self.conditions = conditions
+        self.estimate = index.estimate(conditions)
+        self.used = False
+        self.candidates: Optional[int] = None
+        self.ms = 0.0
+
+    def describe(self) -> dict:
+        return {
+            "index": type(self.index).__name__,
+            "conditions": _describe(self.conditions),
+            "estimate": self.estimate,
+            "used": self.used,
+            "candidates": self.candidates,
+            "ms": round(self.ms, 3),
+        }
+
+
+class QueryPlan:
+    """Plano de um filtro sobre os índices secundários de uma tabela.
+
+    Cada campo com condições respondidas por um índice vira um passo, com a
+    quantidade de linhas candidatas estimada pelo próprio índice (tamanho do
+    conjunto, da faixa ou da lista de trigramas). O passo mais seletivo gera
+    os candidatos; os seguintes só são intersectados enquanto forem baratos
+    perto deles, e o restante vira filtro residual sobre as linhas.
+    """
+
+    def __init__(self, indexes: Sequence, conditions: List[Condition]):
+        self.indexes = indexes
+        self.conditions = conditions
+        self.steps: List[PlanStep] = []
+        self.residual: List[Condition] = list(conditions)
+
+    def _steps(self) -> List[PlanStep]:
+        steps = []
+        for index in self.indexes:
+            fields: Dict[str, List[Condition]] = {}
+            for condition in index.split(self.conditions)[0]:
+                fields.setdefault(condition[0], []).append(condition)
+            steps += [PlanStep(index, conditions) for conditions in fields.values()]
+        return sorted(steps, key=lambda step: step.estimate)
+
+    def candidates(self) -> Set[int]:
+        # estimativas e execução com o lock do cache adquirido (EntityCache.select_ids)
+        self.steps = self._steps()
+        ids: Optional[Set[int]] = None
+        for step in self.steps:
+            if ids is not None and (not ids or step.estimate > len(ids) * RESIDUAL_FACTOR):
+                continue
+            started = time.perf_counter()
+            found = step.index.ids(step.conditions)
+            # cada índice devolve um conjunto novo, que pode ser reaproveitado
+            ids = (found if isinstance(found, set) else set(found)) if ids is None else ids.intersection(found)
+            step.ms = (time.perf_counter() - started) * 1e3
+            step.used = True
+            step.candidates = len(ids)
+        covered = [condition for step in self.steps if step.used
+                   for condition in step.conditions if step.index.exact(condition)]
+        self.residual = _by_cost(condition for condition in self.conditions if condition not in covered)
+        return ids if ids is not None else set()
+
+    def describe(self) -> dict:
+        return {
+            "steps": [step.describe() for step in self.steps],
+            "residual": _describe(self.residual),
+        }
+
+
+class Repository:
+    """Armazenamento de uma entidade.
+
+    Os routers e o controller só falam com esta interface; o backend de cada
+    tabela (csv ou sqlite) é escolhido em storage.backend do config.yaml.
+    Leituras em ordem de id (`by_id`/`after`) alimentam a paginação por keyset.
+    As mutações são executadas pelo escritor único, que chama begin_batch,
+    commit e discard em volta de cada lote (group commit).
+    """
+
+    backend = None
+
+    def get(self, id: int):
+        raise NotImplementedError
+
+    def exists(self, id: int) -> bool:
+        return self.get(id) is not None
+
+    def scan(self, by_id: bool = False, after: Optional[int] = None) -> Iterator:
+        raise NotImplementedError
+
+    def filter(self, conditions: List[Condition], by_id: bool = False, after: Optional[int] = None) -> Iterator:
+        return (row for row in self.scan(by_id, after) if matches(row, conditions))
+
+    def explain(self, conditions: List[Condition]) -> dict:
+        # como o filtro é avaliado, com a contagem de linhas e o tempo de uma execução
+        started = time.perf_counter()
+        rows = sum(1 for _ in self.filter(conditions))
+        return {
+            "backend": self.backend,
+            "strategy": "scan",
+            "residual": _describe(conditions),
+            "rows": rows,
+            "ms": round((time.perf_counter() - started) * 1e3, 3),
+        }
+
+    def count(self) -> int:
+        raise NotImplementedError
+
+    def count_where(self, conditions: List[Condition]) -> int:
+        return sum(1 for _ in self.filter(conditions))
+
+    def version(self) -> Optional[int]:
+        # muda a cada escrita na tabela; None quando o backend não sabe dizer (sem cache de consultas)
+        return None
+
+    def ordered(self, field: str, start, limit: int, key: Optional[Callable] = None) -> List:
+        # as `limit` primeiras linhas com o campo >= start, em ordem do campo
+        key = key or (lambda value: value)
+        low = key(start)
+        candidates = ((key(getattr(row, field)), row.id, row) for row in self.scan())
+        return [row for _, _, row in heapq.nsmallest(limit, (entry for entry in candidates if entry[0] >= low))]
+
+    def item_counts(self, field: str) -> Dict[str, int]:
+        # linhas por item de um campo com vários itens (sem diferenciar maiúsculas/minúsculas)
+        counts: Dict[str, int] = {}
+        names: Dict[str, str] = {}
+        for row in self.scan():
+            for token, item in {item.lower(): item for item in _items(getattr(row, field))}.items():
+                if token:
+                    names.setdefault(token, item)
+                    counts[token] = counts.get(token, 0) + 1
+        return dict(sorted(((names[token], count) for token, count in counts.items()),
+                           key=lambda entry: (-entry[1], entry[0])))
+
+    def totals(self, group: str) -> Dict:
+        # agregados materializados (controller/aggregates.py): chave do grupo -> (linhas, soma em centavos)
+        raise NotImplementedError
+
+    def insert(self, row) -> None:
+        raise NotImplementedError
+
+    def update(self, row) -> None:
+        raise NotImplementedError
+
+    def delete(self, id: int):
+        raise NotImplementedError
+
+    # Group commit
+
+    def begin_batch(self) -> None:
+        pass
+
+    def commit(self) -> None:
+        pass
+
+    def discard(self) -> None:
+        pass
+
+    # Manutenção
+
+    def checkpoint(self) -> bool:
+        return False
+
+    def export_csv(self) -> str:
+        # deixa o CSV da entidade em dia (para ZIP/hash) e devolve o caminho
+        raise NotImplementedError
+
+    def warm(self) -> None:
+        # carrega a tabela antes da primeira requisição (na subida do servidor)
+        pass
+
+    def save_snapshot(self) -> bool:
+        return False
+
+    def stats(self) -> dict:
+        raise NotImplementedError
+
+
+class CsvRepository(Repository):
+    """Backend CSV: cache em memória + CSV com sidecar .idx e journal.
+
+    Filtros com condições respondidas pelos índices secundários (igualdade no
+    HashIndex, faixas no SortedIndex, itens no TokenIndex, substrings no
+    NgramIndex) seguem um QueryPlan, que parte do índice mais seletivo. Senão, com um ColumnStore (controller/columnar.py), as
+    condições que ele suporta são avaliadas sobre as colunas e só as linhas
+    selecionadas passam pelo restante do filtro.
+    """
+
+    backend = 'csv'
+
+    def __init__(self, cache: EntityCache, csv_file: CsvFile, columns=None, indexes: Sequence = (), aggregates=None):
+        self.cache = cache
+        self.csv_file = csv_file
+        self.columns = columns
+        self.indexes = list(indexes)
+        self.aggregates = aggregates
+        for observer in [columns, *self.indexes, aggregates]:
+            if observer is not None:
+                cache.add_observer(observer)
+
+    def get(self, id: int):
+        # com o cache frio, o journal e o sidecar .idx respondem com um único seek + read da linha
+        if not self.cache.is_fresh():
+            used, row = self.csv_file.lookup(id)
+            if used:
+                return row
+        return self.cache.get_by_id(id)
+
+    def exists(self, id: int) -> bool:
+        return self.cache.contains(id)
+
+    def scan(self, by_id: bool = False, after: Optional[int] = None) -> Iterator:
+        if by_id or after is not None:
+            return self.cache.iter_by_id(after)
+        return self.cache.iter()
+
+    def _filtered(self, conditions: List[Condition], trace: Optional[dict] = None) -> Optional[List]:
+        # linhas (na ordem do arquivo) selecionadas pelos índices ou pelo ColumnStore;
+        # None quando nenhum deles ajuda e o filtro é uma varredura. `trace` recebe o plano
+        if any(index.split(conditions)[0] for index in self.indexes):
+            plan = QueryPlan(self.indexes, conditions)
+            rows = self.cache.select_ids(plan.candidates)
+            if plan.residual:
+                rows = [row for row in rows if matches(row, plan.residual)]
+            if trace is not None:
+                trace.update(strategy="index", **plan.describe())
+            return rows
+        supported, residual = self.columns.split(conditions) if self.columns is not None else ([], conditions)
+        if trace is not None:
+            trace.update(strategy="columnar" if supported else "scan", columnar=_describe(supported),
+                         residual=_describe(residual))
+        if not supported:
+            return None
+        rows = self.cache.select(lambda: self.columns.positions(supported))
+        if residual:
+            rows = [row for row in rows if matches(row, _by_cost(residual))]
+        return rows
+
+    def filter(self, conditions: List[Condition], by_id: bool = False, after: Optional[int] = None) -> Iterator:
+        rows = self._filtered(conditions)
+        if rows is None:
+            return super().filter(_by_cost(conditions), by_id, after)
+        if by_id or after is not None:
+            rows = sorted((row for row in rows if after is None or row.id > after), key=lambda row: row.id)
+        return iter(rows)
+
+    def explain(self, conditions: List[Condition]) -> dict:
+        trace: dict = {}
+        started = time.perf_counter()
+        rows = self._filtered(conditions, trace)
+        count = len(rows) if rows is not None else sum(1 for _ in super().filter(_by_cost(conditions)))
+        return {
+            "backend": self.backend,
+            **trace,
+            "rows": count,
+            "ms": round((time.perf_counter() - started) * 1e3, 3),
+        }
+
+    def count(self) -> int:
+        # com a tabela em memória, o tamanho da lista (mantido a cada insert/delete);
+        # antes da primeira carga, o CsvFile conta sem parsear
+        if not self.cache.is_loaded():
+            count = self.csv_file.count_rows()
+            if count is not None:
+                return count
+        return self.cache.count()
+
+    def count_where(self, conditions: List[Condition]) -> int:
+        # condições respondidas com exatidão pelos índices (ou pelo ColumnStore) são
+        # contadas sem montar a lista de linhas
+        if any(index.split(conditions)[0] for index in self.indexes):
+            plan = QueryPlan(self.indexes, conditions)
+            with self.cache.lock:
+                ids = self.cache.derived(plan.candidates)
+                if not plan.residual:
+                    return len(ids)
+                rows = self.cache.select_ids(lambda: ids)
+            return sum(1 for row in rows if matches(row, plan.residual))
+        if self.columns is not None:
+            supported, residual = self.columns.split(conditions)
+            if supported and not residual:
+                return self.cache.derived(lambda: self.columns.count(supported))
+        return super().count_where(conditions)
+
+    def version(self) -> Optional[int]:
+        return self.cache.current_version()
+
+    def ordered(self, field: str, start, limit: int, key: Optional[Callable] = None) -> List:
+        index = next((index for index in self.indexes if index.orders(field)), None)
+        if index is None:
+            return super().ordered(field, start, limit, key)
+        return self.cache.select_ids(lambda: index.first(start, limit), ordered=True)
+
+    def item_counts(self, field: str) -> Dict[str, int]:
+        index = next((index for index in self.indexes if index.tokenizes(field)), None)
+        if index is None:
+            return super().item_counts(field)
+        return self.cache.derived(index.counts)
+
+    def totals(self, group: str) -> Dict:
+        return self.cache.derived(lambda: self.aggregates.totals(group))
+
+    def insert(self, row) -> None:
+        self.cache.append(row, lambda rows: self.csv_file.append(row, rows))
+
+    def update(self, row) -> None:
+        self.cache.update(row, lambda rows: self.csv_file.update(row, rows))
+
+    def delete(self, id: int):
+        return self.cache.delete(id, lambda rows: self.csv_file.delete(id, rows))
+
+    def begin_batch(self) -> None:
+        self.csv_file.begin_batch()
+
+    def commit(self) -> None:
+        # o lock do cache fica retido durante a gravação para que leitores
+        # não confundam a mudança de assinatura do lote com uma edição externa
+        with self.cache.lock:
+            self.csv_file.commit()
+            self.cache.resign()
+
+    def discard(self) -> None:
+        self.csv_file.discard()
+        # o cache pode conter linhas que não chegaram ao disco
+        self.cache.invalidate()
+
+    def checkpoint(self) -> bool:
+        return self.cache.flush(self.csv_file.checkpoint)
+
+    def export_csv(self) -> str:
+        # o CSV já é a fonte dos dados: basta aplicar o journal pendente
+        self.checkpoint()
+        return self.csv_file.path
+
+    def warm(self) -> None:
+        self.cache.warm()
+
+    def save_snapshot(self) -> bool:
+        # só com a tabela em memória; senão o snapshot é refeito no próximo load
+        if not self.cache.is_loaded():
+            return False
+        return self.cache.flush(self.csv_file.save_snapshot)
+
+    def stats(self) -> dict:
+        return {
+            "backend": self.backend,
+            **self.cache.stats(),
+            "offset_index": self.csv_file.offsets.stats(),
+            "journal_pending": self.csv_file.pending(),
+            "columnar": self.columns.stats() if self.columns is not None else None,
+            "indexes": [index.stats() for index in self.indexes],
+            "aggregates": self.aggregates.stats() if self.aggregates is not None else None,
+            "snapshot": {
+                "file": self.csv_file.snapshot.path,
+                "loaded_from_snapshot": self.csv_file.from_snapshot,
+            } if self.csv_file.snapshot else None,
+        }
@@ -0,0 +1,60 @@
+from typing import Iterable, List, Tuple
+from controller.repository import Condition
+
+
+class SecondaryIndex:
+    """Base dos índices secundários do backend csv (HashIndex, SortedIndex, TokenIndex, NgramIndex).
+
+    Cada índice é um observer do EntityCache (reset/insert/_remove) e responde
+    ao QueryPlan pelas condições que `supports`. As capacidades extras
+    (`orders` para leituras em ordem do campo, `tokenizes` para contagens por
+    item) são desligadas por padrão e ligadas só por quem as implementa.
+    """
+
+    # Manutenção (chamada pelo EntityCache)
+
+    def reset(self, rows: List) -> None:
+        raise NotImplementedError
+
+    def insert(self, row) -> None:
+        raise NotImplementedError
+
+    def _remove(self, row) -> None:
+        raise NotImplementedError
+
+    def update(self, old, new, position: int) -> None:
+        self._remove(old)
+        self.insert(new)
+
+    def delete(self, row, position: int) -> None:
+        self._remove(row)
+
+    # Consulta
+
+    def supports(self, condition: Condition) -> bool:
+        raise NotImplementedError
+
+    def exact(self, condition: Condition) -> bool:
+        # True quando os ids devolvidos dispensam conferir a condição na linha
+        return True
+
+    def orders(self, field: str) -> bool:
+        return False
+
+    def tokenizes(self, field: str) -> bool:
+        return False
+
+    def split(self, conditions: List[Condition]) -> Tuple[List[Condition], List[Condition]]:
+        # (condições respondidas pelo índice, restante)
+        supported = [condition for condition in conditions if self.supports(condition)]
+        residual = [condition for condition in conditions if not self.supports(condition)]
+        return supported, residual
+
+    def ids(self, conditions: List[Condition]) -> Iterable[int]:
+        raise NotImplementedError
+
+    def estimate(self, conditions: List[Condition]) -> int:
+        raise NotImplementedError
+
+    def stats(self) -> dict:
+        raise NotImplementedError
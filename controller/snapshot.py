@@ -0,0 +1,67 @@
+import os
+import pickle
+from typing import Hashable, List, Optional
+from utils.logger_config import logger
+
+MAGIC = b'CSVSNAP2'
+
+
+class Snapshot:
+    """Cópia binária das linhas já parseadas de uma tabela.
+
+    O arquivo guarda a assinatura de CSV + journal no momento da gravação, a
+    quantidade de linhas e as colunas da tabela (uma lista por atributo da linha compacta) em
+    pickle. Se a assinatura atual for a mesma, as linhas são remontadas a
+    partir das colunas sem ler nem parsear o CSV.
+    """
+
+    def __init__(self, path: str, row_class: type):
+        self.path = path
+        self.row_class = row_class
+        self.fields = row_class.__slots__
+
+    def load(self, key: Hashable) -> Optional[List]:
+        try:
+            with open(self.path, 'rb') as file:
+                if file.read(len(MAGIC)) != MAGIC:
+                    return None
+                stored_key = pickle.load(file)
+                if stored_key != key:
+                    return None
+                pickle.load(file)
+                columns = pickle.load(file)
+        except FileNotFoundError:
+            return None
+        except Exception as exc:
+            # snapshot truncado/corrompido: volta para o CSV
+            logger.warning(f"[snapshot] - Ignoring unreadable snapshot {self.path}: {exc}")
+            return None
+        return list(map(self.row_class, *columns))
+
+    def write(self, key: Hashable, rows: List) -> None:
+        columns = [[getattr(row, field) for row in rows] for field in self.fields]
+        # nome temporário por processo: vários workers podem gravar o mesmo snapshot
+        tmp_path = f'{self.path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'wb') as file:
+            file.write(MAGIC)
+            pickle.dump(key, file, protocol=pickle.HIGHEST_PROTOCOL)
+            pickle.dump(len(rows), file, protocol=pickle.HIGHEST_PROTOCOL)
+            pickle.dump(columns, file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, self.path)
+
+    def count(self, key: Hashable) -> Optional[int]:
+        # quantidade de linhas, lida só do cabeçalho, se o snapshot estiver em dia
+        try:
+            with open(self.path, 'rb') as file:
+                if file.read(len(MAGIC)) != MAGIC or pickle.load(file) != key:
+                    return None
+                return pickle.load(file)
+        except Exception:
+            return None
+
+    def is_fresh(self, key: Hashable) -> bool:
+        try:
+            with open(self.path, 'rb') as file:
+                return file.read(len(MAGIC)) == MAGIC and pickle.load(file) == key
+        except Exception:
+            return False
@@ -0,0 +1,87 @@
+from bisect import bisect_left, bisect_right, insort
+from typing import Callable, List, Tuple
+from controller.repository import Condition
+from controller.secondary_index import SecondaryIndex
+
+RANGE_OPS = ('eq', 'ge', 'le')
+
+
+class SortedIndex(SecondaryIndex):
+    """Índice ordenado (chave, id) de um campo de um EntityCache, para consultas por faixa.
+
+    Mantido como observer do cache com bisect/insort: uma faixa custa
+    O(log n + k) em vez de varrer a tabela, e as linhas saem na ordem do campo.
+    `key` converte o valor em algo comparável (ex.: datetime -> microssegundos,
+    com datas sem fuso tratadas como UTC).
+    """
+
+    def __init__(self, name: str, field: str, key: Callable = None):
+        self.name = name
+        self.field = field
+        self.key = key or (lambda value: value)
+        self._entries: List[Tuple[object, int]] = []
+
+    # Manutenção (chamada pelo EntityCache)
+
+    def _entry(self, row) -> Tuple[object, int]:
+        return (self.key(getattr(row, self.field)), row.id)
+
+    def reset(self, rows: List) -> None:
+        self._entries = sorted(self._entry(row) for row in rows)
+
+    def insert(self, row) -> None:
+        insort(self._entries, self._entry(row))
+
+    def _remove(self, row) -> None:
+        entry = self._entry(row)
+        index = bisect_left(self._entries, entry)
+        if index < len(self._entries) and self._entries[index] == entry:
+            del self._entries[index]
+
+    # Consulta
+
+    def supports(self, condition: Condition) -> bool:
+        field, op, value = condition
+        if field != self.field or op not in RANGE_OPS:
+            return False
+        try:
+            self.key(value)
+        except (TypeError, AttributeError):
+            return False
+        return True
+
+    def orders(self, field: str) -> bool:
+        return field == self.field
+
+    def _bounds(self, conditions: List[Condition]) -> Tuple[int, int]:
+        # todas as condições (eq/ge/le) viram um único intervalo [start, end) na lista
+        low, high = None, None
+        for _, op, value in conditions:
+            key = self.key(value)
+            if op in ('eq', 'ge') and (low is None or key > low):
+                low = key
+            if op in ('eq', 'le') and (high is None or key < high):
+                high = key
+        # as entradas são (chave, id): (low,) vem antes de qualquer id e (high, inf) depois
+        start = 0 if low is None else bisect_left(self._entries, (low,))
+        end = len(self._entries) if high is None else bisect_right(self._entries, (high, float('inf')))
+        return start, max(start, end)
+
+    def ids(self, conditions: List[Condition]) -> List[int]:
+        start, end = self._bounds(conditions)
+        return [id for _, id in self._entries[start:end]]
+
+    def first(self, value, limit: int) -> List[int]:
+        # ids das `limit` primeiras linhas com o campo >= value, em ordem do campo
+        start = bisect_left(self._entries, (self.key(value),))
+        return [id for _, id in self._entries[start:start + limit]]
+
+    def count(self, conditions: List[Condition]) -> int:
+        start, end = self._bounds(conditions)
+        return end - start
+
+    def estimate(self, conditions: List[Condition]) -> int:
+        return self.count(conditions)
+
+    def stats(self) -> dict:
+        return {"field": self.field, "entries": len(self._entries)}
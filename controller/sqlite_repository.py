@@ -0,0 +1,378 @@
+import os
+import sqlite3
+import threading
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+from controller.csv_file import DURABILITY, CsvFile
+from controller.repository import Condition, Repository, matches
+from utils.logger_config import logger
+
+# durabilidade do config.yaml -> PRAGMA synchronous (em modo WAL)
+SYNCHRONOUS = {'always': 'FULL', 'batched': 'NORMAL', 'none': 'OFF'}
+NUMERIC_TYPES = ('INTEGER', 'REAL')
+CHUNK_SIZE = 256
+
+# uma conexão por thread e por arquivo de banco, compartilhada pelas tabelas:
+# assim um lote do escritor que mexe em mais de uma tabela é uma única transação
+_local = threading.local()
+_schema_lock = threading.Lock()
+
+
+def _open(db_path: str) -> sqlite3.Connection:
+    directory = os.path.dirname(db_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    connection = sqlite3.connect(db_path, timeout=30)
+    connection.execute('PRAGMA journal_mode=WAL')
+    connection.execute(f'PRAGMA synchronous={SYNCHRONOUS[DURABILITY]}')
+    return connection
+
+
+def _connection(db_path: str) -> sqlite3.Connection:
+    connections = getattr(_local, 'connections', None)
+    if connections is None:
+        connections = _local.connections = {}
+    connection = connections.get(db_path)
+    if connection is None:
+        connection = connections[db_path] = _open(db_path)
+    return connection
+
+
+class SqliteRepository(Repository):
+    """Backend SQLite (modo WAL) para uma entidade.
+
+    Cada thread usa a própria conexão: as leituras não bloqueiam o escritor
+    único e enxergam apenas lotes já commitados. O escritor grava o lote
+    inteiro em uma única transação. A tabela é criada (e populada a partir
+    do CSV) na construção do repositório; o CSV volta a ser gerado sob
+    demanda (export_csv) para os endpoints de ZIP e hash.
+    """
+
+    backend = 'sqlite'
+
+    def __init__(self, name: str, db_path: str, columns: Sequence[Tuple[str, str]],
+                 to_fields: Callable[[object], tuple], from_fields: Callable[[Sequence], object],
+                 csv_file: CsvFile, indexes: Sequence[str] = (), aggregates=None, ranges: Sequence[str] = ()):
+        self.name = name
+        self.db_path = db_path
+        self.columns = list(columns)
+        self.types = dict(columns)
+        self.to_fields = to_fields
+        self.from_fields = from_fields
+        self.csv_file = csv_file
+        self.indexes = list(indexes)
+        # colunas de data/hora lidas em ordem (ordered): índice pelo instante, não pelo texto
+        self.ranges = list(ranges)
+        self.aggregates = aggregates
+        self._batching = False
+        names = [name for name, _ in self.columns]
+        self._select = f"SELECT {', '.join(names)} FROM {self.name}"
+        self._insert = f"INSERT INTO {self.name} ({', '.join(names)}) VALUES ({', '.join('?' for _ in names)})"
+        self._update = f"UPDATE {self.name} SET {', '.join(f'{name} = ?' for name in names[1:])} WHERE id = ?"
+        self._ensure_schema()
+
+    def _connection(self) -> sqlite3.Connection:
+        return _connection(self.db_path)
+
+    def _ensure_schema(self) -> None:
+        # feito antes de qualquer lote do escritor, para que o DDL e a importação
+        # nunca caiam no meio de uma transação aberta
+        with _schema_lock:
+            connection = self._connection()
+            exists = connection.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (self.name,)
+            ).fetchone()
+            if exists:
+                self._ensure_indexes(connection)
+                self._ensure_counter(connection)
+                self._ensure_version(connection)
+                self._ensure_aggregates(connection)
+                return
+            definition = ', '.join(
+                f'{name} {type} PRIMARY KEY' if name == 'id' else f'{name} {type}'
+                for name, type in self.columns
+            )
+            connection.execute(f'CREATE TABLE {self.name} ({definition})')
+            self._ensure_indexes(connection)
+            self._ensure_counter(connection)
+            self._ensure_version(connection)
+            self._ensure_aggregates(connection)
+            # primeira execução com este backend: importa o CSV existente
+            rows = self.csv_file.load()
+            connection.executemany(self._insert, (self.to_fields(row) for row in rows))
+            connection.commit()
+            # o CSV de origem já corresponde ao conteúdo importado
+            self._set_exported(connection, self.version())
+            connection.commit()
+            logger.info(f"[sqlite_repository] - Imported {len(rows)} rows from {self.csv_file.path} into {self.db_path}:{self.name}")
+
+    def _ensure_indexes(self, connection: sqlite3.Connection) -> None:
+        # também numa tabela que já existia (banco criado antes de um índice novo)
+        for column in self.indexes:
+            connection.execute(f'CREATE INDEX IF NOT EXISTS idx_{self.name}_{column} ON {self.name} ({column})')
+        # o texto ISO guarda o fuso de cada escrita, então a ordem do texto não é a ordem do
+        # tempo: o índice é sobre julianday(), que converte o fuso (e trata texto sem fuso
+        # como UTC, como o epoch_us do backend csv), com precisão de milissegundos
+        for column in self.ranges:
+            connection.execute(f'CREATE INDEX IF NOT EXISTS idx_{self.name}_{column}_instant ON {self.name} (julianday({column}))')
+        connection.commit()
+
+    def _ensure_counter(self, connection: sqlite3.Connection) -> None:
+        # contagem de linhas mantida por triggers na mesma transação de cada escrita:
+        # vale para todos os processos que usam o banco e some junto num rollback
+        connection.execute('CREATE TABLE IF NOT EXISTS row_counts (name TEXT PRIMARY KEY, rows INTEGER NOT NULL)')
+        exists = connection.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'trigger' AND name = ?", (f'{self.name}_count_insert',)
+        ).fetchone()
+        if exists:
+            return
+        connection.execute(f"CREATE TRIGGER {self.name}_count_insert AFTER INSERT ON {self.name} "
+                           f"BEGIN UPDATE row_counts SET rows = rows + 1 WHERE name = '{self.name}'; END")
+        connection.execute(f"CREATE TRIGGER {self.name}_count_delete AFTER DELETE ON {self.name} "
+                           f"BEGIN UPDATE row_counts SET rows = rows - 1 WHERE name = '{self.name}'; END")
+        connection.execute(f'INSERT OR REPLACE INTO row_counts (name, rows) SELECT ?, COUNT(*) FROM {self.name}', (self.name,))
+        connection.commit()
+
+    def _exported(self, connection: sqlite3.Connection) -> Optional[int]:
+        row = connection.execute('SELECT version FROM csv_exports WHERE name = ?', (self.name,)).fetchone()
+        return row[0] if row else None
+
+    def _set_exported(self, connection: sqlite3.Connection, version: int) -> None:
+        connection.execute('INSERT OR REPLACE INTO csv_exports (name, version) VALUES (?, ?)', (self.name, version))
+
+    def _ensure_version(self, connection: sqlite3.Connection) -> None:
+        # versão da tabela, incrementada por triggers a cada linha escrita: como a
+        # row_counts, é a mesma para todos os workers e some junto num rollback
+        connection.execute('CREATE TABLE IF NOT EXISTS table_versions (name TEXT PRIMARY KEY, version INTEGER NOT NULL)')
+        connection.execute('INSERT OR IGNORE INTO table_versions (name, version) VALUES (?, 0)', (self.name,))
+        # versão da tabela no último CSV exportado, por qualquer worker
+        connection.execute('CREATE TABLE IF NOT EXISTS csv_exports (name TEXT PRIMARY KEY, version INTEGER NOT NULL)')
+        for event in ('INSERT', 'UPDATE', 'DELETE'):
+            connection.execute(f"CREATE TRIGGER IF NOT EXISTS {self.name}_version_{event.lower()} AFTER {event} ON {self.name} "
+                               f"BEGIN UPDATE table_versions SET version = version + 1 WHERE name = '{self.name}'; END")
+        connection.commit()
+
+    def _ensure_aggregates(self, connection: sqlite3.Connection) -> None:
+        # somas por grupo (controller/aggregates.py) mantidas por triggers, como row_counts
+        if self.aggregates is None:
+            return
+        connection.execute('CREATE TABLE IF NOT EXISTS aggregate_totals (name TEXT NOT NULL, grp TEXT NOT NULL, key, '
+                           'rows INTEGER NOT NULL, cents INTEGER NOT NULL, PRIMARY KEY (name, grp, key))')
+        name = self.aggregates.name
+        exists = connection.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'trigger' AND name = ?", (f'{self.name}_{name}_insert',)
+        ).fetchone()
+        if exists:
+            return
+        def amount(row: str) -> str:
+            return f'CAST(ROUND({self.aggregates.value[1].format(row=row)} * 100) AS INTEGER)'
+        add, remove = [], []
+        for group, (_, expression) in self.aggregates.groups.items():
+            new, old = expression.format(row='NEW'), expression.format(row='OLD')
+            add.append(f"INSERT INTO aggregate_totals (name, grp, key, rows, cents) VALUES ('{name}', '{group}', {new}, 1, {amount('NEW')}) "
+                       f"ON CONFLICT (name, grp, key) DO UPDATE SET rows = rows + 1, cents = cents + excluded.cents;")
+            remove.append(f"UPDATE aggregate_totals SET rows = rows - 1, cents = cents - {amount('OLD')} "
+                          f"WHERE name = '{name}' AND grp = '{group}' AND key = {old};")
+            remove.append(f"DELETE FROM aggregate_totals WHERE name = '{name}' AND grp = '{group}' AND key = {old} AND rows = 0;")
+        connection.execute(f"CREATE TRIGGER {self.name}_{name}_insert AFTER INSERT ON {self.name} BEGIN {' '.join(add)} END")
+        connection.execute(f"CREATE TRIGGER {self.name}_{name}_update AFTER UPDATE ON {self.name} BEGIN {' '.join(remove + add)} END")
+        connection.execute(f"CREATE TRIGGER {self.name}_{name}_delete AFTER DELETE ON {self.name} BEGIN {' '.join(remove)} END")
+        # tabela que já existia: soma o conteúdo atual uma única vez
+        connection.execute('DELETE FROM aggregate_totals WHERE name = ?', (name,))
+        for group, (_, expression) in self.aggregates.groups.items():
+            connection.execute(f'INSERT INTO aggregate_totals (name, grp, key, rows, cents) '
+                               f'SELECT ?, ?, {expression.format(row=self.name)}, COUNT(*), SUM({amount(self.name)}) '
+                               f'FROM {self.name} GROUP BY 3', (name, group))
+        connection.commit()
+
+    def _changed(self) -> None:
+        # fora de um lote do escritor, cada mutação é commitada na hora
+        if not self._batching:
+            self.commit()
+
+    # Leitura
+
+    def get(self, id: int):
+        fields = self._connection().execute(f'{self._select} WHERE id = ?', (id,)).fetchone()
+        return self.from_fields(fields) if fields is not None else None
+
+    def exists(self, id: int) -> bool:
+        return self._connection().execute(f'SELECT 1 FROM {self.name} WHERE id = ?', (id,)).fetchone() is not None
+
+    def _pushdown(self, conditions: List[Condition]) -> Tuple[List[str], list, List[Condition]]:
+        # separa as condições que o SQLite avalia com o mesmo resultado do Python;
+        # o restante (texto sem diferenciar maiúsculas, datas, listas) é filtrado depois
+        clauses, params, residual = [], [], []
+        for field, op, value in conditions:
+            type = self.types.get(field)
+            numeric = type in NUMERIC_TYPES and isinstance(value, (int, float)) and not isinstance(value, bool)
+            if op in ('eq', 'ge', 'le') and numeric:
+                clauses.append(f"{field} {'=' if op == 'eq' else '>=' if op == 'ge' else '<='} ?")
+                params.append(value)
+            elif op == 'eq' and type == 'TEXT' and isinstance(value, str):
+                clauses.append(f'{field} = ?')
+                params.append(value)
+            else:
+                residual.append((field, op, value))
+        return clauses, params, residual
+
+    def _chunks(self, clauses: List[str], params: list, after: Optional[int]) -> Iterator:
+        # keyset em blocos: cada bloco é uma consulta curta, feita pela conexão da
+        # thread que está consumindo o gerador (o StreamingResponse troca de thread)
+        last = after
+        while True:
+            where = list(clauses)
+            values = list(params)
+            if last is not None:
+                where.append('id > ?')
+                values.append(last)
+            sql = self._select
+            if where:
+                sql += ' WHERE ' + ' AND '.join(where)
+            sql += f' ORDER BY id LIMIT {CHUNK_SIZE}'
+            rows = [self.from_fields(fields) for fields in self._connection().execute(sql, values)]
+            if not rows:
+                return
+            yield from rows
+            last = rows[-1].id
+
+    def scan(self, by_id: bool = False, after: Optional[int] = None) -> Iterator:
+        # a chave primária é o rowid: a ordem física já é a ordem de id
+        return self._chunks([], [], after)
+
+    def filter(self, conditions: List[Condition], by_id: bool = False, after: Optional[int] = None) -> Iterator:
+        clauses, params, residual = self._pushdown(conditions)
+        rows = self._chunks(clauses, params, after)
+        if not residual:
+            return rows
+        return (row for row in rows if matches(row, residual))
+
+    def explain(self, conditions: List[Condition]) -> dict:
+        # condições enviadas ao SQLite e o plano escolhido por ele (EXPLAIN QUERY PLAN)
+        clauses, params, residual = self._pushdown(conditions)
+        sql = self._select + (' WHERE ' + ' AND '.join(clauses) if clauses else '') + ' ORDER BY id'
+        plan = [detail for *_, detail in self._connection().execute(f'EXPLAIN QUERY PLAN {sql}', params)]
+        return {
+            **super().explain(conditions),
+            "strategy": "sqlite",
+            "pushdown": clauses,
+            "sqlite_plan": plan,
+            "residual": [list(condition) for condition in residual],
+        }
+
+    def ordered(self, field: str, start, limit: int, key: Optional[Callable] = None) -> List:
+        if field not in self.ranges:
+            return super().ordered(field, start, limit, key)
+        # intervalo e ordem saem do índice de julianday(field), sem ler a tabela toda
+        sql = (f'{self._select} WHERE julianday({field}) >= julianday(?) '
+               f'ORDER BY julianday({field}), id LIMIT ?')
+        return [self.from_fields(fields) for fields in self._connection().execute(sql, (start.isoformat(), limit))]
+
+    def count(self) -> int:
+        return self._connection().execute('SELECT rows FROM row_counts WHERE name = ?', (self.name,)).fetchone()[0]
+
+    def count_where(self, conditions: List[Condition]) -> int:
+        clauses, params, residual = self._pushdown(conditions)
+        if residual:
+            return super().count_where(conditions)
+        sql = f'SELECT COUNT(*) FROM {self.name}' + (' WHERE ' + ' AND '.join(clauses) if clauses else '')
+        return self._connection().execute(sql, params).fetchone()[0]
+
+    def totals(self, group: str) -> Dict:
+        rows = self._connection().execute('SELECT key, rows, cents FROM aggregate_totals WHERE name = ? AND grp = ?',
+                                          (self.aggregates.name, group))
+        return {key: (count, amount) for key, count, amount in rows}
+
+    def _table_version(self, connection: sqlite3.Connection) -> int:
+        return connection.execute('SELECT version FROM table_versions WHERE name = ?', (self.name,)).fetchone()[0]
+
+    def version(self) -> Optional[int]:
+        # lida do banco: muda com as escritas de qualquer processo (leituras fora do escritor só veem o que foi commitado)
+        return self._table_version(self._connection())
+
+    # Escrita (sempre a partir do escritor único)
+
+    def insert(self, row) -> None:
+        try:
+            self._connection().execute(self._insert, self.to_fields(row))
+        except sqlite3.IntegrityError:
+            raise ValueError(f"{self.name}: id {row.id} already exists")
+        self._changed()
+
+    def update(self, row) -> None:
+        fields = self.to_fields(row)
+        cursor = self._connection().execute(self._update, (*fields[1:], row.id))
+        if cursor.rowcount == 0:
+            raise KeyError(row.id)
+        self._changed()
+
+    def delete(self, id: int):
+        row = self.get(id)
+        if row is None:
+            raise KeyError(id)
+        self._connection().execute(f'DELETE FROM {self.name} WHERE id = ?', (id,))
+        self._changed()
+        return row
+
+    def begin_batch(self) -> None:
+        self._batching = True
+
+    def commit(self) -> None:
+        self._batching = False
+        self._connection().commit()
+
+    def discard(self) -> None:
+        self._batching = False
+        self._connection().rollback()
+
+    # Manutenção
+
+    def checkpoint(self) -> bool:
+        # move o WAL para o arquivo principal do banco
+        busy, _, _ = self._connection().execute('PRAGMA wal_checkpoint(TRUNCATE)').fetchone()
+        return not busy
+
+    def export_csv(self) -> str:
+        # regrava o CSV (atômico, com sidecar .idx) só se houve commits, de qualquer worker,
+        # desde o último export. Com o lock do CSV a versão lida, o conteúdo gravado e a
+        # versão registrada não se misturam com o export de outro worker.
+        # As linhas são lidas por uma conexão própria, que enxerga só o que já foi commitado:
+        # a da thread é compartilhada pelas tabelas e, dentro de um lote do escritor, já
+        # contém mutações que ainda podem ser descartadas
+        with self.csv_file.exclusive():
+            reader = _open(self.db_path)
+            try:
+                # versão e linhas lidas na mesma transação (o mesmo snapshot do WAL)
+                reader.execute('BEGIN')
+                version = self._table_version(reader)
+                stale = self._exported(reader) != version or not os.path.exists(self.csv_file.path)
+                if stale:
+                    self.csv_file.rewrite(self.from_fields(fields) for fields in reader.execute(f'{self._select} ORDER BY id'))
+                reader.rollback()
+            finally:
+                reader.close()
+            if stale:
+                # registrado na conexão da thread, sem commit próprio dentro de um lote: vai junto
+                # com ele (se o lote for descartado, o próximo export só regrava o CSV de novo)
+                self._set_exported(self._connection(), version)
+                self._changed()
+        return self.csv_file.path
+
+    def stats(self) -> dict:
+        return {
+            "backend": self.backend,
+            "entity": self.name,
+            "file": self.db_path,
+            "rows": self.count(),
+            "indexes": self.indexes,
+            "ranges": self.ranges,
+            "aggregates": {
+                "name": self.aggregates.name,
+                "groups": dict(self._connection().execute(
+                    'SELECT grp, COUNT(*) FROM aggregate_totals WHERE name = ? GROUP BY grp', (self.aggregates.name,))),
+            } if self.aggregates is not None else None,
+            "version": self.version(),
+            "csv_export": {
+                "file": self.csv_file.path,
+                "fresh": self._exported(self._connection()) == self.version(),
+            },
+        }
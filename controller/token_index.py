@@ -0,0 +1,99 @@
+from typing import Dict, List, Set
+from controller.repository import Condition, _items
+from controller.secondary_index import SecondaryIndex
+
+# `has`/`ihas` pedem um item; `ihas_any` recebe vários e aceita a linha com qualquer um.
+# Vários `ihas` no mesmo filtro formam o E entre os itens
+TOKEN_OPS = ('has', 'ihas', 'ihas_any')
+
+
+class TokenIndex(SecondaryIndex):
+    """Índice invertido (item -> ids) de um campo com vários itens, como o gênero dos filmes.
+
+    O texto separado por ';' é quebrado e normalizado uma única vez, quando a
+    linha entra no cache, e não a cada requisição: filtros por um ou mais itens
+    (E/OU) viram interseção/união de conjuntos e a contagem por item é o
+    tamanho de cada conjunto.
+    """
+
+    def __init__(self, name: str, field: str):
+        self.name = name
+        self.field = field
+        self._index: Dict[str, Set[int]] = {}
+        # grafia do item como apareceu primeiro, para as contagens
+        self._names: Dict[str, str] = {}
+
+    # Manutenção (chamada pelo EntityCache)
+
+    def _tokens(self, row) -> Dict[str, str]:
+        return {item.lower(): item for item in _items(getattr(row, self.field))}
+
+    def reset(self, rows: List) -> None:
+        self._index, self._names = {}, {}
+        for row in rows:
+            self.insert(row)
+
+    def insert(self, row) -> None:
+        for token, item in self._tokens(row).items():
+            ids = self._index.get(token)
+            if ids is None:
+                ids = self._index[token] = set()
+                self._names[token] = item
+            ids.add(row.id)
+
+    def _remove(self, row) -> None:
+        for token in self._tokens(row):
+            ids = self._index.get(token)
+            if ids is None:
+                continue
+            ids.discard(row.id)
+            if not ids:
+                del self._index[token]
+                del self._names[token]
+
+    # Consulta
+
+    def supports(self, condition: Condition) -> bool:
+        field, op, value = condition
+        if field != self.field or op not in TOKEN_OPS:
+            return False
+        values = value if op == 'ihas_any' else (value,)
+        return isinstance(values, (list, tuple)) and all(isinstance(item, str) for item in values)
+
+    def exact(self, condition: Condition) -> bool:
+        # `has` diferencia maiúsculas: o índice devolve um superconjunto
+        return condition[1] != 'has'
+
+    def tokenizes(self, field: str) -> bool:
+        return field == self.field
+
+    def _ids(self, condition: Condition) -> Set[int]:
+        _, op, value = condition
+        if op != 'ihas_any':
+            return self._index.get(value.lower(), set())
+        return set().union(*(self._index.get(item.lower(), ()) for item in value))
+
+    def ids(self, conditions: List[Condition]) -> Set[int]:
+        sets = sorted((self._ids(condition) for condition in conditions), key=len)
+        result = set(sets[0])
+        for ids in sets[1:]:
+            if not result:
+                break
+            result &= ids
+        return result
+
+    def estimate(self, conditions: List[Condition]) -> int:
+        # tamanho do conjunto de cada condição (soma dos itens no `ihas_any`); vale o menor
+        def size(condition: Condition) -> int:
+            _, op, value = condition
+            values = value if op == 'ihas_any' else (value,)
+            return sum(len(self._index.get(item.lower(), ())) for item in values)
+        return min(size(condition) for condition in conditions)
+
+    def counts(self) -> Dict[str, int]:
+        # linhas por item, da mais frequente para a menos
+        counts = {self._names[token]: len(ids) for token, ids in self._index.items() if token}
+        return dict(sorted(counts.items(), key=lambda entry: (-entry[1], entry[0])))
+
+    def stats(self) -> dict:
+        return {"field": self.field, "distinct_items": len(self._index)}
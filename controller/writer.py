@@ -0,0 +1,109 @@
+import functools
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, List, Tuple
+from controller.repository import Repository
+from utils.configs import ler_config_yaml
+from utils.logger_config import logger
+
+group_commit_config = ler_config_yaml().get('storage', {}).get('group_commit', {})
+MAX_BATCH = group_commit_config.get('max_batch', 64)
+MAX_DELAY_MS = group_commit_config.get('max_delay_ms', 0)
+
+
+class MutationQueue:
+    """Escritor único para todas as mutações das tabelas.
+
+    As rotas síncronas do FastAPI rodam em um thread pool; em vez de cada
+    thread fazer ler-modificar-gravar por conta própria, a mutação inteira
+    (validações + escrita) é enfileirada e executada por uma única thread.
+    As mutações que chegam enquanto um lote está sendo gravado são
+    agrupadas e persistidas com uma única escrita/fsync por arquivo
+    (group commit). A resposta só é liberada depois do commit do lote.
+    """
+
+    def __init__(self, tables: List[Repository], max_batch: int = MAX_BATCH, max_delay_ms: int = MAX_DELAY_MS):
+        self._tables = tables
+        self.max_batch = max_batch
+        self.max_delay_ms = max_delay_ms
+        self._queue: "queue.Queue[Tuple[Callable, Future]]" = queue.Queue()
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self.batches = 0
+        self.mutations = 0
+
+    def _ensure_started(self) -> None:
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='mutation-writer', daemon=True)
+                self._thread.start()
+
+    def submit(self, fn: Callable):
+        # chamadas feitas de dentro do próprio escritor rodam direto (evita deadlock)
+        if threading.current_thread() is self._thread:
+            return fn()
+        self._ensure_started()
+        future: Future = Future()
+        self._queue.put((fn, future))
+        return future.result()
+
+    def serialized(self, fn: Callable) -> Callable:
+        # decorator para as rotas de escrita; functools.wraps preserva a assinatura para o FastAPI
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            return self.submit(lambda: fn(*args, **kwargs))
+        return wrapper
+
+    def _next_batch(self) -> List[Tuple[Callable, Future]]:
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_delay_ms / 1000
+        while len(batch) < self.max_batch:
+            timeout = deadline - time.monotonic()
+            try:
+                if timeout > 0:
+                    batch.append(self._queue.get(timeout=timeout))
+                else:
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self) -> None:
+        while True:
+            batch = self._next_batch()
+            results = []
+            for table in self._tables:
+                table.begin_batch()
+            for fn, future in batch:
+                try:
+                    results.append((future, fn(), None))
+                except BaseException as exc:
+                    results.append((future, None, exc))
+            try:
+                self._commit()
+            except Exception as exc:
+                logger.error(f"[mutation_writer] - Group commit failed, discarding batch: {exc}")
+                for table in self._tables:
+                    table.discard()
+                results = [(future, None, error or exc) for future, _, error in results]
+            self.batches += 1
+            self.mutations += len(batch)
+            for future, result, error in results:
+                if error is not None:
+                    future.set_exception(error)
+                else:
+                    future.set_result(result)
+
+    def _commit(self) -> None:
+        for table in self._tables:
+            table.commit()
+
+    def stats(self) -> dict:
+        return {
+            "batches": self.batches,
+            "mutations": self.mutations,
+            "avg_batch_size": round(self.mutations / self.batches, 2) if self.batches else 0.0,
+            "queued": self._queue.qsize(),
+        }
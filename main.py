@@ -1,11 +1,29 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from routers import movie, session, ticket
-from utils.logger_config import configurar_logging
+from controller.controller import checkpoint_movies_csv, checkpoint_session_csv, checkpoint_tickets_csv, save_snapshots, warm_caches
+from utils.logger_config import configurar_logging, logger
 
 configurar_logging()
-app = FastAPI()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # com os snapshots em dia, as tabelas sobem sem parsear os CSVs
+    logger.info("[lifespan] - Loading tables")
+    warm_caches()
+    yield
+    # aplica o journal pendente aos CSVs ao encerrar o servidor
+    logger.info("[lifespan] - Checkpointing pending journal entries")
+    checkpoint_movies_csv()
+    checkpoint_session_csv()
+    checkpoint_tickets_csv()
+    # o checkpoint reescreve os CSVs: o snapshot é gravado depois, já com a assinatura nova
+    save_snapshots()
+
+app = FastAPI(lifespan=lifespan)
 
 # Importando os routers
 app.include_router(movie.router, tags=["Movies"])
 app.include_router(session.router, tags=["Sessions"])
-app.include_router(ticket.router, tags=["Tickets"])
\ No newline at end of file
+app.include_router(ticket.router, tags=["Tickets"])
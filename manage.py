@@ -0,0 +1,71 @@
+import argparse
+from controller.controller import (
+    movies_offsets, sessions_offsets, tickets_offsets,
+    checkpoint_movies_csv, checkpoint_session_csv, checkpoint_tickets_csv,
+    export_movies_csv, export_session_csv, export_tickets_csv,
+)
+from controller.offset_index import rebuild_index
+
+OFFSET_INDEXES = {
+    'movies': movies_offsets,
+    'sessions': sessions_offsets,
+    'tickets': tickets_offsets,
+}
+
+CHECKPOINTS = {
+    'movies': checkpoint_movies_csv,
+    'sessions': checkpoint_session_csv,
+    'tickets': checkpoint_tickets_csv,
+}
+
+EXPORTS = {
+    'movies': export_movies_csv,
+    'sessions': export_session_csv,
+    'tickets': export_tickets_csv,
+}
+
+
+def cmd_rebuild_index(args) -> None:
+    entities = list(OFFSET_INDEXES) if args.entity == 'all' else [args.entity]
+    for entity in entities:
+        index = OFFSET_INDEXES[entity]
+        total = rebuild_index(index)
+        print(f'{entity}: {total} linhas indexadas em {index.index_path}')
+
+
+def cmd_checkpoint(args) -> None:
+    entities = list(CHECKPOINTS) if args.entity == 'all' else [args.entity]
+    for entity in entities:
+        applied = CHECKPOINTS[entity]()
+        print(f'{entity}: {"journal aplicado" if applied else "nada pendente"}')
+
+
+def cmd_export(args) -> None:
+    entities = list(EXPORTS) if args.entity == 'all' else [args.entity]
+    for entity in entities:
+        path = EXPORTS[entity]()
+        print(f'{entity}: CSV atualizado em {path}')
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Tarefas de manutenção dos arquivos de dados')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    rebuild = subparsers.add_parser('rebuild-index', help='Reconstrói o índice de offsets (.idx) a partir do CSV')
+    rebuild.add_argument('entity', nargs='?', default='all', choices=['all', *OFFSET_INDEXES])
+    rebuild.set_defaults(func=cmd_rebuild_index)
+
+    checkpoint = subparsers.add_parser('checkpoint', help='Aplica o journal pendente ao CSV')
+    checkpoint.add_argument('entity', nargs='?', default='all', choices=['all', *CHECKPOINTS])
+    checkpoint.set_defaults(func=cmd_checkpoint)
+
+    export = subparsers.add_parser('export', help='Regrava o CSV a partir do backend configurado')
+    export.add_argument('entity', nargs='?', default='all', choices=['all', *EXPORTS])
+    export.set_defaults(func=cmd_export)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main()
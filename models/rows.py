@@ -0,0 +1,97 @@
+from datetime import datetime
+from typing import Tuple
+from pydantic import BaseModel
+from models.models import Movie, Session, Ticket
+
+
+class Row:
+    """Representação interna e compacta de uma linha (caches, repositórios e filtros).
+
+    Os models do Pydantic só são criados (to_model) para as linhas que de fato
+    saem em uma resposta.
+    """
+
+    __slots__ = ()
+    model: type = None
+
+    @classmethod
+    def from_model(cls, instance: BaseModel) -> 'Row':
+        return cls(**{name: getattr(instance, name) for name in cls.__slots__})
+
+    def values(self) -> dict:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def to_model(self) -> BaseModel:
+        # sem revalidar: as linhas já foram validadas na entrada (API ou carga do CSV)
+        return self.model.model_construct(**self.values())
+
+    def __reduce__(self):
+        # pickle enxuto (load paralelo): a classe e os valores na ordem do __init__
+        return type(self), tuple(getattr(self, name) for name in self.__slots__)
+
+    def __eq__(self, other) -> bool:
+        return type(other) is type(self) and all(getattr(self, name) == getattr(other, name) for name in self.__slots__)
+
+    def __hash__(self) -> int:
+        # linhas iguais têm o mesmo id (o id não muda depois que a linha entra no cache)
+        return hash((type(self), self.id))
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({', '.join(f'{name}={getattr(self, name)!r}' for name in self.__slots__)})"
+
+
+class MovieRow(Row):
+    __slots__ = ('id', 'title', 'genre', 'director', 'duration_minutes', 'release_year', 'rating')
+    model = Movie
+
+    def __init__(self, id: int, title: str, genre: str, director: str,
+                 duration_minutes: int, release_year: int, rating: str):
+        self.id = id
+        self.title = title
+        self.genre = genre
+        self.director = director
+        self.duration_minutes = duration_minutes
+        self.release_year = release_year
+        self.rating = rating
+
+
+class SessionRow(Row):
+    __slots__ = ('id', 'movie_id', 'start_time', 'room', 'available_seats')
+    model = Session
+
+    def __init__(self, id: int, movie_id: str, start_time: datetime, room: str, available_seats):
+        self.id = id
+        self.movie_id = movie_id
+        self.start_time = start_time
+        self.room = room
+        # tupla: menor que uma lista e imutável dentro do cache
+        self.available_seats: Tuple[str, ...] = tuple(available_seats)
+
+    def values(self) -> dict:
+        values = super().values()
+        values['available_seats'] = list(self.available_seats)
+        return values
+
+
+class TicketRow(Row):
+    __slots__ = ('id', 'session_id', 'client_name', 'seat', 'purchase_date', 'ticket_type', 'price')
+    model = Ticket
+
+    def __init__(self, id: int, session_id: int, client_name: str, seat: str,
+                 purchase_date: datetime, ticket_type: str, price: float):
+        self.id = id
+        self.session_id = session_id
+        self.client_name = client_name
+        self.seat = seat
+        self.purchase_date = purchase_date
+        self.ticket_type = ticket_type
+        self.price = price
+
+
+def validated(row_class: type):
+    # construtor que passa pela validação completa do model antes de virar linha compacta
+    model = row_class.model
+
+    def build(**values) -> Row:
+        return row_class.from_model(model(**values))
+    return build
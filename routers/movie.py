@@ -1,123 +1,145 @@
 import os
 import zipfile
-from fastapi import APIRouter, HTTPException, Query
-from starlette.responses import FileResponse
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.encoders import jsonable_encoder
+from starlette.responses import FileResponse, JSONResponse
 from http import HTTPStatus
 from models.models import Movie
 from typing import List, Optional
 from utils.logger_config import logger
 from utils.configs import ler_config_yaml
-from .session import read_session_csv
-from controller.controller import read_session_csv
+from utils.streaming import stream_rows
+from utils.pagination import MAX_PAGE_SIZE, decode_cursor, paged_response
+from controller.repository import Condition
+from controller.controller import read_movies_csv, iter_movies, iter_movies_by_id, append_movie_csv, update_movie_csv, delete_movie_csv, find_movie_by_id, movie_exists, iter_sessions_where, query_movies, explain_movies, count_movies, count_movies_by_genre, export_movies_csv, movies_repository, writer, query_cache
 
 router = APIRouter()
 movies_data = ler_config_yaml().get('data', {})
 MOVIE_CSV_FILE = movies_data.get('csv', {}).get('movies', 'data/movies.csv')
 MOVIE_ZIP_FILE = movies_data.get('compressed', {}).get('movies', 'compressed/movies.zip')
 
-def read_movies_csv() -> List[Movie]:
-    movies: List[Movie] = []
-    if os.path.exists(MOVIE_CSV_FILE):
-        with open(MOVIE_CSV_FILE, mode='r', encoding='utf-8') as file:
-            next(file, None) #ignora o header
-            for line in file:
-                id, title, genre, director, duration_minutes, release_year, rating = line.strip().split(',')
-                movies.append(
-                    Movie(
-                        id=int(id),
-                        title=title, 
-                        genre=genre,
-                        director=director,
-                        duration_minutes=int(duration_minutes), 
-                        release_year=int(release_year), 
-                        rating=rating
-                        )
-                    )
-    return movies
-
-def write_movies_csv(movies: List[Movie]) -> None:
-    with open(MOVIE_CSV_FILE, mode='w', encoding='utf-8') as file:
-        file.write("id,title,genre,director,duration_minutes,release_year,rating\n")
-        for movie in movies:
-            file.write(f"{movie.id},{movie.title},{movie.genre},{movie.director},{movie.duration_minutes},{movie.release_year},{movie.rating}\n")
-
-
 @router.get("/movies", response_model=List[Movie])
-def get_movies():
+def get_movies(
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE, description="Tamanho da página (ordena por id)"),
+    cursor: Optional[str] = Query(None, description="Cursor da próxima página (header X-Next-Cursor)"),
+    format: str = Query("json", description="Formato da resposta: json ou ndjson", pattern="^(json|ndjson)$")
+):
     logger.info("[get_movies] - Fetching all movies.")
-    movies = read_movies_csv()
-    logger.debug(f"[get_movies] - {len(movies)} movies found.")
+    if limit is not None or cursor is not None:
+        return paged_response(iter_movies_by_id(decode_cursor(cursor)), limit, format)
+    movies = iter_movies()
     logger.info("[get_movies] - Movies recovered successfully.")
-    return movies
+    return stream_rows(movies, format)
 
 @router.get("/movies/{movie_id}", response_model=Movie)
 def get_movie_by_id(movie_id: int):
     logger.info(f"[get_movie_by_id] - Fetching movie with ID: {movie_id}")
-    movies = read_movies_csv()
-    for movie in movies:
-        if movie.id == movie_id:
-            logger.info(f"[get_movie_by_id] - Movie found: {movie.title}")
-            return movie
+    movie = find_movie_by_id(movie_id)
+    if movie is not None:
+        logger.info(f"[get_movie_by_id] - Movie found: {movie.title}")
+        return movie.to_model()
     logger.error(f"[get_movie_by_id] - Movie with ID {movie_id} not found")
     raise HTTPException(status_code=HTTPStatus.NOT_FOUND, detail="Movie not found") 
 
 @router.post("/movies", response_model=Movie, status_code=HTTPStatus.CREATED)
+@writer.serialized
 def create_movie(movie: Movie):
     logger.info(f"[create_movie] - Creating movie: {movie.title}")
-    movies = read_movies_csv()
-    if any(m.id == movie.id for m in movies):
+    if movie_exists(movie.id):
+        logger.error(f"[create_movie] - Movie with ID {movie.id} already exists")
+        raise HTTPException(status_code=HTTPStatus.CONFLICT, detail="Movie with this ID already exists")
+    try:
+        append_movie_csv(movie)
+    except ValueError:
         logger.error(f"[create_movie] - Movie with ID {movie.id} already exists")
         raise HTTPException(status_code=HTTPStatus.CONFLICT, detail="Movie with this ID already exists")
-    movies.append(movie)
-    write_movies_csv(movies)
     logger.info(f"[create_movie] - Movie created: {movie.title}")
     return movie
 
 @router.put("/movies/{movie_id}", response_model=Movie)
+@writer.serialized
 def update_movie(movie_id: int, updated_movie: Movie):
     logger.info(f"[update_movie] - Updating movie with ID: {movie_id}")
-    movies = read_movies_csv()
-    for index, movie in enumerate(movies):
-        if movie.id == movie_id:
-            movies[index] = updated_movie
-            logger.info(f"[update_movie] - Movie updated: {updated_movie.title}")
-            if updated_movie.id != movie_id:
-                logger.error("[update_movie] - Cannot change movie ID")
-                raise HTTPException(status_code=HTTPStatus.BAD_REQUEST, detail="Cannot change movie ID")
-            write_movies_csv(movies)
-            return updated_movie
-    logger.error(f"[update_movie] - Movie with ID {movie_id} not found")
-    raise HTTPException(status_code=HTTPStatus.NOT_FOUND, detail="Movie not found")
+    if not movie_exists(movie_id):
+        logger.error(f"[update_movie] - Movie with ID {movie_id} not found")
+        raise HTTPException(status_code=HTTPStatus.NOT_FOUND, detail="Movie not found")
+    if updated_movie.id != movie_id:
+        logger.error("[update_movie] - Cannot change movie ID")
+        raise HTTPException(status_code=HTTPStatus.BAD_REQUEST, detail="Cannot change movie ID")
+    update_movie_csv(updated_movie)
+    logger.info(f"[update_movie] - Movie updated: {updated_movie.title}")
+    return updated_movie
 
 @router.delete("/movies/{movie_id}", status_code=HTTPStatus.NO_CONTENT)
+@writer.serialized
 def delete_movie(movie_id: int):
     logger.info(f"[delete_movie] - Deleting movie with ID: {movie_id}")
-    movies = read_movies_csv()
-    for movie in movies:
-        if movie.id == movie_id: 
-            has_session = read_session_csv()
-            for session in has_session:
-                if session.movie_id == str(movie_id):
-                    logger.error(f"[delete_movie] - Cannot delete movie with ID {movie_id} because it has associated sessions.")
-                    raise HTTPException(status_code=HTTPStatus.BAD_REQUEST, detail="Cannot delete movie with associated sessions.")
-            movies.remove(movie)
-            write_movies_csv(movies)
-            logger.info(f"[delete_movie] - Movie deleted: {movie.title}")
-            return
-    logger.error(f"[delete_movie] - Movie with ID {movie_id} not found")
-    raise HTTPException(status_code=HTTPStatus.NOT_FOUND, detail="Movie not found")
+    if not movie_exists(movie_id):
+        logger.error(f"[delete_movie] - Movie with ID {movie_id} not found")
+        raise HTTPException(status_code=HTTPStatus.NOT_FOUND, detail="Movie not found")
+    # consulta pelo índice de movie_id das sessões, sem varrer a tabela
+    if next(iter_sessions_where([('movie_id', 'eq', str(movie_id))]), None) is not None:
+        logger.error(f"[delete_movie] - Cannot delete movie with ID {movie_id} because it has associated sessions.")
+        raise HTTPException(status_code=HTTPStatus.BAD_REQUEST, detail="Cannot delete movie with associated sessions.")
+    movie = delete_movie_csv(movie_id)
+    logger.info(f"[delete_movie] - Movie deleted: {movie.title}")
+
+def movie_filters(
+    genre: Optional[List[str]] = Query(None, description="Gênero do filme (repita o parâmetro para vários)"),
+    genre_mode: str = Query("all", description="Com vários gêneros: all (todos) ou any (qualquer um)", pattern="^(all|any)$"),
+    director: Optional[str] = Query(None, description="Nome do diretor"),
+    min_duration: Optional[int] = Query(None, description="Duração mínima em minutos"),
+    max_duration: Optional[int] = Query(None, description="Duração máxima em minutos"),
+    release_year: Optional[int] = Query(None, description="Ano de lançamento exato"),
+    title: Optional[str] = Query(None, description="Título ou parte do título")
+) -> List[Condition]:
+    # condições dos filtros de movies, compartilhadas pelo -filter e pelo -count
+    logger.debug("[movie_filters] - Filtering attributes:")
+    logger.debug(f"[movie_filters] - genre: {genre} ({genre_mode})")
+    logger.debug(f"[movie_filters] - director: {director}")
+    logger.debug(f"[movie_filters] - min_duration: {min_duration}")
+    logger.debug(f"[movie_filters] - max_duration: {max_duration}")
+    logger.debug(f"[movie_filters] - release_year: {release_year}")
+    logger.debug(f"[movie_filters] - title: {title}")
+    conditions = []
+    if genre:
+        if genre_mode == 'any' and len(genre) > 1:
+            conditions.append(('genre', 'ihas_any', tuple(genre)))
+        else:
+            conditions.extend(('genre', 'ihas', item) for item in genre)
+    if director is not None:
+        conditions.append(('director', 'icontains', director))
+    if min_duration is not None:
+        conditions.append(('duration_minutes', 'ge', min_duration))
+    if max_duration is not None:
+        conditions.append(('duration_minutes', 'le', max_duration))
+    if release_year is not None:
+        conditions.append(('release_year', 'eq', release_year))
+    if title is not None:
+        conditions.append(('title', 'icontains', title))
+    return conditions
 
 @router.get("/movies-count")
-def get_movies_count():
+def get_movies_count(conditions: List[Condition] = Depends(movie_filters)):
     logger.info("[get_movies_count] - Counting all movies")
-    movies = read_movies_csv()
     return  {
-        "quantidade": len(movies)
+        "quantidade": count_movies(conditions)
     }
 
+@router.get("/movies-genres")
+def get_movies_genres():
+    logger.info("[get_movies_genres] - Counting movies by genre")
+    return count_movies_by_genre()
+
+@router.get("/movies-cache")
+def get_movies_cache_stats():
+    logger.info("[get_movies_cache_stats] - Returning movies cache statistics")
+    return {**movies_repository.stats(), "writer": writer.stats(), "query_cache": query_cache.stats()}
+
 @router.get("/movies-zip")
 def get_movies_zip():
     logger.info("[get_movies_zip] - Creating ZIP file of movies")
+    export_movies_csv()
     with zipfile.ZipFile(MOVIE_ZIP_FILE, 'w') as zipf:
         zipf.write(MOVIE_CSV_FILE, os.path.basename(MOVIE_CSV_FILE))
         logger.info(f"[get_movies_zip] - ZIP file created: {MOVIE_ZIP_FILE}")
@@ -125,44 +147,26 @@ def get_movies_zip():
     
 @router.get("/movies-filter", response_model=List[Movie])
 def filter_movies(
-    genre: Optional[str] = Query(None, description="Gênero do filme"),
-    director: Optional[str] = Query(None, description="Nome do diretor"),
-    min_duration: Optional[int] = Query(None, description="Duração mínima em minutos"),
-    max_duration: Optional[int] = Query(None, description="Duração máxima em minutos"),
-    release_year: Optional[int] = Query(None, description="Ano de lançamento exato"),
-    title: Optional[str] = Query(None, description="Título ou parte do título")
+    conditions: List[Condition] = Depends(movie_filters),
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE, description="Tamanho da página (ordena por id)"),
+    cursor: Optional[str] = Query(None, description="Cursor da próxima página (header X-Next-Cursor)"),
+    explain: bool = Query(False, description="Devolve o plano da consulta (índices, estimativas e tempos) em vez das linhas"),
+    format: str = Query("json", description="Formato da resposta: json ou ndjson", pattern="^(json|ndjson)$")
 ):
     logger.info("[filter_movies] - Starting search with movie filtering.")
-    logger.debug("[filter_movies] - Filtering attributes:")
-    logger.debug(f"[filter_movies] - genre: {genre}")
-    logger.debug(f"[filter_movies] - director: {director}")
-    logger.debug(f"[filter_movies] - min_duration: {min_duration}")
-    logger.debug(f"[filter_movies] - max_duration: {max_duration}")
-    logger.debug(f"[filter_movies] - release_year: {release_year}")
-    logger.debug(f"[filter_movies] - title: {title}")
-    movies = read_movies_csv()
-    results: List[Movie] = []
-    for movie in movies:
-        if genre is not None and genre.lower() not in [g.lower() for g in movie.genre.split(';')]:
-            continue
-        if director is not None and director.lower() not in movie.director.lower():
-            continue
-        if min_duration is not None and movie.duration_minutes < min_duration:
-            continue
-        if max_duration is not None and movie.duration_minutes > max_duration:
-            continue
-        if release_year is not None and movie.release_year != release_year:
-            continue
-        if title is not None and title.lower() not in movie.title.lower():
-            continue
-        results.append(movie)
-    return results
+    logger.debug(f"[filter_movies] - conditions: {conditions}")
+    if explain:
+        return JSONResponse(jsonable_encoder(explain_movies(conditions)))
+    if limit is not None or cursor is not None:
+        return paged_response(query_movies(conditions, by_id=True, after=decode_cursor(cursor)), limit, format)
+    return stream_rows(query_movies(conditions), format)
 
 #F6 Retornar o Hash SHA256 do Arquivo CSV
 @router.get("/movies-hash")
 def get_movies_hash():
     logger.info("[get_movies_hash] - Calculating SHA256 hash of the movies CSV file.")
     import hashlib
+    export_movies_csv()
     sha256_hash = hashlib.sha256()
     with open(MOVIE_CSV_FILE, "rb") as f:
         for byte_block in iter(lambda: f.read(4096), b""):
@@ -180,7 +184,7 @@ def get_movies_xml():
     root = ET.Element("movies")
     for movie in movies:
         movie_elem = ET.SubElement(root, "movie")
-        for key, value in movie.dict().items():
+        for key, value in movie.to_model().dict().items():
             child = ET.SubElement(movie_elem, key)
             child.text = str(value)
     tree = ET.ElementTree(root)
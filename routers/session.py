@@ -1,13 +1,18 @@
 import os
 import zipfile
 from datetime import datetime
-from fastapi import APIRouter, HTTPException, Query
-from starlette.responses import FileResponse
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.encoders import jsonable_encoder
+from starlette.responses import FileResponse, JSONResponse
 from http import HTTPStatus
-from models.models import Session, Ticket
+from models.models import Session
 from typing import List, Optional
 from utils.logger_config import logger
-from controller.controller import read_movies_csv
+from utils.streaming import stream_rows
+from utils.pagination import MAX_PAGE_SIZE, decode_cursor, paged_response
+from controller.parsing import as_utc
+from controller.repository import Condition
+from controller.controller import read_session_csv, iter_sessions, iter_sessions_by_id, append_session_csv, update_session_csv, delete_session_csv, find_session_by_id, iter_tickets_where, session_exists, movie_exists, query_sessions, explain_sessions, upcoming_sessions, count_sessions, export_session_csv, sessions_repository, writer, query_cache
 
 router = APIRouter()
 from utils.configs import ler_config_yaml
@@ -16,187 +21,157 @@ sessions_data = ler_config_yaml().get('data', {})
 SESSION_CSV_FILE = sessions_data.get('csv', {}).get('session', 'data/session.csv')
 SESSION_ZIP_FILE = sessions_data.get('compressed', {}).get('session', 'compressed/session.zip')
 
-TICKET_CSV_FILE = sessions_data.get('csv', {}).get('ticket', 'data/ticket.csv')
-TICKET_ZIP_FILE = sessions_data.get('compressed', {}).get('ticket', 'compressed/ticket.zip')
-
-# Utility functions
-
-def read_tickets_csv() -> List[Ticket]:
-    tickets: List[Ticket] = []
-    if os.path.exists(TICKET_CSV_FILE):
-        with open(TICKET_CSV_FILE, mode='r', encoding='utf-8') as file:
-            next(file, None)  # ignora o header
-            for line in file:
-                id, session_id, client_name, seat, purchase_date, ticket_type, price = line.strip().split(',')
-                tickets.append(
-                    Ticket(
-                        id=int(id),
-                        session_id=int(session_id),
-                        client_name=client_name,
-                        seat=seat,
-                        purchase_date=datetime.fromisoformat(purchase_date),
-                        ticket_type=ticket_type,
-                        price=price
-                    )
-                )
-    return tickets
-
-
-# Utility functions
-
-def read_session_csv() -> List[Session]:
-    sessions: List[Session] = []
-    if os.path.exists(SESSION_CSV_FILE):
-        with open(SESSION_CSV_FILE, mode='r', encoding='utf-8') as file:
-            next(file, None) #ignora o header
-            for line in file:
-                id, movie_id, start_time, room, available_seats = line.strip().split(',')
-                sessions.append(
-                    Session(
-                        id=int(id),
-                        movie_id=movie_id, 
-                        start_time=datetime.fromisoformat(start_time), 
-                        room=room, 
-                        available_seats=available_seats.split(';')
-                    )
-                )
-    return sessions
-
-
-def write_session_csv(sessions):
-    with open(SESSION_CSV_FILE, mode='w', encoding='utf-8') as file:
-        file.write("id,movie_id,start_time,room,available_seats\n")
-        for session in sessions:
-            file.write(f"{session.id},{session.movie_id},{session.start_time.isoformat()},{session.room},{';'.join(session.available_seats)}\n")
-            # AvailableSeats é uma lista de strings, então usamos join para convertê-la em uma string separada por ponto e vírgula
-
 # CRUD Endpoints
 
 @router.get("/sessions", response_model=List[Session])
-def get_sessions():
+def get_sessions(
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE, description="Tamanho da página (ordena por id)"),
+    cursor: Optional[str] = Query(None, description="Cursor da próxima página (header X-Next-Cursor)"),
+    format: str = Query("json", description="Formato da resposta: json ou ndjson", pattern="^(json|ndjson)$")
+):
     logger.info("[get_sessions] - Fetching all sessions")
-    sessions = read_session_csv()
+    if limit is not None or cursor is not None:
+        return paged_response(iter_sessions_by_id(decode_cursor(cursor)), limit, format)
+    sessions = iter_sessions()
     logger.info("[get_sessions] - Sessions recovered successfully.")
-    return sessions
+    return stream_rows(sessions, format)
 
 @router.get("/sessions/{session_id}", response_model=Session)
 def get_session_by_id(session_id: int):
     logger.info(f"[get_session_by_id] - Fetching session with ID: {session_id}")
-    sessions = read_session_csv()
-    for session in sessions:
-        if session.id == session_id:
-            logger.info(f"[get_session_by_id] - Session found: {session}")
-            return session
+    session = find_session_by_id(session_id)
+    if session is not None:
+        logger.info(f"[get_session_by_id] - Session found: {session}")
+        return session.to_model()
     logger.error(f"[get_session_by_id] - Session with ID {session_id} not found")
     raise HTTPException(status_code=HTTPStatus.NOT_FOUND, detail="Session not found")
 
 @router.post("/sessions", response_model=Session, status_code=HTTPStatus.CREATED)
+@writer.serialized
 def create_session(session: Session):
     logger.info(f"[create_session] - Creating session: {session}")
-    sessions = read_session_csv()
-    if any(s.id == session.id for s in sessions):
+    if session_exists(session.id):
         logger.error(f"[create_session] - Session with ID {session.id} already exists")
         raise HTTPException(status_code=HTTPStatus.CONFLICT, detail="Session with this ID already exists")
-    has_movie = read_movies_csv()
-    if all(m.id != int(session.movie_id) for m in has_movie):
+    if not movie_exists(int(session.movie_id)):
         logger.error(f"[create_session] - Movie with ID {session.movie_id} doesn't exists")
         raise HTTPException(status_code=HTTPStatus.UNPROCESSABLE_ENTITY, detail="movie with this id doesn't exists")
-    sessions.append(session)
-    write_session_csv(sessions)
+    try:
+        append_session_csv(session)
+    except ValueError:
+        logger.error(f"[create_session] - Session with ID {session.id} already exists")
+        raise HTTPException(status_code=HTTPStatus.CONFLICT, detail="Session with this ID already exists")
     logger.info(f"[create_session] - Session created: {session}")
     return session
 
 @router.put("/sessions/{session_id}", response_model=Session)
+@writer.serialized
 def update_session(session_id: int, updated_session: Session):
     logger.info(f"[update_session] - Updating session with ID: {session_id}")
-    sessions = read_session_csv()
-    for index, session in enumerate(sessions):
-        if session.id == session_id:
-            sessions[index] = updated_session
-            if updated_session.id != session_id:
-                logger.error(f"[update_session] - Cannot change session ID from {session_id} to {updated_session.id}")
-                raise HTTPException(status_code=HTTPStatus.BAD_REQUEST, detail="Cannot change session ID")
-            has_movie = read_movies_csv()
-            if all(m.id != int(session.movie_id) for m in has_movie):
-                logger.error(f"[create_session] - Movie with ID {session.movie_id} doesn't exists")
-                raise HTTPException(status_code=HTTPStatus.BAD_REQUEST, detail="movie with this id doesn't exists")
-            write_session_csv(sessions)
-            logger.info(f"[update_session] - Session updated: {updated_session}")
-            return updated_session
-    logger.error(f"[update_session] - Session with ID {session_id} not found")
-    raise HTTPException(status_code=HTTPStatus.NOT_FOUND, detail="Session not found")
+    if not session_exists(session_id):
+        logger.error(f"[update_session] - Session with ID {session_id} not found")
+        raise HTTPException(status_code=HTTPStatus.NOT_FOUND, detail="Session not found")
+    if updated_session.id != session_id:
+        logger.error(f"[update_session] - Cannot change session ID from {session_id} to {updated_session.id}")
+        raise HTTPException(status_code=HTTPStatus.BAD_REQUEST, detail="Cannot change session ID")
+    if not movie_exists(int(updated_session.movie_id)):
+        logger.error(f"[update_session] - Movie with ID {updated_session.movie_id} doesn't exists")
+        raise HTTPException(status_code=HTTPStatus.BAD_REQUEST, detail="movie with this id doesn't exists")
+    update_session_csv(updated_session)
+    logger.info(f"[update_session] - Session updated: {updated_session}")
+    return updated_session
 
 @router.delete("/sessions/{session_id}", status_code=HTTPStatus.NO_CONTENT)
+@writer.serialized
 def delete_session(session_id: int):
     logger.info(f"[delete_session] - Deleting session with ID: {session_id}")
-    sessions = read_session_csv()
-    for session in sessions:
-        if session.id == session_id:
-            has_ticket = read_tickets_csv()
-            print(session_id)
-            for ticket in has_ticket:
-                if ticket.session_id == int(session_id):
-                    print(ticket.session_id)
-                    logger.error(f"[delete_session] - Cannot delete session with ID {session_id} because it has associated tickets.")
-                    raise HTTPException(status_code=HTTPStatus.BAD_REQUEST, detail="Cannot delete session with associated tickets.")
-            sessions.remove(session)
-            write_session_csv(sessions)
-            logger.info(f"[delete_session] - Session deleted: {session}")
-            return
-    logger.error(f"[delete_session] - Session with ID {session_id} not found")
-    raise HTTPException(status_code=HTTPStatus.NOT_FOUND, detail="Session not found")
+    if not session_exists(session_id):
+        logger.error(f"[delete_session] - Session with ID {session_id} not found")
+        raise HTTPException(status_code=HTTPStatus.NOT_FOUND, detail="Session not found")
+    # consulta pelo índice de session_id dos tickets, sem varrer a tabela
+    if next(iter_tickets_where([('session_id', 'eq', session_id)]), None) is not None:
+        logger.error(f"[delete_session] - Cannot delete session with ID {session_id} because it has associated tickets.")
+        raise HTTPException(status_code=HTTPStatus.BAD_REQUEST, detail="Cannot delete session with associated tickets.")
+    session = delete_session_csv(session_id)
+    logger.info(f"[delete_session] - Session deleted: {session}")
+
+@router.get("/sessions-upcoming", response_model=List[Session])
+def get_upcoming_sessions(limit: int = Query(10, ge=1, le=MAX_PAGE_SIZE, description="Quantidade de sessões")):
+    logger.info(f"[get_upcoming_sessions] - Fetching next {limit} sessions")
+    return [session.to_model() for session in upcoming_sessions(limit)]
+
+def session_filters(
+    movie_id: Optional[int] = Query(None, description="ID da sessão"),
+    room: Optional[str] = Query(None, description="Sala da sessão"),
+    start_time_from: Optional[datetime] = Query(None, description="Data/hora de início mínima (ISO format)"),
+    start_time_to: Optional[datetime] = Query(None, description="Data/hora de início máxima (ISO format)"),
+    available_seat: Optional[str] = Query(None, description="Assento disponível")
+) -> List[Condition]:
+    # condições dos filtros de sessions, compartilhadas pelo -filter e pelo -count
+    logger.debug("[session_filters] - Filtering attributes:")
+    logger.debug(f"[session_filters] - movie_id: {movie_id}")
+    logger.debug(f"[session_filters] - room: {room}")
+    logger.debug(f"[session_filters] - start_time_from: {start_time_from}")
+    logger.debug(f"[session_filters] - start_time_to: {start_time_to}")
+    logger.debug(f"[session_filters] - available_seat: {available_seat}")
+    conditions = []
+    if movie_id is not None:
+        # movie_id é guardado como texto na sessão
+        conditions.append(('movie_id', 'eq', str(movie_id)))
+    if room is not None:
+        conditions.append(('room', 'ieq', room))
+    if start_time_from is not None:
+        # sem fuso vale como UTC, a mesma regra do índice ordenado: assim a condição
+        # pode ser conferida nas linhas (gravadas com fuso) quando o índice fica fora do plano
+        conditions.append(('start_time', 'ge', as_utc(start_time_from)))
+    if start_time_to is not None:
+        conditions.append(('start_time', 'le', as_utc(start_time_to)))
+    if available_seat is not None:
+        conditions.append(('available_seats', 'has', available_seat))
+    return conditions
 
 @router.get("/sessions-count")
-def get_sessions_count():
+def get_sessions_count(conditions: List[Condition] = Depends(session_filters)):
     logger.info("[get_sessions_count] - Counting all sessions")
-    sessions = read_session_csv()
     return  {
-        "quantidade": len(sessions)
+        "quantidade": count_sessions(conditions)
     }
 
+@router.get("/sessions-cache")
+def get_sessions_cache_stats():
+    logger.info("[get_sessions_cache_stats] - Returning sessions cache statistics")
+    return {**sessions_repository.stats(), "writer": writer.stats(), "query_cache": query_cache.stats()}
+
 @router.get("/sessions-zip")
 def get_sessions_zip():
     logger.info("[get_sessions_zip] - Creating ZIP file of all sessions")
+    export_session_csv()
     with zipfile.ZipFile(SESSION_ZIP_FILE, 'w') as zipf:
         zipf.write(SESSION_CSV_FILE, os.path.basename(SESSION_CSV_FILE))
         return FileResponse(SESSION_ZIP_FILE, media_type="application/zip", filename=os.path.basename(SESSION_ZIP_FILE))
 
 @router.get("/sessions-filter", response_model=List[Session])
 def filter_sessions(
-    movie_id: Optional[int] = Query(None, description="ID da sessão"),
-    room: Optional[str] = Query(None, description="Sala da sessão"),
-    start_time_from: Optional[datetime] = Query(None, description="Data/hora de início mínima (ISO format)"),
-    start_time_to: Optional[datetime] = Query(None, description="Data/hora de início máxima (ISO format)"),
-    available_seat: Optional[str] = Query(None, description="Assento disponível")
+    conditions: List[Condition] = Depends(session_filters),
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE, description="Tamanho da página (ordena por id)"),
+    cursor: Optional[str] = Query(None, description="Cursor da próxima página (header X-Next-Cursor)"),
+    explain: bool = Query(False, description="Devolve o plano da consulta (índices, estimativas e tempos) em vez das linhas"),
+    format: str = Query("json", description="Formato da resposta: json ou ndjson", pattern="^(json|ndjson)$")
 ):
     logger.info("[filter_sessions] - Starting search with sessions filtering.")
-    logger.debug("[filter_sessions] - Filtering attributes:")
-    logger.debug(f"[filter_sessions] - movie_id: {movie_id}")
-    logger.debug(f"[filter_sessions] - room: {room}")
-    logger.debug(f"[filter_sessions] - start_time_from: {start_time_from}")
-    logger.debug(f"[filter_sessions] - start_time_to: {start_time_to}")
-    logger.debug(f"[filter_sessions] - available_seat: {available_seat}")
-    sessions = read_session_csv()
-    results: List[Session] = []
-    for session in sessions:
-        if movie_id is not None and session.movie_id != movie_id:
-            continue
-        if room is not None and session.room.lower() != room.lower():
-            continue
-        if start_time_from is not None and session.start_time < start_time_from:
-            continue
-        if start_time_to   is not None and session.start_time > start_time_to:
-            continue
-        if available_seat is not None and available_seat not in session.available_seats:
-            continue
-        results.append(session)
-    return results
+    logger.debug(f"[filter_sessions] - conditions: {conditions}")
+    if explain:
+        return JSONResponse(jsonable_encoder(explain_sessions(conditions)))
+    if limit is not None or cursor is not None:
+        return paged_response(query_sessions(conditions, by_id=True, after=decode_cursor(cursor)), limit, format)
+    return stream_rows(query_sessions(conditions), format)
 
 #F6 Retornar o Hash SHA256 do Arquivo CSV
 @router.get("/sessions-hash")
 def get_sessions_hash():
     logger.info("[get_sessions_hash - Calculating SHA256 hash of the session CSV file")
     import hashlib
+    export_session_csv()
     sha256_hash = hashlib.sha256()
     with open(SESSION_CSV_FILE, "rb") as f:
         for byte_block in iter(lambda: f.read(4096), b""):
@@ -214,7 +189,7 @@ def get_sessions_xml():
     root = ET.Element("sessions")
     for session in sessions:
         session_elem = ET.SubElement(root, "session")
-        for key, value in session.dict().items():
+        for key, value in session.to_model().dict().items():
             child = ET.SubElement(session_elem, key)
             child.text = str(value)
     tree = ET.ElementTree(root)
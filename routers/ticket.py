@@ -1,14 +1,17 @@
 import os
 import zipfile
 import hashlib
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.encoders import jsonable_encoder
 from http import HTTPStatus
-from starlette.responses import FileResponse
+from starlette.responses import FileResponse, JSONResponse
 from typing import List, Optional
 from models.models import Ticket
-from datetime import datetime
-from .session import read_session_csv
+from controller.repository import Condition
+from controller.controller import read_tickets_csv, iter_tickets, iter_tickets_by_id, append_ticket_csv, update_ticket_csv, delete_ticket_csv, find_ticket_by_id, ticket_exists, session_exists, query_tickets, explain_tickets, count_tickets, ticket_totals, export_tickets_csv, tickets_repository, writer, query_cache
 from utils.logger_config import logger
+from utils.streaming import stream_rows
+from utils.pagination import MAX_PAGE_SIZE, decode_cursor, paged_response
 
 router = APIRouter()
 from utils.configs import ler_config_yaml
@@ -17,113 +20,130 @@ tickets_data = ler_config_yaml().get('data', {})
 TICKET_CSV_FILE = tickets_data.get('csv', {}).get('ticket', 'data/ticket.csv')
 TICKET_ZIP_FILE = tickets_data.get('compressed', {}).get('ticket', 'compressed/ticket.zip')
 
-# Utility functions
-
-def read_tickets_csv() -> List[Ticket]:
-    tickets: List[Ticket] = []
-    if os.path.exists(TICKET_CSV_FILE):
-        with open(TICKET_CSV_FILE, mode='r', encoding='utf-8') as file:
-            next(file, None)  # ignora o header
-            for line in file:
-                id, session_id, client_name, seat, purchase_date, ticket_type, price = line.strip().split(',')
-                tickets.append(
-                    Ticket(
-                        id=int(id),
-                        session_id=int(session_id),
-                        client_name=client_name,
-                        seat=seat,
-                        purchase_date=datetime.fromisoformat(purchase_date),
-                        ticket_type=ticket_type,
-                        price=price
-                    )
-                )
-    return tickets
-
-
-def write_ticket_csv(tickets: List[Ticket]) -> None:
-    with open(TICKET_CSV_FILE, mode='w', encoding='utf-8') as file:
-        file.write("id,session_id,client_name,seat,purchase_date,ticket_type,price\n")
-        for ticket in tickets:
-            file.write(f"{ticket.id},{ticket.session_id},{ticket.client_name},{ticket.seat},{ticket.purchase_date.isoformat()},{ticket.ticket_type},{ticket.price}\n")
-
 # CRUD Endpoints
 
 @router.get("/tickets", response_model=List[Ticket])
-def get_tickets():
+def get_tickets(
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE, description="Tamanho da página (ordena por id)"),
+    cursor: Optional[str] = Query(None, description="Cursor da próxima página (header X-Next-Cursor)"),
+    format: str = Query("json", description="Formato da resposta: json ou ndjson", pattern="^(json|ndjson)$")
+):
     logger.info("[get_tickets] - Fetching all tickets")
-    tickets = read_tickets_csv()
-    logger.debug(f"[get_tickets] - {len(tickets)} tickets found")
+    if limit is not None or cursor is not None:
+        return paged_response(iter_tickets_by_id(decode_cursor(cursor)), limit, format)
+    tickets = iter_tickets()
     logger.info("[get_tickets] - Tickets recovered successfully.")
-    return tickets
+    return stream_rows(tickets, format)
 
 @router.get("/tickets/{ticket_id}", response_model=Ticket)
 def get_ticket_by_id(ticket_id: int):
     logger.info(f"[get_ticket_by_id] - Fetching ticket with ID: {ticket_id}")
-    tickets = read_tickets_csv()
-    for ticket in tickets:
-        if ticket.id == ticket_id:
-            logger.info(f"[get_ticket_by_id] - Ticket found: {ticket}")
-            return ticket
+    ticket = find_ticket_by_id(ticket_id)
+    if ticket is not None:
+        logger.info(f"[get_ticket_by_id] - Ticket found: {ticket}")
+        return ticket.to_model()
     logger.error(f"[get_ticket_by_id] - Ticket with ID {ticket_id} not found")
     raise HTTPException(status_code=HTTPStatus.NOT_FOUND, detail="Ticket not found")
 
 @router.post("/tickets", response_model=Ticket, status_code=HTTPStatus.CREATED)
+@writer.serialized
 def create_ticket(ticket: Ticket):
     logger.info(f"[create_ticket] - Creating ticket: {ticket}")
-    tickets = read_tickets_csv()
-    if any(t.id == ticket.id for t in tickets):
+    if ticket_exists(ticket.id):
         logger.error(f"[create_ticket] - Ticket with ID {ticket.id} already exists")
         raise HTTPException(status_code=HTTPStatus.CONFLICT, detail="Ticket with this ID already exists")
-    sessions = read_session_csv()
-    if all(s.id != ticket.session_id for s in sessions):
+    if not session_exists(ticket.session_id):
         logger.error(f"[create_ticket] - Session ID {ticket.session_id} does not exist")
         raise HTTPException(status_code=HTTPStatus.UNPROCESSABLE_ENTITY, detail="Session ID does not exist")
-    tickets.append(ticket)
-    write_ticket_csv(tickets)
+    try:
+        append_ticket_csv(ticket)
+    except ValueError:
+        logger.error(f"[create_ticket] - Ticket with ID {ticket.id} already exists")
+        raise HTTPException(status_code=HTTPStatus.CONFLICT, detail="Ticket with this ID already exists")
     logger.info(f"[create_ticket] - Ticket created: {ticket}")
     return ticket
 
 @router.put("/tickets/{ticket_id}", response_model=Ticket)
+@writer.serialized
 def update_ticket(ticket_id: int, updated_ticket: Ticket):
     logger.info(f"[update_ticket] - Updating ticket with ID: {ticket_id}")
-    tickets = read_tickets_csv()
-    for ind, ticket in enumerate(tickets):
-        if ticket.id == ticket_id:
-            if updated_ticket.id != ticket_id:
-                logger.error("[update_ticket] - Cannot change ticket ID")
-                raise HTTPException(status_code=HTTPStatus.BAD_REQUEST, detail="Cannot change ticket ID")
-            if tickets[ind].session_id != updated_ticket.session_id:
-                logger.error("[update_ticket] - Cannot change session ID")
-                raise HTTPException(status_code=HTTPStatus.BAD_REQUEST, detail="Cannot change session ID")
-            tickets[ind] = updated_ticket
-            write_ticket_csv(tickets)
-            logger.info(f"[update_ticket] - Ticket updated: {updated_ticket}")
-            return updated_ticket
-    logger.error(f"[update_ticket] - Ticket with ID {ticket_id} not found")
-    raise HTTPException(status_code=HTTPStatus.NOT_FOUND, detail="Ticket not found")
+    ticket = find_ticket_by_id(ticket_id)
+    if ticket is None:
+        logger.error(f"[update_ticket] - Ticket with ID {ticket_id} not found")
+        raise HTTPException(status_code=HTTPStatus.NOT_FOUND, detail="Ticket not found")
+    if updated_ticket.id != ticket_id:
+        logger.error("[update_ticket] - Cannot change ticket ID")
+        raise HTTPException(status_code=HTTPStatus.BAD_REQUEST, detail="Cannot change ticket ID")
+    if ticket.session_id != updated_ticket.session_id:
+        logger.error("[update_ticket] - Cannot change session ID")
+        raise HTTPException(status_code=HTTPStatus.BAD_REQUEST, detail="Cannot change session ID")
+    update_ticket_csv(updated_ticket)
+    logger.info(f"[update_ticket] - Ticket updated: {updated_ticket}")
+    return updated_ticket
 
 @router.delete("/tickets/{ticket_id}", status_code=HTTPStatus.NO_CONTENT)
+@writer.serialized
 def delete_ticket(ticket_id: int):
     logger.info(f"[delete_ticket] - Deleting ticket with ID: {ticket_id}")
-    tickets = read_tickets_csv()
-    for ticket in tickets:
-        if ticket.id == ticket_id:
-            tickets.remove(ticket)
-            write_ticket_csv(tickets)
-            logger.info(f"[delete_ticket] - Ticket deleted: {ticket}")
-            return
-    logger.error(f"[delete_ticket] - Ticket with ID {ticket_id} not found")
-    raise HTTPException(status_code=HTTPStatus.NOT_FOUND, detail="Ticket not found")
+    if not ticket_exists(ticket_id):
+        logger.error(f"[delete_ticket] - Ticket with ID {ticket_id} not found")
+        raise HTTPException(status_code=HTTPStatus.NOT_FOUND, detail="Ticket not found")
+    ticket = delete_ticket_csv(ticket_id)
+    logger.info(f"[delete_ticket] - Ticket deleted: {ticket}")
+
+def ticket_filters(
+    session_id: Optional[int] = Query(None, description="ID da sessão"),
+    ticket_type: Optional[str] = Query(None, description="Tipo de ingresso (Normal, Meia-entrada, Promocional)"),
+    client_name: Optional[str] = Query(None, description="Nome do cliente"),
+    seat: Optional[str] = Query(None, description="Cadeira"),
+    min_price: Optional[float] = Query(None, description="Preço mínimo"),
+    max_price: Optional[float] = Query(None, description="Preço máximo")
+) -> List[Condition]:
+    # condições dos filtros de tickets, compartilhadas pelo -filter e pelo -count
+    logger.debug("[ticket_filters] - Filtering attributes:")
+    logger.debug(f"[ticket_filters] - session_id: {session_id}")
+    logger.debug(f"[ticket_filters] - ticket_type: {ticket_type}")
+    logger.debug(f"[ticket_filters] - client_name: {client_name}")
+    logger.debug(f"[ticket_filters] - seat: {seat}")
+    logger.debug(f"[ticket_filters] - min_price: {min_price}")
+    logger.debug(f"[ticket_filters] - max_price: {max_price}")
+    conditions = []
+    if session_id is not None:
+        conditions.append(('session_id', 'eq', session_id))
+    if ticket_type is not None:
+        conditions.append(('ticket_type', 'ieq', ticket_type))
+    if client_name is not None:
+        conditions.append(('client_name', 'icontains', client_name))
+    if seat is not None:
+        conditions.append(('seat', 'icontains', seat))
+    if min_price is not None:
+        conditions.append(('price', 'ge', min_price))
+    if max_price is not None:
+        conditions.append(('price', 'le', max_price))
+    return conditions
 
 @router.get("/tickets-count")
-def get_tickets_count():
+def get_tickets_count(conditions: List[Condition] = Depends(ticket_filters)):
     logger.info("[get_tickets_count] - Counting all tickets")
-    tickets = read_tickets_csv()
-    return {"quantidade": len(tickets)}
+    return {"quantidade": count_tickets(conditions)}
+
+@router.get("/tickets-revenue")
+def get_tickets_revenue(
+    group_by: str = Query("session", description="Agrupar por session, movie, ticket_type ou day",
+                          pattern="^(session|movie|ticket_type|day)$")
+):
+    logger.info(f"[get_tickets_revenue] - Summing tickets sold and revenue by {group_by}")
+    return ticket_totals(group_by)
+
+@router.get("/tickets-cache")
+def get_tickets_cache_stats():
+    logger.info("[get_tickets_cache_stats] - Returning tickets cache statistics")
+    return {**tickets_repository.stats(), "writer": writer.stats(), "query_cache": query_cache.stats()}
 
 @router.get("/tickets-zip")
 def get_tickets_zip():
     logger.info("[get_tickets_zip] - Creating ZIP file of tickets")
+    export_tickets_csv()
     with zipfile.ZipFile(TICKET_ZIP_FILE, 'w') as zipf:
         zipf.write(TICKET_CSV_FILE, os.path.basename(TICKET_CSV_FILE))
         logger.info(f"[get_tickets_zip] - ZIP file created: {TICKET_ZIP_FILE}")
@@ -131,42 +151,24 @@ def get_tickets_zip():
 
 @router.get("/tickets-filter", response_model=List[Ticket])
 def filter_tickets(
-    session_id: Optional[int] = Query(None, description="ID da sessão"),
-    ticket_type: Optional[str] = Query(None, description="Tipo de ingresso (Normal, Meia-entrada, Promocional)"),
-    client_name: Optional[str] = Query(None, description="Nome do cliente"),
-    seat: Optional[str] = Query(None, description="Cadeira"),
-    min_price: Optional[float] = Query(None, description="Preço mínimo"),
-    max_price: Optional[float] = Query(None, description="Preço máximo")
+    conditions: List[Condition] = Depends(ticket_filters),
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE, description="Tamanho da página (ordena por id)"),
+    cursor: Optional[str] = Query(None, description="Cursor da próxima página (header X-Next-Cursor)"),
+    explain: bool = Query(False, description="Devolve o plano da consulta (índices, estimativas e tempos) em vez das linhas"),
+    format: str = Query("json", description="Formato da resposta: json ou ndjson", pattern="^(json|ndjson)$")
 ):
     logger.info("[filter_tickets] - Starting search with tickets filtering.")
-    logger.debug("[filter_tickets] - Filtering attributes:")
-    logger.debug(f"[filter_tickets] - session_id: {session_id}")
-    logger.debug(f"[filter_tickets] - ticket_type: {ticket_type}")
-    logger.debug(f"[filter_tickets] - client_name: {client_name}")
-    logger.debug(f"[filter_tickets] - seat: {seat}")
-    logger.debug(f"[filter_tickets] - min_price: {min_price}")
-    logger.debug(f"[filter_tickets] - max_price: {max_price}")
-    tickets = read_tickets_csv()
-    results: List[Ticket] = []
-    for ticket in tickets:
-        if session_id is not None and ticket.session_id != session_id:
-            continue
-        if ticket_type is not None and ticket.ticket_type.lower() != ticket_type.lower():
-            continue
-        if client_name is not None and client_name.lower() not in ticket.client_name.lower():
-            continue
-        if seat is not None and seat.lower() not in ticket.seat.lower():
-            continue
-        if min_price is not None and ticket.price < min_price:
-            continue
-        if max_price is not None and ticket.price > max_price:
-            continue
-        results.append(ticket)
-    return results
+    logger.debug(f"[filter_tickets] - conditions: {conditions}")
+    if explain:
+        return JSONResponse(jsonable_encoder(explain_tickets(conditions)))
+    if limit is not None or cursor is not None:
+        return paged_response(query_tickets(conditions, by_id=True, after=decode_cursor(cursor)), limit, format)
+    return stream_rows(query_tickets(conditions), format)
 
 @router.get("/tickets-hash")
 def get_tickets_hash():
     logger.info("[get_tickets_hash] - Calculating SHA256 hash of the tickets CSV file.")
+    export_tickets_csv()
     sha256_hash = hashlib.sha256()
     with open(TICKET_CSV_FILE, "rb") as f:
         for byte_block in iter(lambda: f.read(4096), b""):
@@ -181,7 +183,7 @@ def get_tickets_xml():
     root = ET.Element("tickets")
     for ticket in tickets:
         ticket_elem = ET.SubElement(root, "ticket")
-        for key, value in ticket.dict().items():
+        for key, value in ticket.to_model().dict().items():
             child = ET.SubElement(ticket_elem, key)
             child.text = str(value)
     tree = ET.ElementTree(root)
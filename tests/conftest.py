@@ -0,0 +1,110 @@
+import os
+import random
+import shutil
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+import pytest
+from fastapi.testclient import TestClient
+from controller.controller import (MOVIE_CODEC, TICKET_CODEC, _movie_fields, _movie_from_fields, _parse_movie,
+                                   _parse_ticket, _ticket_fields, _ticket_from_fields)
+from controller.csv_file import CsvFile
+from controller.offset_index import OffsetIndex
+from models.rows import MovieRow, SessionRow, TicketRow
+
+# Os testes rodam a partir da raiz do repositório (o config.yaml é lido de ./utils):
+#   python -m pytest
+
+TICKET_TYPES = ['inteira', 'meia', 'vip']
+GENRES = ['Ação', 'Drama', 'Comédia', 'Terror', 'Ficção']
+DIRECTORS = ['Ana Souza', 'Bruno Lima', 'Carla Dias']
+ROOMS = ['Room A', 'Room B', 'Room C', 'Room D']
+# nomes com vírgula, aspas e quebra de linha: exigem campos entre aspas no CSV
+AWKWARD_NAMES = ['Silva, João', 'Maria "Mari" Costa', 'Pedro\nSegunda linha', 'Ana\r\n"Nina", Lopes']
+
+
+def make_ticket(id: int, rng: random.Random, awkward: bool = False) -> TicketRow:
+    name = rng.choice(AWKWARD_NAMES) + f' {id}' if awkward and id % 3 == 0 else f'Cliente {id}'
+    return TicketRow(id, rng.randint(1, 20), name, f'{chr(65 + id % 10)}{id % 20 + 1}',
+                     datetime(2025, 1, 1) + timedelta(hours=rng.randint(0, 24 * 10)), rng.choice(TICKET_TYPES),
+                     round(rng.uniform(10, 60), 2))
+
+
+def make_movie(id: int, rng: random.Random) -> MovieRow:
+    genre = ';'.join(rng.sample(GENRES, rng.randint(1, 3)))
+    return MovieRow(id, f'Filme {id} {rng.choice(["O Retorno", "A Volta", "Noite"])}', genre, rng.choice(DIRECTORS),
+                    rng.randint(80, 180), rng.randint(1980, 2025), rng.choice(['L', '12', '16', '18']))
+
+
+def make_session(id: int, rng: random.Random, now: datetime) -> SessionRow:
+    # metade das sessões já passou, metade ainda vai começar
+    start = now.replace(minute=0, second=0, microsecond=0) + timedelta(hours=rng.randint(-240, 240))
+    room = rng.choice(ROOMS)
+    return SessionRow(id, str(rng.randint(1, 12)), start, room, [f'{room[-1]}{seat}' for seat in range(1, rng.randint(2, 8))])
+
+
+@pytest.fixture
+def rng() -> random.Random:
+    return random.Random(2025)
+
+
+@pytest.fixture
+def tickets(rng):
+    def build(count: int, awkward: bool = False) -> list:
+        return [make_ticket(id, rng, awkward) for id in range(1, count + 1)]
+    return build
+
+
+@pytest.fixture
+def movies(rng):
+    def build(count: int) -> list:
+        return [make_movie(id, rng) for id in range(1, count + 1)]
+    return build
+
+
+@pytest.fixture
+def tickets_file(tmp_path):
+    # CsvFile de tickets num diretório temporário; cada chamada é uma instância nova
+    # sobre o mesmo arquivo (ex.: outro worker, ou o processo depois de reiniciar)
+    path = os.path.join(str(tmp_path), 'ticket.csv')
+
+    def build(snapshot: bool = False) -> CsvFile:
+        return CsvFile(path, TICKET_CODEC, _parse_ticket, _ticket_fields, OffsetIndex(path, path + '.idx'),
+                       _ticket_from_fields, TicketRow if snapshot else None)
+    return build
+
+
+@pytest.fixture
+def movies_file(tmp_path):
+    path = os.path.join(str(tmp_path), 'movies.csv')
+
+    def build() -> CsvFile:
+        return CsvFile(path, MOVIE_CODEC, _parse_movie, _movie_fields, OffsetIndex(path, path + '.idx'),
+                       _movie_from_fields)
+    return build
+
+
+@pytest.fixture
+def api(tmp_path, monkeypatch, rng):
+    # a aplicação roda num diretório temporário: os caminhos do config.yaml são relativos à raiz
+    for directory in ('data', 'compressed', 'xml_files', 'utils'):
+        os.makedirs(tmp_path / directory)
+    shutil.copy('utils/config.yaml', tmp_path / 'utils' / 'config.yaml')
+    monkeypatch.chdir(tmp_path)
+    from main import app
+    from controller import controller
+
+    data = SimpleNamespace(
+        movies=[make_movie(id, rng) for id in range(1, 13)],
+        sessions=[make_session(id, rng, datetime.now(timezone.utc)) for id in range(1, 31)],
+        tickets=[make_ticket(id, rng, awkward=True) for id in range(1, 201)],
+    )
+    controller.movies_file.rewrite(data.movies)
+    controller.sessions_file.rewrite(data.sessions)
+    controller.tickets_file.rewrite(data.tickets)
+    # tabelas e resultados de um teste anterior (outro diretório) não valem mais
+    for repository in controller.repositories:
+        if repository.backend == 'csv':
+            repository.cache.invalidate()
+    controller.query_cache.clear()
+    data.client = TestClient(app)
+    return data
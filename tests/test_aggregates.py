@@ -0,0 +1,97 @@
+from datetime import timedelta
+import pytest
+from controller.aggregates import cents
+from controller.cache import EntityCache
+from controller.controller import TICKET_COLUMNS, _ticket_aggregates, _ticket_fields, _ticket_from_fields
+from controller.repository import CsvRepository
+from controller.sqlite_repository import SqliteRepository
+from models.rows import TicketRow
+
+GROUPS = {
+    'session': lambda ticket: ticket.session_id,
+    'ticket_type': lambda ticket: ticket.ticket_type,
+    'day': lambda ticket: ticket.purchase_date.date().isoformat(),
+}
+
+
+def _brute_force(rows, group: str) -> dict:
+    totals = {}
+    for row in rows:
+        count, amount = totals.get(GROUPS[group](row), (0, 0))
+        totals[GROUPS[group](row)] = (count + 1, amount + cents(row.price))
+    return totals
+
+
+def _assert_totals(repository) -> None:
+    rows = list(repository.scan())
+    for group in GROUPS:
+        assert repository.totals(group) == _brute_force(rows, group), group
+
+
+def _csv_repository(tickets_file) -> CsvRepository:
+    csv_file = tickets_file()
+    cache = EntityCache('tickets', csv_file.path, csv_file.load, csv_file.signature)
+    return CsvRepository(cache, csv_file, aggregates=_ticket_aggregates())
+
+
+def _sqlite_repository(tickets_file, tmp_path) -> SqliteRepository:
+    return SqliteRepository('tickets', str(tmp_path / 'cinema.db'), TICKET_COLUMNS, _ticket_fields, _ticket_from_fields,
+                            tickets_file(), ['session_id'], _ticket_aggregates())
+
+
+@pytest.mark.parametrize('backend', ['csv', 'sqlite'])
+def test_totals_follow_updates_and_deletes(tickets_file, tickets, rng, tmp_path, backend):
+    rows = tickets(300)
+    tickets_file().rewrite(rows)
+    repository = _csv_repository(tickets_file) if backend == 'csv' else _sqlite_repository(tickets_file, tmp_path)
+    _assert_totals(repository)
+
+    for row in rng.sample(rows, 40):
+        # muda de grupo (sessão, tipo, dia) e de valor
+        repository.update(TicketRow(row.id, rng.randint(1, 30), row.client_name, row.seat,
+                                    row.purchase_date + timedelta(days=rng.randint(0, 3)),
+                                    rng.choice(['inteira', 'meia', 'vip', 'cortesia']), round(rng.uniform(0, 80), 2)))
+    _assert_totals(repository)
+
+    # apagar todas as linhas de um grupo o remove dos totais
+    session = rows[0].session_id
+    for row in list(repository.scan()):
+        if row.session_id == session:
+            repository.delete(row.id)
+    assert session not in repository.totals('session')
+    for row in rng.sample(list(repository.scan()), 40):
+        repository.delete(row.id)
+    _assert_totals(repository)
+
+    for row in tickets(320)[300:]:
+        repository.insert(row)
+    _assert_totals(repository)
+
+
+def test_csv_totals_after_reload(tickets_file, tickets, rng):
+    rows = tickets(200)
+    tickets_file().rewrite(rows)
+    repository = _csv_repository(tickets_file)
+    _assert_totals(repository)
+    for row in rng.sample(rows, 20):
+        repository.delete(row.id)
+
+    # outro worker grava por fora: as somas são refeitas a partir da tabela recarregada
+    row = next(iter(repository.scan()))
+    _csv_repository(tickets_file).update(TicketRow(row.id, 999, 'Outro', 'Z1', row.purchase_date, 'vip', 12.5))
+    _assert_totals(repository)
+
+
+def test_sqlite_totals_built_for_existing_table(tickets_file, tickets, rng, tmp_path):
+    rows = tickets(200)
+    tickets_file().rewrite(rows)
+    # tabela criada sem agregados (versão anterior do banco): os triggers somam o conteúdo atual
+    plain = SqliteRepository('tickets', str(tmp_path / 'cinema.db'), TICKET_COLUMNS, _ticket_fields,
+                             _ticket_from_fields, tickets_file(), ['session_id'])
+    for row in rng.sample(rows, 20):
+        plain.delete(row.id)
+
+    repository = _sqlite_repository(tickets_file, tmp_path)
+    _assert_totals(repository)
+    repository.delete(next(iter(repository.scan())).id)
+    _assert_totals(repository)
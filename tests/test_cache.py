@@ -0,0 +1,88 @@
+import pytest
+from controller.cache import EntityCache
+from models.rows import TicketRow
+
+
+def _cache(csv_file) -> EntityCache:
+    return EntityCache('tickets', csv_file.path, csv_file.load, csv_file.signature)
+
+
+def _with_session(row: TicketRow, session_id: int) -> TicketRow:
+    return TicketRow(row.id, session_id, row.client_name, row.seat, row.purchase_date, row.ticket_type, row.price)
+
+
+def test_cache_reads_file_once(tickets_file, tickets):
+    rows = tickets(30)
+    tickets_file().rewrite(rows)
+    cache = _cache(tickets_file())
+
+    assert list(cache.iter()) == rows
+    assert list(cache.iter()) == rows
+    assert cache.count() == 30
+    assert (cache.misses, cache.hits) == (1, 2)
+
+
+def test_cache_reloads_after_external_write(tickets_file, tickets):
+    rows = tickets(30)
+    tickets_file().rewrite(rows)
+    cache = _cache(tickets_file())
+    assert list(cache.iter()) == rows
+    version = cache.current_version()
+
+    # outro worker (outra instância do CsvFile) reescreve o arquivo
+    changed = [_with_session(row, 99) if row.id == 5 else row for row in rows[1:]]
+    tickets_file().rewrite(changed)
+
+    assert cache.current_version() > version
+    assert list(cache.iter()) == changed
+    assert cache.get_by_id(5).session_id == 99
+    assert not cache.contains(1)
+
+
+def test_primary_key_follows_writes(tickets_file, tickets):
+    rows = tickets(30)
+    csv_file = tickets_file()
+    csv_file.rewrite(rows)
+    cache = _cache(csv_file)
+    expected = list(rows)
+
+    cache.delete(1, lambda rows: csv_file.delete(1, rows))
+    cache.delete(15, lambda rows: csv_file.delete(15, rows))
+    del expected[14], expected[0]
+    updated = _with_session(rows[20], 77)
+    cache.update(updated, lambda rows: csv_file.update(updated, rows))
+    expected[expected.index(rows[20])] = updated
+    added = tickets(31)[30]
+    cache.append(added, lambda rows: csv_file.append(added, rows))
+    expected.append(added)
+
+    assert list(cache.iter()) == expected
+    assert [row.id for row in cache.iter_by_id(after=10)] == sorted(row.id for row in expected if row.id > 10)
+    assert cache.get_by_id(21) == updated and cache.get_by_id(15) is None
+    # o disco (CSV + journal) tem o mesmo conteúdo
+    assert tickets_file().load() == expected
+
+
+def test_failed_write_keeps_cache(tickets_file, tickets):
+    rows = tickets(30)
+    tickets_file().rewrite(rows)
+    cache = _cache(tickets_file())
+    version = cache.current_version()
+
+    def fail(rows):
+        raise OSError('disco cheio')
+
+    with pytest.raises(OSError):
+        cache.update(_with_session(rows[4], 77), fail)
+    with pytest.raises(OSError):
+        cache.delete(10, fail)
+    with pytest.raises(OSError):
+        cache.append(_with_session(tickets(31)[30], 77), fail)
+
+    assert cache.current_version() == version
+    assert list(cache.iter()) == rows
+    assert cache.get_by_id(5) == rows[4] and cache.contains(10) and not cache.contains(31)
+    # as posições seguem em dia depois das falhas
+    cache.delete(10, lambda rows: None)
+    cache.update(_with_session(rows[20], 77), lambda rows: None)
+    assert list(cache.iter()) == rows[:9] + rows[10:20] + [_with_session(rows[20], 77)] + rows[21:]
@@ -0,0 +1,59 @@
+from datetime import datetime
+from controller.columnar import COMPACT_MIN, ColumnStore
+from controller.controller import TICKET_COLUMNAR
+from controller.repository import matches
+from models.rows import TicketRow
+
+CONDITIONS = [
+    [('client_name', 'icontains', 'cliente 1')],
+    [('client_name', 'eq', 'Cliente 7'), ('price', 'ge', 10.0)],
+    [('ticket_type', 'ieq', 'VIP'), ('purchase_date', 'ge', datetime(2025, 1, 3))],
+    [('seat', 'icontains', 'a'), ('session_id', 'eq', 4)],
+]
+
+
+def _renamed(row: TicketRow, name: str) -> TicketRow:
+    return TicketRow(row.id, row.session_id, name, row.seat, row.purchase_date, row.ticket_type, row.price)
+
+
+def _assert_positions(store: ColumnStore, rows: list) -> None:
+    for conditions in CONDITIONS:
+        assert store.positions(conditions) == [index for index, row in enumerate(rows) if matches(row, conditions)]
+
+
+def test_positions_match_brute_force(tickets):
+    rows = tickets(80, awkward=True)
+    store = ColumnStore('tickets', TICKET_COLUMNAR)
+    store.reset(rows)
+
+    _assert_positions(store, rows)
+    store.update(rows[6], _renamed(rows[6], 'Cliente 1000'), 6)
+    rows[6] = _renamed(rows[6], 'Cliente 1000')
+    store.delete(rows[10], 10)
+    del rows[10]
+    _assert_positions(store, rows)
+
+
+def test_dictionaries_drop_unused_values(tickets):
+    rows = tickets(50)
+    store = ColumnStore('tickets', TICKET_COLUMNAR)
+    store.reset(rows)
+
+    # cada update troca o nome por um valor novo: o antigo fica sem linhas
+    for round in range(2 * COMPACT_MIN // len(rows) + 2):
+        for position, row in enumerate(rows):
+            rows[position] = _renamed(row, f'Cliente {row.id} v{round}')
+            store.update(row, rows[position], position)
+    stats = store.stats()
+    assert stats['dictionary_sizes']['client_name'] == len(rows)
+    # a compactação já rodou: sobram menos lápides que valores vivos + o limite
+    assert stats['dictionary_tombstones']['client_name'] <= COMPACT_MIN + len(rows)
+    assert len(store._values['client_name']) <= 2 * COMPACT_MIN + 2 * len(rows)
+    _assert_positions(store, rows)
+    assert store.positions([('client_name', 'eq', 'Cliente 1 v0')]) == []
+
+    for row in list(rows[:20]):
+        store.delete(row, 0)
+        rows.remove(row)
+    assert store.stats()['dictionary_sizes']['client_name'] == 30
+    _assert_positions(store, rows)
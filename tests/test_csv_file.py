@@ -0,0 +1,16 @@
+def test_quoted_multiline_round_trip(tickets_file, tickets):
+    rows = tickets(300, awkward=True)
+    assert any('\n' in row.client_name for row in rows)
+    tickets_file().rewrite(rows)
+
+    assert tickets_file().load() == rows
+
+
+def test_quoted_multiline_append(tickets_file, tickets):
+    rows = tickets(30, awkward=True)
+    csv_file = tickets_file()
+    csv_file.rewrite(rows[:20])
+    for index in range(20, 30):
+        csv_file.append(rows[index], rows[:index])
+
+    assert tickets_file().load() == rows
@@ -0,0 +1,122 @@
+from datetime import datetime, timedelta
+import pytest
+from controller.cache import EntityCache
+from controller.columnar import ColumnStore, epoch_us
+from controller.controller import TICKET_COLUMNAR
+from controller.hash_index import HashIndex
+from controller.ngram_index import NgramIndex
+from controller.repository import CsvRepository, matches
+from controller.sorted_index import SortedIndex
+from controller.token_index import TokenIndex
+from models.rows import TicketRow
+
+
+def _repository(csv_file, indexes, columns=None) -> CsvRepository:
+    cache = EntityCache('test', csv_file.path, csv_file.load, csv_file.signature)
+    return CsvRepository(cache, csv_file, columns, indexes)
+
+
+def _ticket_conditions(rng) -> list:
+    start = datetime(2025, 1, 1) + timedelta(hours=rng.randint(0, 240))
+    options = [
+        ('session_id', 'eq', rng.randint(1, 20)),
+        ('ticket_type', 'ieq', rng.choice(['INTEIRA', 'meia', 'Vip'])),
+        ('client_name', 'icontains', rng.choice(['cliente 1', 'ente 2', 'silva', '"mari"', 'x'])),
+        ('seat', 'icontains', rng.choice(['a1', 'b', 'c2'])),
+        ('purchase_date', 'ge', start),
+        ('purchase_date', 'le', start + timedelta(hours=rng.randint(1, 72))),
+        ('price', 'ge', rng.uniform(10, 60)),
+        ('price', 'le', rng.uniform(10, 60)),
+    ]
+    return rng.sample(options, rng.randint(1, 3))
+
+
+def _movie_conditions(rng) -> list:
+    options = [
+        ('genre', 'has', rng.choice(['Ação', 'Drama', 'Terror'])),
+        ('genre', 'ihas', rng.choice(['ação', 'COMÉDIA'])),
+        ('genre', 'ihas_any', rng.sample(['drama', 'terror', 'ficção', 'western'], 2)),
+        ('title', 'icontains', rng.choice(['retorno', 'filme 1', 'noite', 'zz'])),
+        ('release_year', 'ge', rng.randint(1980, 2025)),
+    ]
+    return rng.sample(options, rng.randint(1, 3))
+
+
+def _assert_matches_brute_force(repository, conditions_for, rng, queries: int = 60) -> None:
+    rows = list(repository.scan())
+    for _ in range(queries):
+        conditions = conditions_for(rng)
+        expected = [row for row in rows if matches(row, conditions)]
+        assert list(repository.filter(conditions)) == expected, conditions
+        assert list(repository.filter(conditions, by_id=True)) == sorted(expected, key=lambda row: row.id)
+        assert repository.count_where(conditions) == len(expected), conditions
+        assert repository.explain(conditions)['rows'] == len(expected)
+
+
+def _mutate_tickets(repository, rng, tickets) -> None:
+    rows = list(repository.scan())
+    for row in rng.sample(rows, 15):
+        repository.update(TicketRow(row.id, rng.randint(1, 20), row.client_name + ' Silva', row.seat,
+                                    row.purchase_date + timedelta(hours=5), rng.choice(['inteira', 'vip']),
+                                    row.price / 2))
+    for row in rng.sample(rows, 15):
+        repository.delete(row.id)
+    for row in tickets(len(rows) + 20, awkward=True)[len(rows):]:
+        repository.insert(row)
+
+
+@pytest.mark.parametrize('columnar', [False, True])
+def test_ticket_plans_match_brute_force(tickets_file, tickets, rng, columnar):
+    csv_file = tickets_file()
+    csv_file.rewrite(tickets(400, awkward=True))
+    indexes = [HashIndex('tickets', ['session_id', 'ticket_type']), SortedIndex('tickets', 'purchase_date', epoch_us),
+               NgramIndex('tickets', ['client_name', 'seat'])]
+    columns = ColumnStore('tickets', TICKET_COLUMNAR) if columnar else None
+    repository = _repository(csv_file, indexes, columns)
+
+    _assert_matches_brute_force(repository, _ticket_conditions, rng)
+    _mutate_tickets(repository, rng, tickets)
+    _assert_matches_brute_force(repository, _ticket_conditions, rng)
+    # o journal/CSV gravados pelas mutações dão o mesmo resultado depois de recarregar
+    repository.cache.invalidate()
+    _assert_matches_brute_force(repository, _ticket_conditions, rng)
+
+
+def test_sorted_index_ordered_reads(tickets_file, tickets, rng):
+    csv_file = tickets_file()
+    csv_file.rewrite(tickets(200))
+    repository = _repository(csv_file, [SortedIndex('tickets', 'purchase_date', epoch_us)])
+    _mutate_tickets(repository, rng, tickets)
+
+    start = datetime(2025, 1, 3)
+    expected = sorted((row for row in repository.scan() if row.purchase_date >= start),
+                      key=lambda row: (row.purchase_date, row.id))[:25]
+    assert repository.ordered('purchase_date', start, 25) == expected
+    # sem índice do campo: a mesma resposta pela varredura
+    assert _repository(csv_file, []).ordered('purchase_date', start, 25) == expected
+
+
+def test_genre_index_matches_brute_force(movies_file, movies, rng):
+    csv_file = movies_file()
+    csv_file.rewrite(movies(300))
+    repository = _repository(csv_file, [TokenIndex('movies', 'genre')])
+
+    _assert_matches_brute_force(repository, _movie_conditions, rng)
+    rows = list(repository.scan())
+    for row in rng.sample(rows, 20):
+        row = type(row)(**row.values())
+        row.genre, row.title = 'Western;Drama', row.title + ' Noite'
+        repository.update(row)
+    for row in rng.sample(rows, 20):
+        repository.delete(row.id)
+    for row in movies(320)[300:]:
+        repository.insert(row)
+    _assert_matches_brute_force(repository, _movie_conditions, rng)
+
+    counts = {}
+    for row in repository.scan():
+        for genre in row.genre.split(';'):
+            counts[genre] = counts.get(genre, 0) + 1
+    assert list(repository.item_counts('genre').items()) == sorted(counts.items(), key=lambda entry: (-entry[1], entry[0]))
+    # sem o índice: a mesma contagem pela varredura
+    assert _repository(csv_file, []).item_counts('genre') == repository.item_counts('genre')
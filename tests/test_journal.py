@@ -0,0 +1,94 @@
+import os
+import shutil
+from controller.cache import EntityCache
+from models.rows import TicketRow
+
+
+def _changed(row: TicketRow) -> TicketRow:
+    return TicketRow(row.id, row.session_id, row.client_name + ' (alterado)', row.seat, row.purchase_date,
+                     row.ticket_type, row.price + 1)
+
+
+def _apply(csv_file, rows: list) -> list:
+    # update em uma linha e delete em outra, pelo journal; devolve o estado esperado
+    expected = list(rows)
+    expected[3] = _changed(rows[3])
+    csv_file.update(expected[3], expected)
+    del expected[7]
+    csv_file.delete(rows[7].id, expected)
+    return expected
+
+
+def test_mutations_go_to_journal_and_replay_on_restart(tickets_file, tickets):
+    rows = tickets(50, awkward=True)
+    csv_file = tickets_file()
+    csv_file.rewrite(rows)
+    expected = _apply(csv_file, rows)
+
+    assert csv_file.pending() == 2
+    # processo novo: CSV ainda sem as mudanças, journal aplicado no load
+    assert tickets_file().load() == expected
+
+
+def test_replay_is_idempotent_after_crash_during_checkpoint(tickets_file, tickets):
+    rows = tickets(50, awkward=True)
+    csv_file = tickets_file()
+    csv_file.rewrite(rows)
+    expected = _apply(csv_file, rows)
+    journal = csv_file.journal.path
+    shutil.copy(journal, journal + '.bak')
+
+    assert csv_file.checkpoint(expected)
+    assert csv_file.pending() == 0
+    # queda entre o rename do CSV novo e a remoção do journal: o journal volta
+    shutil.copy(journal + '.bak', journal)
+
+    assert tickets_file().load() == expected
+
+
+def test_truncated_journal_record_is_ignored(tickets_file, tickets):
+    rows = tickets(20)
+    csv_file = tickets_file()
+    csv_file.rewrite(rows)
+    expected = _apply(csv_file, rows)
+    with open(csv_file.journal.path, mode='a', encoding='utf-8') as file:
+        file.write('{"op": "delete", "id": 1')
+
+    assert tickets_file().load() == expected
+
+
+def test_lookup_sees_journal_before_checkpoint(tickets_file, tickets):
+    rows = tickets(20)
+    csv_file = tickets_file()
+    csv_file.rewrite(rows)
+    expected = _apply(csv_file, rows)
+
+    restarted = tickets_file()
+    assert restarted.lookup(rows[3].id) == (True, expected[3])
+    assert restarted.lookup(rows[7].id) == (True, None)
+    assert restarted.lookup(rows[0].id) == (True, rows[0])
+
+
+def test_cache_reloads_after_external_journal_entry(tickets_file, tickets):
+    rows = tickets(30)
+    tickets_file().rewrite(rows)
+    csv_file = tickets_file()
+    cache = EntityCache('tickets', csv_file.path, csv_file.load, csv_file.signature)
+    cache.warm()
+
+    # outro worker grava só no journal: o CSV não muda, mas a assinatura sim
+    tickets_file().delete(3, rows)
+
+    assert not cache.contains(3)
+    assert cache.count() == 29
+
+
+def test_rewrite_leaves_no_temporary_files(tickets_file, tickets):
+    csv_file = tickets_file()
+    rows = tickets(10)
+    csv_file.rewrite(tickets(20))
+    csv_file.rewrite(rows)
+
+    directory = os.path.dirname(csv_file.path)
+    assert not [name for name in os.listdir(directory) if name.endswith('.tmp')]
+    assert tickets_file().load() == rows
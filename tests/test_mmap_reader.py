@@ -0,0 +1,39 @@
+import os
+from controller.mmap_reader import MappedCsv
+
+
+def test_mmap_reader_matches_text_reader(tickets_file, tickets):
+    rows = tickets(300, awkward=True)
+    tickets_file().rewrite(rows)
+    csv_file = tickets_file()
+    csv_file.mapped = MappedCsv(csv_file.path)
+
+    assert csv_file.load() == rows
+    # a carga pelo mmap também grava o sidecar .idx
+    assert csv_file.offsets.is_fresh()
+
+
+def test_mmap_find_skips_matches_inside_quoted_fields(tickets_file, tickets):
+    rows = tickets(10)
+    # campos com quebra de linha seguida de "<id>," de outra linha
+    rows[1].client_name = 'Cliente\n9,falso'
+    rows[2].client_name = 'Cliente\n"\n10,falso'
+    csv_file = tickets_file()
+    csv_file.rewrite(rows)
+    mapped = MappedCsv(csv_file.path)
+
+    for row in rows:
+        assert mapped.find(row.id, csv_file._parse_line) == row
+    assert mapped.find(99, csv_file._parse_line) is None
+
+
+def test_lookup_falls_back_to_mmap_without_sidecar(tickets_file, tickets):
+    rows = tickets(40, awkward=True)
+    csv_file = tickets_file()
+    csv_file.rewrite(rows)
+    os.remove(csv_file.offsets.index_path)
+    csv_file.mapped = MappedCsv(csv_file.path)
+
+    assert not csv_file.offsets.is_fresh()
+    for row in rows[::5]:
+        assert csv_file.lookup(row.id) == (True, row)
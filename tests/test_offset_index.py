@@ -0,0 +1,31 @@
+def test_lookup_reads_single_rows(tickets_file, tickets):
+    rows = tickets(50, awkward=True)
+    csv_file = tickets_file()
+    csv_file.rewrite(rows)
+    extra = tickets(51)[50]
+    csv_file.append(extra, rows)
+
+    restarted = tickets_file()
+    assert restarted.offsets.is_fresh()
+    for row in rows[::7] + [extra]:
+        assert restarted.lookup(row.id) == (True, row)
+    assert restarted.lookup(999) == (True, None)
+
+
+def test_offset_index_is_written_on_load(tickets_file, tickets):
+    rows = tickets(50, awkward=True)
+    csv_file = tickets_file()
+    csv_file.rewrite(rows)
+    extra = tickets(51)[50]
+    # CSV gravado por fora (sem o sidecar em dia)
+    with open(csv_file.path, mode='ab') as file:
+        file.write(csv_file.to_line(extra).encode('utf-8'))
+    assert not csv_file.offsets.is_fresh()
+    assert tickets_file().lookup(extra.id) == (False, None)
+
+    loaded = tickets_file()
+    loaded.load()
+    assert loaded.offsets.is_fresh()
+    assert loaded.lookup(extra.id) == (True, extra)
+    for row in rows[::7]:
+        assert loaded.lookup(row.id) == (True, row)
@@ -0,0 +1,27 @@
+from controller.parallel_loader import newline_ranges, parse_parallel
+
+
+def test_newline_ranges_end_outside_quotes(tickets_file, tickets):
+    csv_file = tickets_file()
+    csv_file.rewrite(tickets(500, awkward=True))
+    with open(csv_file.path, mode='rb') as file:
+        data = file.read()
+    ranges = newline_ranges(csv_file.path, 16)
+
+    assert len(ranges) > 1
+    assert ranges[0][0] == data.index(b'\n') + 1
+    assert ranges[-1][1] == len(data)
+    for (start, end), (following, _) in zip(ranges, ranges[1:]):
+        assert end == following
+    # cada faixa termina numa quebra de linha fora de aspas (campos multilinha não são cortados)
+    for start, end in ranges:
+        assert data[end - 1:end] == b'\n'
+        assert data[start:end].count(b'"') % 2 == 0
+
+
+def test_parallel_load_matches_sequential(tickets_file, tickets):
+    rows = tickets(2000, awkward=True)
+    tickets_file().rewrite(rows)
+    csv_file = tickets_file()
+
+    assert parse_parallel(csv_file.path, csv_file._parse_for, 2) == csv_file.load() == rows
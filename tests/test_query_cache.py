@@ -0,0 +1,70 @@
+from controller.cache import EntityCache
+from controller.hash_index import HashIndex
+from controller.query_cache import QueryCache
+from controller.repository import CsvRepository
+from models.rows import TicketRow
+
+
+def _repository(csv_file) -> CsvRepository:
+    cache = EntityCache('tickets', csv_file.path, csv_file.load, csv_file.signature)
+    return CsvRepository(cache, csv_file, indexes=[HashIndex('tickets', ['session_id'])])
+
+
+def _with_session(row: TicketRow, session_id: int) -> TicketRow:
+    return TicketRow(row.id, session_id, row.client_name, row.seat, row.purchase_date, row.ticket_type, row.price)
+
+
+def _query(query_cache, repository, conditions, by_id=False, after=None) -> list:
+    return list(query_cache.rows('tickets', repository.version(), conditions, by_id, after,
+                                 lambda after: repository.filter(conditions, by_id, after)))
+
+
+def test_query_cache_is_invalidated_by_writes(tickets_file, tickets):
+    rows = tickets(30)
+    tickets_file().rewrite(rows)
+    repository = _repository(tickets_file())
+    query_cache = QueryCache()
+    conditions = [('session_id', 'eq', 77)]
+
+    assert _query(query_cache, repository, conditions) == []
+    assert _query(query_cache, repository, conditions) == []
+    assert query_cache.hits == 1
+
+    repository.update(_with_session(rows[4], 77))
+    assert _query(query_cache, repository, conditions) == [_with_session(rows[4], 77)]
+    repository.insert(_with_session(tickets(31)[30], 77))
+    assert [row.id for row in _query(query_cache, repository, conditions, by_id=True)] == [5, 31]
+    # página seguinte servida do resultado guardado, a partir do cursor
+    assert [row.id for row in _query(query_cache, repository, conditions, by_id=True, after=5)] == [31]
+    repository.delete(5)
+    assert [row.id for row in _query(query_cache, repository, conditions)] == [31]
+
+
+def test_query_cache_key_ignores_order_and_case(tickets_file, tickets):
+    tickets_file().rewrite(tickets(30))
+    repository = _repository(tickets_file())
+    query_cache = QueryCache()
+
+    first = _query(query_cache, repository, [('ticket_type', 'ieq', 'VIP'), ('price', 'ge', 20.0)])
+    again = _query(query_cache, repository, [('price', 'ge', 20.0), ('ticket_type', 'ieq', 'vip')])
+    assert again == first
+    assert (query_cache.hits, query_cache.misses) == (1, 1)
+
+
+def test_query_cache_keeps_only_complete_results(tickets_file, tickets):
+    rows = tickets(30)
+    tickets_file().rewrite(rows)
+    repository = _repository(tickets_file())
+    query_cache = QueryCache(max_result_rows=10)
+
+    # leitura interrompida (fim de uma página): não é guardada
+    page = query_cache.rows('tickets', repository.version(), [], True, None,
+                            lambda after: repository.filter([], True, after))
+    assert [next(page).id for _ in range(3)] == [1, 2, 3]
+    page.close()
+    # resultado acima de max_result_rows: também não
+    assert len(_query(query_cache, repository, [])) == 30
+    assert query_cache.stats()['entries'] == 0
+
+    assert len(_query(query_cache, repository, [('session_id', 'eq', rows[0].session_id)])) <= 10
+    assert query_cache.stats()['entries'] == 1
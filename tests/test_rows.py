@@ -0,0 +1,30 @@
+import pickle
+from models.models import Session, Ticket
+from models.rows import SessionRow, TicketRow, validated
+
+
+def test_to_model_matches_validated_model(tickets):
+    for row in tickets(20, awkward=True):
+        model = row.to_model()
+        assert isinstance(model, Ticket)
+        assert model == Ticket(**row.values())
+        assert model.model_dump_json() == Ticket(**row.values()).model_dump_json()
+        assert TicketRow.from_model(model) == row
+
+
+def test_session_seats_round_trip():
+    row = validated(SessionRow)(id=1, movie_id='7', start_time='2025-05-10T17:00:00+00:00', room='Room A',
+                                available_seats=['A1', 'A2'])
+
+    assert row.available_seats == ('A1', 'A2')
+    assert row.to_model() == Session(id=1, movie_id='7', start_time='2025-05-10T17:00:00+00:00', room='Room A',
+                                     available_seats=['A1', 'A2'])
+
+
+def test_rows_are_hashable_and_picklable(tickets):
+    rows = tickets(10)
+    copies = [pickle.loads(pickle.dumps(row)) for row in rows]
+
+    assert copies == rows
+    assert len(set(rows + copies)) == 10
+    assert {row: row.id for row in rows}[copies[3]] == rows[3].id
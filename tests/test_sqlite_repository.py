@@ -0,0 +1,109 @@
+import threading
+from datetime import datetime, timedelta, timezone
+import pytest
+from conftest import make_session
+from controller.columnar import epoch_us
+from controller.controller import (MOVIE_COLUMNS, SESSION_CODEC, SESSION_COLUMNS, TICKET_COLUMNS, _movie_fields,
+                                   _movie_from_fields, _parse_session, _session_fields, _session_from_fields,
+                                   _ticket_fields, _ticket_from_fields)
+from controller.csv_file import CsvFile
+from controller.offset_index import OffsetIndex
+from controller.repository import matches
+from controller.sqlite_repository import SqliteRepository
+
+
+@pytest.fixture
+def sqlite_tables(tmp_path, tickets_file, movies_file, tickets, movies):
+    # tickets e movies no mesmo banco (a conexão da thread é compartilhada pelas tabelas)
+    tickets_file().rewrite(tickets(40))
+    movies_file().rewrite(movies(10))
+    db_path = str(tmp_path / 'cinema.db')
+
+    def build() -> tuple:
+        return (SqliteRepository('tickets', db_path, TICKET_COLUMNS, _ticket_fields, _ticket_from_fields,
+                                 tickets_file(), ['session_id']),
+                SqliteRepository('movies', db_path, MOVIE_COLUMNS, _movie_fields, _movie_from_fields, movies_file()))
+    return build
+
+
+def test_import_and_filters_match_csv(sqlite_tables, tickets_file):
+    tickets_table, _ = sqlite_tables()
+    rows = tickets_file().load()
+
+    assert list(tickets_table.scan()) == rows
+    assert tickets_table.count() == len(rows)
+    for conditions in ([('session_id', 'eq', 3)], [('price', 'ge', 30.0), ('ticket_type', 'ieq', 'VIP')],
+                       [('client_name', 'icontains', 'cliente 1')]):
+        expected = [row for row in rows if matches(row, conditions)]
+        assert list(tickets_table.filter(conditions)) == expected
+        assert tickets_table.count_where(conditions) == len(expected)
+
+
+def test_version_follows_other_connections(sqlite_tables, tickets_file):
+    tickets_table, _ = sqlite_tables()
+    version = tickets_table.version()
+
+    # escrita commitada por outra conexão (como outro worker): a versão lida do banco muda
+    def write() -> None:
+        other, _ = sqlite_tables()
+        other.delete(3)
+    thread = threading.Thread(target=write)
+    thread.start()
+    thread.join()
+
+    assert tickets_table.version() != version
+    assert not tickets_table.exists(3)
+    # o export deste worker vê o commit do outro e regrava o CSV
+    tickets_table.export_csv()
+    assert 3 not in [row.id for row in tickets_file().load()]
+
+
+def test_export_inside_batch_does_not_commit_it(sqlite_tables, movies_file, tickets_file):
+    tickets_table, movies_table = sqlite_tables()
+    # commit anterior ao lote: o CSV de movies fica velho e o export precisa regravá-lo
+    movies_table.delete(9)
+    before = [row for row in movies_file().load() if row.id != 9]
+    for table in (tickets_table, movies_table):
+        table.begin_batch()
+    tickets_table.delete(5)
+    movies_table.delete(2)
+
+    # export de outra tabela no meio do lote (como os endpoints de zip/hash pelo escritor)
+    movies_table.export_csv()
+    tickets_table.export_csv()
+    for table in (tickets_table, movies_table):
+        table.discard()
+
+    assert tickets_table.exists(5) and movies_table.exists(2)
+    # o export só enxerga o que já foi commitado
+    assert movies_file().load() == before
+    assert 5 in [row.id for row in tickets_file().load()]
+    # o registro do export foi descartado com o lote: o próximo regrava o CSV, com o mesmo conteúdo
+    movies_table.export_csv()
+    assert movies_file().load() == before
+
+
+def test_ordered_reads_use_the_instant_index(tmp_path, rng):
+    path = str(tmp_path / 'session.csv')
+    csv_file = CsvFile(path, SESSION_CODEC, _parse_session, _session_fields, OffsetIndex(path, path + '.idx'),
+                       _session_from_fields)
+    now = datetime(2025, 5, 10, 12, tzinfo=timezone.utc)
+    rows = [make_session(id, rng, now) for id in range(1, 41)]
+    # o mesmo instante gravado em outros fusos (e sem fuso): a ordem do texto seria outra
+    for row in rows[::3]:
+        row.start_time = row.start_time.astimezone(timezone(timedelta(hours=-9)))
+    for row in rows[1::3]:
+        row.start_time = row.start_time.astimezone(timezone(timedelta(hours=9)))
+    rows[1].start_time = rows[1].start_time.replace(tzinfo=None)
+    csv_file.rewrite(rows)
+    sessions = SqliteRepository('sessions', str(tmp_path / 'cinema.db'), SESSION_COLUMNS, _session_fields,
+                                _session_from_fields, csv_file, ['movie_id'], ranges=['start_time'])
+
+    for start in (now, now - timedelta(days=3), now.replace(tzinfo=None) + timedelta(days=2)):
+        expected = sorted((row for row in rows if epoch_us(row.start_time) >= epoch_us(start)),
+                          key=lambda row: (epoch_us(row.start_time), row.id))
+        assert sessions.ordered('start_time', start, len(rows), epoch_us) == expected
+        assert sessions.ordered('start_time', start, 7, epoch_us) == expected[:7]
+    sql = ("EXPLAIN QUERY PLAN SELECT id FROM sessions WHERE julianday(start_time) >= julianday(?) "
+           "ORDER BY julianday(start_time), id LIMIT 7")
+    assert 'idx_sessions_start_time_instant' in str(sessions._connection().execute(sql, (now.isoformat(),)).fetchall())
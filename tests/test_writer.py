@@ -0,0 +1,156 @@
+import threading
+import time
+import pytest
+from controller.cache import EntityCache
+from controller.repository import CsvRepository
+from controller.writer import MutationQueue
+
+
+class FakeTable:
+    # registra as chamadas do escritor; `fail` faz o commit falhar
+    def __init__(self, fail: bool = False):
+        self.fail = fail
+        self.calls = []
+
+    def begin_batch(self) -> None:
+        self.calls.append('begin')
+
+    def commit(self) -> None:
+        self.calls.append('commit')
+        if self.fail:
+            raise OSError('disco cheio')
+
+    def discard(self) -> None:
+        self.calls.append('discard')
+
+
+def _submit_all(writer: MutationQueue, fns: list) -> tuple:
+    # cada mutação vem de uma thread (como as rotas no thread pool); devolve resultado ou exceção
+    outcomes = [None] * len(fns)
+
+    def run(index: int) -> None:
+        try:
+            outcomes[index] = writer.submit(fns[index])
+        except BaseException as exc:
+            outcomes[index] = exc
+    threads = [threading.Thread(target=run, args=(index,)) for index in range(len(fns))]
+    for thread in threads:
+        thread.start()
+    return threads, outcomes
+
+
+def _wait_queued(writer: MutationQueue, count: int) -> None:
+    deadline = time.monotonic() + 5
+    while writer.stats()['queued'] < count:
+        assert time.monotonic() < deadline
+        time.sleep(0.001)
+
+
+def _blocked(writer: MutationQueue) -> threading.Event:
+    # ocupa o escritor até o evento ser liberado, para as próximas mutações se acumularem na fila
+    release, started = threading.Event(), threading.Event()
+
+    def block() -> None:
+        started.set()
+        release.wait(5)
+    _submit_all(writer, [block])
+    assert started.wait(5)
+    return release
+
+
+def test_queued_mutations_are_grouped_up_to_max_batch():
+    table = FakeTable()
+    writer = MutationQueue([table], max_batch=3)
+    release = _blocked(writer)
+    threads, outcomes = _submit_all(writer, [lambda value=value: value * 10 for value in range(7)])
+    _wait_queued(writer, 7)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert outcomes == [value * 10 for value in range(7)]
+    # lote do bloqueio + 7 mutações em lotes de até 3
+    assert writer.batches == 4 and writer.mutations == 8
+    assert table.calls == ['begin', 'commit'] * 4
+
+
+def test_max_delay_waits_for_more_mutations():
+    table = FakeTable()
+    writer = MutationQueue([table], max_delay_ms=300)
+    threads, outcomes = _submit_all(writer, [lambda: 'primeira'])
+    time.sleep(0.05)
+    later, later_outcomes = _submit_all(writer, [lambda: 'segunda'])
+    for thread in threads + later:
+        thread.join(5)
+
+    assert outcomes + later_outcomes == ['primeira', 'segunda']
+    assert writer.batches == 1 and writer.mutations == 2
+
+
+def test_results_and_errors_reach_each_submitter():
+    table = FakeTable()
+    writer = MutationQueue([table])
+    release = _blocked(writer)
+
+    def fail():
+        raise ValueError('id já existe')
+    threads, outcomes = _submit_all(writer, [lambda: 1, fail, lambda: 3])
+    _wait_queued(writer, 3)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert outcomes[0] == 1 and outcomes[2] == 3
+    assert isinstance(outcomes[1], ValueError)
+    # o erro de uma mutação não descarta o lote
+    assert 'discard' not in table.calls
+
+
+def test_nested_submit_runs_inline():
+    writer = MutationQueue([FakeTable()])
+
+    assert writer.submit(lambda: writer.submit(lambda: 'dentro') + ' do escritor') == 'dentro do escritor'
+    assert writer.mutations == 1
+
+
+def test_failed_commit_discards_every_table(tickets_file, tickets):
+    rows = tickets(20)
+    csv_file = tickets_file()
+    csv_file.rewrite(rows)
+    repository = CsvRepository(EntityCache('tickets', csv_file.path, csv_file.load, csv_file.signature), csv_file)
+    first, failing = FakeTable(), FakeTable(fail=True)
+    writer = MutationQueue([repository, first, failing])
+    release = _blocked(writer)
+
+    def fail():
+        raise ValueError('id já existe')
+    added = tickets(21)[20]
+    threads, outcomes = _submit_all(writer, [lambda: repository.insert(added), lambda: repository.delete(1), fail])
+    _wait_queued(writer, 3)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    # cada chamador recebe o próprio erro ou, sem ele, o erro do commit
+    assert isinstance(outcomes[0], OSError) and isinstance(outcomes[1], OSError)
+    assert isinstance(outcomes[2], ValueError)
+    assert first.calls[-2:] == ['commit', 'discard'] and failing.calls[-2:] == ['commit', 'discard']
+    # o repositório real já tinha gravado o lote (vem antes na lista), mas a memória é
+    # descartada e recarregada do disco
+    assert not repository.cache.is_loaded()
+    assert list(repository.scan()) == tickets_file().load()
+
+
+def test_failed_commit_rolls_back_unwritten_batch(tickets_file, tickets):
+    rows = tickets(20)
+    csv_file = tickets_file()
+    csv_file.rewrite(rows)
+    repository = CsvRepository(EntityCache('tickets', csv_file.path, csv_file.load, csv_file.signature), csv_file)
+    writer = MutationQueue([FakeTable(fail=True), repository])
+
+    with pytest.raises(OSError):
+        writer.submit(lambda: repository.delete(1))
+
+    # o commit falhou antes de gravar o lote do CSV: nada chega ao disco nem fica na memória
+    assert list(repository.scan()) == rows
+    assert tickets_file().load() == rows
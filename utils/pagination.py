@@ -0,0 +1,41 @@
+import base64
+import binascii
+from http import HTTPStatus
+from itertools import islice
+from typing import Iterable, Optional
+from fastapi import HTTPException
+from starlette.responses import StreamingResponse
+from utils.streaming import stream_rows
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+NEXT_CURSOR_HEADER = 'X-Next-Cursor'
+
+
+# O cursor é opaco para o cliente: por baixo é só o último id entregue (keyset)
+def encode_cursor(last_id: int) -> str:
+    return base64.urlsafe_b64encode(f'id:{last_id}'.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor: Optional[str]) -> Optional[int]:
+    if cursor is None:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode('utf-8')
+        prefix, last_id = raw.split(':', 1)
+        if prefix != 'id':
+            raise ValueError(raw)
+        return int(last_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise HTTPException(status_code=HTTPStatus.BAD_REQUEST, detail="Invalid cursor")
+
+
+# Lê no máximo limit + 1 linhas (em ordem de id) para saber se existe próxima página;
+# o cursor da próxima página vai no header X-Next-Cursor
+def paged_response(rows: Iterable, limit: Optional[int], format: str = 'json') -> StreamingResponse:
+    limit = limit or DEFAULT_PAGE_SIZE
+    page = list(islice(rows, limit + 1))
+    response = stream_rows(page[:limit], format)
+    if len(page) > limit:
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(page[limit - 1].id)
+    return response
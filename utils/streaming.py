@@ -0,0 +1,48 @@
+from typing import Iterable, Iterator
+from starlette.responses import StreamingResponse
+from models.rows import Row
+
+# Tamanho aproximado de cada pedaço enviado ao cliente
+CHUNK_SIZE = 64 * 1024
+
+STREAM_FORMATS = ('json', 'ndjson')
+
+
+def _to_json(row) -> bytes:
+    # linhas internas (models/rows.py) só viram model do Pydantic aqui, na saída
+    if isinstance(row, Row):
+        row = row.to_model()
+    return row.model_dump_json().encode('utf-8')
+
+
+def _json_array_chunks(rows: Iterable) -> Iterator[bytes]:
+    buffer = bytearray(b'[')
+    separator = b''
+    for row in rows:
+        buffer += separator
+        buffer += _to_json(row)
+        separator = b','
+        if len(buffer) >= CHUNK_SIZE:
+            yield bytes(buffer)
+            buffer.clear()
+    buffer += b']'
+    yield bytes(buffer)
+
+
+def _ndjson_chunks(rows: Iterable) -> Iterator[bytes]:
+    buffer = bytearray()
+    for row in rows:
+        buffer += _to_json(row)
+        buffer += b'\n'
+        if len(buffer) >= CHUNK_SIZE:
+            yield bytes(buffer)
+            buffer.clear()
+    if buffer:
+        yield bytes(buffer)
+
+
+# Serializa as linhas conforme são produzidas, sem montar a lista inteira em memória
+def stream_rows(rows: Iterable, format: str = 'json') -> StreamingResponse:
+    if format == 'ndjson':
+        return StreamingResponse(_ndjson_chunks(rows), media_type='application/x-ndjson')
+    return StreamingResponse(_json_array_chunks(rows), media_type='application/json')